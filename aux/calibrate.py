@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+"""
+Calibration of the energy models is part of a dissertation work about WSNs
+Derives op_time_ms of a board from the operation times in the timings of report folders
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import os, re, sys, json, time, argparse, traceback
+
+HISTOGRAM = 'wsn_operation_seconds'
+
+def operation_times(folders):
+    '''Count and sum of the seconds of every operation over the timings/NODE.csv files of folders.
+    The percentiles there are bucket bounds, too coarse for times of a few microseconds, so the mean is used'''
+    totals = {} #operation -> [count, sum]
+    for folder in folders:
+        timings = folder + "/timings"
+        if not os.path.isdir(timings):
+            raise ValueError("No timings in: " + folder)
+        for filename in os.listdir(timings):
+            if filename.startswith("queue_") or not filename.endswith(".csv"):
+                continue
+            lines = open(timings + "/" + filename, "r").read().splitlines()
+            header = lines[0].split(';')
+            for line in lines[1:]:
+                record = line.split(';')
+                if record[0] != HISTOGRAM:
+                    continue
+                total = totals.setdefault(record[header.index('Label')], [0, 0.0])
+                total[0] += int(record[header.index('Count')])
+                total[1] += float(record[header.index('Sum')])
+    return totals
+
+def op_time_ms(totals, multiplier):
+    'Mean time of each operation in ms on the board: host time times the multiplier of the board, as measured mode charges it'
+    times = {}
+    for operation, (count, seconds) in sorted(totals.items()):
+        if count > 0:
+            times[operation] = round(seconds / count * 1000 * multiplier, 2)
+    return times
+
+def write(path, board, times, source):
+    'Replaces op_time_ms and op_time_source of board in energy_models.json, the rest of the file is kept as it is'
+    text = open(path, "r").read()
+    found = re.search(r'"board"\s*:\s*"' + re.escape(board) + '"', text)
+    if found == None:
+        raise ValueError("Unknown energy model: " + board)
+    end = re.compile(r'\n\s*}').search(text, found.end()).start()
+    lines = [line for line in text[found.start():end].split('\n') if not re.match(r'\s*"op_time_(ms|source)"', line)]
+    indent = re.match(r'\s*', lines[1]).group(0)
+    at = [i for i, line in enumerate(lines) if re.match(r'\s*"multiplier"', line)][0] + 1
+    lines[at:at] = [indent + '"op_time_ms" : ' + json.dumps(times), indent + '"op_time_source" : ' + json.dumps(source)]
+    lines = [line.rstrip().rstrip(',') + ',' for line in lines[:-1]] + [lines[-1].rstrip().rstrip(',')] #they may go last
+    text = text[:found.start()] + '\n'.join(lines) + text[end:]
+    json.loads(text) #never leaves a broken file behind
+    open(path, "w").write(text)
+
+if __name__ == '__main__':  #for main run the main function. This is only run when this main python file is called, not when imported as a class
+    print("Calibration of the energy models")
+    print()
+    parser = argparse.ArgumentParser(description='Options as below')
+    parser.add_argument('folders', type=str, nargs='+', help='Report folders with timings, of runs with energy_mode measured')
+    parser.add_argument('-m','--model', type=str, help='Energy model to calibrate', default='esp8266')
+    parser.add_argument('-e','--energy-models', type=str, help='Energy models file', default='energy_models.json')
+    parser.add_argument('-w','--write', help='Write the values to the energy models file instead of only printing them', action='store_true')
+    arguments = parser.parse_args()
+    try:
+        boards = [board for board in json.loads(open(arguments.energy_models, "r").read()) if board['board'] == arguments.model]
+        if not boards:
+            raise ValueError("Unknown energy model: " + arguments.model)
+        totals = operation_times([folder.rstrip('/') for folder in arguments.folders])
+        times = op_time_ms(totals, boards[0]['multiplier'])
+        for operation in sorted(times):
+            print("{0:12s} {1:8d} {2:8.2f} ms".format(operation, totals[operation][0], times[operation]))
+        missing = sorted(set(boards[0].get('op_time_ms', {})) - set(times))
+        if missing:
+            print("Not seen in these runs: " + ', '.join(missing))
+        source = "aux/calibrate.py on " + ', '.join([os.path.basename(folder.rstrip('/')) for folder in arguments.folders]) + " (" + time.strftime("%Y-%m-%d") + "): mean host time of each operation times the multiplier"
+        if arguments.write:
+            write(arguments.energy_models, arguments.model, times, source)
+            print("Written to: " + arguments.energy_models)
+    except:
+        traceback.print_exc()
+        sys.exit(1)
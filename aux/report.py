@@ -13,11 +13,16 @@ __email__ = "brunobcf@gmail.com"
 # Remove / from the end of indir
 
 
-import os, math, struct, sys, json, traceback, time, argparse, statistics
+import os, math, struct, sys, json, traceback, time, argparse, statistics, hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import Counter
 import matplotlib.pyplot as plt
 import numpy as np
 
 
+BINARY_MAGIC = b'WSNLOG1\n' #binary node logs, see classes/log.py
+BINARY_TYPES = {'q': 'i8', 'I': 'u4', 'd': 'f8', '8s': 'S8'}
+
 class Report ():
 
     def __init__ (self,folder=''):
@@ -26,6 +31,7 @@ class Report ():
         self.t = 30 # time between messages
         self.tmax = 0
         self.qos_collapse = 50 #% of loss messages when we consider that the qos collapsed
+        self.dumps = None #message dumps, read once by load_dumps
         try:
             self.node_averages()
             pass
@@ -89,36 +95,36 @@ class Report ():
         config_report_file.write("Simulation date"+":"+nodes_data[0][8].split(".")[0]+"\n")
         config_report_file.close()
         logfiles = []
-        logfile = []
+        header = ""
         for node in nodes_reports:
             node_data=node.split("_")
             if node_data[0] == "sim":
                 print("Reading " + node)
-                logfile = open(self.folder + "/"+ node).readlines()
-                logfiles.append(logfile)
-                logfiles[len(logfiles)-1][1] = node_data[2]
+                header, rows = self.read_node_log(self.folder + "/"+ node)
+                logfiles.append([node_data[2], rows[1:]]) #the first row is left out
         #node_report_file.write("\n")
-        node_report_file.write("Node"+";"+"Comutations"+";"+logfile[0])
-        for log in logfiles:
+        node_report_file.write("Node"+";"+"Comutations"+";"+header)
+        for name, rows in logfiles:
             node_battery = {}
-            node_battery[log[1]] = []
+            node_battery[name] = []
             old_mode = ""
             new_mode = ""
             mode_counter = 0
-            for i in range(2,len(log)):
-                line_split=log[i].split(";")
-                #print(line_split)
+            for line_split in rows:
                 new_mode = line_split[3]
                 if (new_mode != old_mode):
                     #print ("aqui: "+new_mode+" "+old_mode  )
                     mode_counter+=1
                     old_mode = new_mode
-                node_battery[log[1]].append([line_split[0], line_split[1]])
-            node_report_file.write(log[1] + ";" + str(mode_counter) +";" + log[len(log)-1])
-            #print((log[len(log)-1].split(";")[5]))
+                node_battery[name].append([line_split[0], line_split[1]])
+            if len(rows) > 0:
+                last_line = ";".join(rows[len(rows)-1])
+            else:
+                last_line = name
+            node_report_file.write(name + ";" + str(mode_counter) +";" + last_line)
             battery_data.append(node_battery)
             try:
-                self.tmax = float(log[len(log)-1].split(";")[5])
+                self.tmax = float(last_line.split(";")[5])
             except:
                 self.tmax = 60
         node_report_file.close()
@@ -169,57 +175,91 @@ class Report ():
         plt.close()
         
 
-    def sink_stats(self):
+    def read_node_log(self, path):
+        'Reads a node log, csv or binary. Returns the header line and the rows split in text fields, the last field is the line break'
+        if not path.endswith(".bin"):
+            lines = open(path).readlines()
+            return lines[0], [line.split(";") for line in lines[1:]]
+        data = open(path, "rb").read()
+        if data[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+            raise ValueError("Not a binary node log: " + path)
+        offset = len(BINARY_MAGIC)
+        size = struct.unpack_from('<I', data, offset)[0]
+        fields = json.loads(data[offset + 4:offset + 4 + size].decode())['fields']
+        dtype = np.dtype([(str(i), '<' + BINARY_TYPES[field[1]]) for i, field in enumerate(fields)])
+        records = np.frombuffer(data, dtype=dtype, offset=offset + 4 + size) #one column per field, no parsing
+        columns = []
+        for i, field in enumerate(fields):
+            column = records[str(i)].tolist()
+            if field[1].endswith('s'):
+                column = [value.rstrip(b'\x00').decode() for value in column]
+            columns.append([field[2].format(value) for value in column])
+        rows = [list(row) + ["\n"] for row in zip(*columns)]
+        return ";".join([field[0] for field in fields]) + "\n", rows
+
+    def load_dumps(self):
+        'Reads every file of message_dumps once, lines are kept split in fields'
+        if self.dumps != None:
+            return self.dumps
         mess_reports = []
-        motes = {}
-        sinks = {}
+        self.dumps = {'motes': {}, 'sinks': {}, 'receivers': {}, 'rows': {}}
+        for (dirpath, dirnames, filenames) in os.walk(self.folder+"/message_dumps"):
+            mess_reports.extend(filenames)
+            break
+        for node in mess_reports:
+            node_data=node.split("_")
+            if (node_data[0]=="node"):
+                self.dumps['receivers'][node_data[3]]=node #node dumps, messages that went through a mote
+            if (node_data[3]=="mote"):
+                self.dumps['motes'][node_data[2]]=node #messages created by a mote
+            elif (node_data[3]=="sink"):
+                self.dumps['sinks'][node_data[2]]=node #messages delivered at a sink
+            self.dumps['rows'][node] = [line.split(";") for line in open(self.folder+"/message_dumps/"+node).readlines()]
+        return self.dumps
+
+    def sent_columns(self):
+        'Msg ids and creation times of all messages created by the motes, header lines skipped'
+        dumps = self.load_dumps()
+        ids = []
+        created = []
+        for mote, report in dumps['motes'].items():
+            rows = dumps['rows'][report][1:]
+            ids.extend([row[0] for row in rows])
+            created.extend([int(row[1]) for row in rows])
+        return ids, np.array(created, dtype=np.int64)
+
+    def sink_stats(self):
         repeated = []
         max_hops = []
         min_hops = []
         latency = []
-        final_report = []
+        final_report = {} #sender -> [node, max hops, min hops, copies]
         sink_messages = []
         sink_report_file = open(self.folder+"/sink_report"+".csv","w")
         print("Preparing node stats report on folder: " + self.folder)
-        for (dirpath, dirnames, filenames) in os.walk(self.folder+"/message_dumps"):
-            mess_reports.extend(filenames)
-            break
-        for node in mess_reports:
-            node_data=node.split("_")
-            if (node_data[3]=="sink"):
-                sinks[node_data[2]]=node
-        #print(sinks)
-        print("Reading delivered messages from " + str(len(sinks)) + " sinks")
-        for sink, sink_report in sinks.items():
-            sinkfile = open(self.folder+"/message_dumps/"+sink_report).readlines()
-            for sink_mess in sinkfile:
-                #print(sink_mess[0])
-                sink_messages.append(sink_mess.split(";"))
+        dumps = self.load_dumps()
+        print("Reading delivered messages from " + str(len(dumps['sinks'])) + " sinks")
+        for sink, sink_report in dumps['sinks'].items():
+            sink_messages.extend(dumps['rows'][sink_report])
         print (str(len(sink_messages)) + " Messages were delivered")
-        for i in range(1,len(sink_messages)):
-            repeated.append(int(sink_messages[i][4])-1)
-            max_hops.append(int(sink_messages[i][5]))
-            min_hops.append(int(sink_messages[i][6]))
-            latency.append(int(sink_messages[i][3])-int(sink_messages[i][2]))
-            if len(final_report) > 0: 
-                for element in range(len(final_report)): #check if it's a new node
-                    #print(final_report[element][0])
-                    if final_report[element][0] == sink_messages[i][1]: #we already have that one
-                        if int(sink_messages[i][5]) > final_report[element][1]:
-                            final_report[element][1] = int(sink_messages[i][5])
-                        elif int(sink_messages[i][6]) < final_report[element][2]:
-                            final_report[element][2] = int(sink_messages[i][6])
-                        not_there = False
-                        final_report[element][3] += 1
-                        break
-                    else:
-                        #final_report.append([sink_messages[i][2],int(sink_messages[i][5]),int(sink_messages[i][6])])
-                        not_there = True
+        rows = sink_messages[1:]
+        if len(rows) > 0:
+            columns = np.array([[int(row[2]), int(row[3]), int(row[4]), int(row[5]), int(row[6])] for row in rows], dtype=np.int64)
+            repeated = (columns[:,2] - 1).tolist()
+            max_hops = columns[:,3].tolist()
+            min_hops = columns[:,4].tolist()
+            latency = (columns[:,1] - columns[:,0]).tolist()
+        for i in range(len(rows)):
+            sender = rows[i][1]
+            record = final_report.get(sender)
+            if record == None: #first message of that node
+                final_report[sender] = [sender, max_hops[i], min_hops[i], 0]
             else:
-                not_there = True
-                #final_report.append([sink_messages[i][2],int(sink_messages[i][5]),int(sink_messages[i][6])])
-            if not_there:
-                final_report.append([sink_messages[i][1],int(sink_messages[i][5]),int(sink_messages[i][6]),0])
+                if max_hops[i] > record[1]:
+                    record[1] = max_hops[i]
+                elif min_hops[i] < record[2]:
+                    record[2] = min_hops[i]
+                record[3] += 1
         sink_report_file.write("Value"+";"+"Median"+";"+"Mean"+";"+"Std dev"+";"+"\n")
         sink_report_file.write("Repeated messages"+";"+str(statistics.median(repeated))+";"+str(statistics.mean(repeated))+";"+str(statistics.stdev(repeated))+"\n")
         sink_report_file.write("Max hops"+";"+str(statistics.median(max_hops))+";"+str(statistics.mean(max_hops))+";"+str(statistics.stdev(max_hops))+"\n")
@@ -231,162 +271,56 @@ class Report ():
         print("Median repeated: " + str(statistics.median(repeated)) +  " Std dev: " + str(statistics.stdev(repeated)))
         print("Median max_hops: " + str(statistics.median(max_hops)) +  " Std dev: " + str(statistics.stdev(max_hops)))
         print("Median min_hops: " + str(statistics.median(min_hops)) +  " Std dev: " + str(statistics.stdev(min_hops)))
-        #print(final_report)
         sink_report_file.write("\n")
         sink_report_file.write("Node"+";"+"Max_Hops"+";"+"Min_hops"+"\n")
-        for i in range(len(final_report)): #check if it's a new node
-            sink_report_file.write(final_report[i][0]+";"+str(final_report[i][1])+";"+str(final_report[i][2])+";"+str(final_report[i][3])+"\n")
+        for record in final_report.values():
+            sink_report_file.write(record[0]+";"+str(record[1])+";"+str(record[2])+";"+str(record[3])+"\n")
         sink_report_file.close()
 
     def node_stats(self):
-        mess_reports = []
-        got = False
-        motes = {}
-        motes_sender = {}
-        sinks = {}
         node_final_report = {}
-        final_report = []
-        node_messages_sent = []
-        node_messages_received = []
-        total_received_mess = {}
         print("Preparing node stats report on folder: " + self.folder)
-        for (dirpath, dirnames, filenames) in os.walk(self.folder+"/message_dumps"):
-            mess_reports.extend(filenames)
-            break
-        for node in mess_reports:
-            node_data=node.split("_")
-            if (node_data[0]=="node"):
-                motes[node_data[3]]=node
-            if (node_data[3]=="mote"):
-                motes_sender[node_data[2]]=node
-            elif (node_data[3]=="sink"):
-                sinks[node_data[2]]=node
-        #print(motes_sender)
+        dumps = self.load_dumps()
+        motes = dumps['receivers']
         print("Reading delivered messages at " + str(len(motes)) + " nodes")
+        receivers = Counter() #msg id -> number of motes that got it
         for node_receiver, node_dump_report in motes.items():
-            node_report = open(self.folder+"/message_dumps/"+node_dump_report).readlines()
-            total_received_mess[node_receiver] = node_report
-        #loop all senders
-        for node_sender, node_sender_report in motes_sender.items():
-            node_sent = open(self.folder+"/message_dumps/"+node_sender_report).readlines()
-            #record all sent messages for that sender
-            for message_sent in node_sent:
-                node_messages_sent.append(message_sent.split(";"))
-            #loop all receivers
-            for node_receiver, messages_received in total_received_mess.items():
-                #record all received for that receiver
-                for message_received in messages_received:
-                    node_messages_received.append(message_received.split(";"))
-                #for the current sender, loop all sent messages
-                for i in range(1,len(node_messages_sent)):
-                    #print(node_messages_sent[i])
-                    #for current receiver loop received messsages
-                    for j in range(1,len(node_messages_received)):
-                        #has the current receiver got the sent message?
-                        if (node_messages_sent[i][0] == node_messages_received[j][0]):
-                            got = True
-                    if got == True:
-                        if (len(node_messages_sent[i])==3):
-                            node_messages_sent[i][2] += 1
-                        else:
-                            node_messages_sent[i].append(1)
-                    got = False
-                #print(node_messages_sent)
-                node_messages_received = []
-            for msg in node_messages_sent:
-                #print(msg)
-                try:
-                    final_report.append(msg[2])
-                except:
-                    final_report.append(0)
-            delivery = statistics.mean(final_report)
-            node_final_report[node_sender] = delivery
-            final_report = []
-            node_messages_sent = []
+            receivers.update(set(row[0] for row in dumps['rows'][node_dump_report][1:]))
+        for node_sender, node_sender_report in dumps['motes'].items():
+            rows = dumps['rows'][node_sender_report]
+            final_report = [0] #the header line counts as a message nobody got
+            final_report.extend([receivers.get(row[0], 0) for row in rows[1:]])
+            node_final_report[node_sender] = statistics.mean(final_report)
         node_report_file = open(self.folder+"/nodes_delivery_report"+".csv","w")
         for node, distribution in node_final_report.items():
             node_report_file.write(node+";"+str(distribution)+ ";" + str( (distribution/(len(motes)-1)) * 100) +"\n")  
-            #print(node_final_report)
         node_report_file.close()
 
     def net_long(self):
-        mess_reports = []
-        motes = {}
-        sinks = {}
-        total_sent = 0
         print("Preparing net longevity report on folder: " + self.folder)
-        for (dirpath, dirnames, filenames) in os.walk(self.folder+"/message_dumps"):
-            mess_reports.extend(filenames)
-            break
-        #print(mess_reports)
-        for node in mess_reports:
-            node_data=node.split("_")
-            #print(node_data)
-            if (node_data[3]=="mote"):
-                motes[node_data[2]]=node
-            elif (node_data[3]=="sink"):
-                sinks[node_data[2]]=node
-        #print(sinks)
-        final_report = []
+        dumps = self.load_dumps()
         sink_messages = []
-        print("Reading delivered messages from " + str(len(sinks)) + " sinks")
-        for sink, sink_report in sinks.items():
-            sinkfile = open(self.folder+"/message_dumps/"+sink_report).readlines()
-            for sink_mess in sinkfile:
-                sink_messages.append(sink_mess.split(";")[0])
-                #sink_messages.append(sink_mess[0])
+        print("Reading delivered messages from " + str(len(dumps['sinks'])) + " sinks")
+        for sink, sink_report in dumps['sinks'].items():
+            sink_messages.extend([row[0] for row in dumps['rows'][sink_report]])
         print (str(len(sink_messages)) + " Messages were delivered")
-        #sys.exit() 
-        for mote, report in motes.items():
-            print("Reading " + report)
-            logfile = open(self.folder+"/message_dumps/"+report).readlines()
-            messages_sent = []
-            for i in range(1,len(logfile)):
-                messages_sent.append(logfile[i].split(";"))
-                #print(len(messages_sent))
-            total_sent += len(messages_sent)
-            print("Read " + str(len(messages_sent)) + " messages")
-            print("First pass....counting messages sent at each timestamp")
-            #print(messages_sent[0])
-            #break
-            #first pass
-            for item in range(0,len(messages_sent)):
-                if len(final_report) > 0:
-                    for element in range(0,len(final_report)): #check if it's a new timestamp
-                        try:
-                            if final_report[element][0] == math.floor(int(messages_sent[item][1])/self.t)*self.t: #we already this timestamp
-                                #print("Aqui!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-                                final_report[element][1] += 1 #increment counter
-                                not_added = False
-                                break
-                            else: #new message
-                                not_added = True
-                        except:
-                            print(messages_sent[item])
-                else: #fresh list, add directly
-                    not_added = True
-                if not_added:
-                    #print(item)
-                    #print(int(messages_sent[item][1]))
-                    final_report.append([math.floor(int(messages_sent[item][1])/self.t)*self.t,1,0])
-            #second pass
-            print("Second pass....counting messages received at each timestamp")
-            for item in range(0,len(messages_sent)): #loop sent messages
-                for delv_mess in range(0,len(sink_messages)): #loop delivered messages
-                    if messages_sent[item][0] == sink_messages[delv_mess]: #if message was delivered
-                        for j in range(0,len(final_report)): #loop final report
-                            if final_report[j][0] == math.floor(int(messages_sent[item][1])/self.t)*self.t: #find time self.t to increment
-                                final_report[j][2] += 1
-                        #print(final_report.index(int(messages_sent[item][1])))
-                        #sys.exit()
+        delivered = Counter(sink_messages) #msg id -> times it is in the sink dumps
+        ids, created = self.sent_columns()
+        total_sent = len(ids)
+        print("Read " + str(total_sent) + " messages")
+        slots = (created // self.t) * self.t #time slot of each message
+        received = np.array([delivered.get(id, 0) for id in ids], dtype=np.int64)
+        slot, first, index = np.unique(slots, return_index=True, return_inverse=True)
+        sent_count = np.bincount(index, minlength=len(slot))
+        received_count = np.zeros(len(slot), dtype=np.int64)
+        np.add.at(received_count, index, received)
         self.eficiency = len(sink_messages) / total_sent
         self.total_sent = total_sent
         self.total_sink = len(sink_messages)
         final_report_file = open(self.folder+"/net_longevity_report"+".csv","w")
-        for line in final_report:
-            final_report_file.write(str(line[0])+";"+str(line[1])+";"+str(line[2])+"\n")
+        for i in np.argsort(first, kind='stable'): #slots in the order they first show up in the dumps
+            final_report_file.write(str(slot[i])+";"+str(sent_count[i])+";"+str(received_count[i])+"\n")
         final_report_file.close()
-        #sys.exit()
 
     def nodes_plot(self):
         input_file_nodes = open(self.folder+"/nodes_report.csv","r").readlines()
@@ -554,6 +488,101 @@ class Report ():
         #plt.imshow(a, cmap='hot', interpolation='nearest')
         #plt.show()
 
+def report_inputs(folder):
+    'Files a report is made from: the node logs and the message dumps'
+    inputs = []
+    for (dirpath, dirnames, filenames) in os.walk(folder):
+        inputs.extend([name for name in filenames if name.split("_")[0] == "sim"])
+        break
+    for (dirpath, dirnames, filenames) in os.walk(folder+"/message_dumps"):
+        inputs.extend(["message_dumps/" + name for name in filenames])
+        break
+    return sorted(inputs)
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as input_file:
+        for block in iter(lambda: input_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ReportCache:
+    '''Manifest of the inputs of the last report made in a folder, with their size, mtime and hash.
+    A folder whose inputs did not change is skipped. Hashes are only computed when size or mtime changed'''
+    VERSION = 1
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = folder + "/report_cache.json"
+        self.inputs = {}
+        try:
+            cache = json.loads(open(self.path, "r").read())
+            if cache.get('version') == self.VERSION:
+                self.inputs = cache['inputs']
+        except (OSError, ValueError):
+            pass
+
+    def scan(self):
+        'Current state of the inputs, reusing the cached hash when size and mtime did not change'
+        inputs = {}
+        for name in report_inputs(self.folder):
+            stat = os.stat(self.folder + "/" + name)
+            cached = self.inputs.get(name)
+            if cached != None and cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime_ns:
+                inputs[name] = cached
+            else:
+                inputs[name] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha1': file_hash(self.folder + "/" + name)}
+        return inputs
+
+    def changed(self, inputs):
+        if len(inputs) == 0 or not os.path.exists(self.folder + "/final_report.csv"):
+            return True
+        if set(inputs) != set(self.inputs):
+            return True
+        for name, state in inputs.items():
+            if state['sha1'] != self.inputs[name]['sha1']:
+                return True
+        return False
+
+    def save(self, inputs):
+        self.inputs = inputs
+        tmpfile = self.path + ".tmp"
+        with open(tmpfile, "w") as cache_file:
+            cache_file.write(json.dumps({'version': self.VERSION, 'inputs': inputs}, indent=4, sort_keys=True))
+        os.replace(tmpfile, self.path)
+
+def make_report(folder, force=False):
+    'Makes the report of one folder unless its inputs did not change. Returns done, skipped or failed'
+    cache = ReportCache(folder)
+    inputs = cache.scan()
+    if not force and not cache.changed(inputs):
+        return 'skipped'
+    try:
+        Report(folder)
+    except SystemExit: #Report gives up on folders without node logs
+        return 'failed'
+    cache.save(inputs)
+    return 'done'
+
+def make_reports(folders, jobs=1, force=False):
+    'Makes the reports of all folders, in parallel when jobs is more than one'
+    results = {}
+    if jobs == 1:
+        for folder in folders:
+            results[folder] = make_report(folder, force)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(make_report, folder, force): folder for folder in folders}
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception:
+                    traceback.print_exc()
+                    results[futures[future]] = 'failed'
+    for folder in folders:
+        print(results[folder] + ": " + folder)
+    return results
+
 if __name__ == '__main__':  #for main run the main function. This is only run when this main python file is called, not when imported as a class
     print("Ourocrunch - Report generator for Ouroboros")
     print()
@@ -565,6 +594,8 @@ if __name__ == '__main__':  #for main run the main function. This is only run wh
     parser.add_argument('-a','--all', help='process all report folders', dest='all', action='store_true')
     parser.add_argument('-l','--last', help='process last report folder', dest='last', action='store_true')
     parser.add_argument('-d','--date', help='date/time to be processed', dest='date', type=str, default=False)
+    parser.add_argument('-j','--jobs', help='folders processed in parallel, 0 for one per core', dest='jobs', type=int, default=1)
+    parser.add_argument('-f','--force', help='make the reports even when the inputs did not change', dest='force', action='store_true')
     arguments = parser.parse_args()
 
     for (dirpath, dirnames, filenames) in os.walk(arguments.indir):
@@ -576,21 +607,17 @@ if __name__ == '__main__':  #for main run the main function. This is only run wh
             sorted_folders.append(folder)
     sorted_folders = sorted(sorted_folders)
 
+    jobs = arguments.jobs
+    if jobs == 0:
+        jobs = os.cpu_count()
     if (arguments.last == True):
         folder = arguments.indir+'/'+sorted_folders[len(sorted_folders)-1]
-        report = Report(folder)
-        #print(path+'/'+folders[len(folders)-1])
+        make_reports([folder], 1, arguments.force)
     elif (arguments.all == True):
-        for simulation in sorted_folders:
-            folder = arguments.indir+'/'+simulation
-            #print(folder)
-            if simulation!='EAGP' or simulation!='GOSSIP' or simulation!='MCFA':
-                report = Report(folder)
-                pass
+        make_reports([arguments.indir+'/'+simulation for simulation in sorted_folders], jobs, arguments.force)
     elif (arguments.date != False):
         for simulation in sorted_folders:
             if (simulation == arguments.date):
                 folder = arguments.indir+'/'+simulation
-                #print(path+'/'+simulation)
-                report = Report(folder)
+                make_reports([folder], 1, arguments.force)
     sys.exit()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3.7
+
+"""
+Agent class is part of a dissertation work about WSNs
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import traceback
+
+class Agent:
+    'Runs the periodic tasks of one node, the same ones main.py runs for a single node process'
+
+    def __init__(self, node, logger, simulation_limit, registry=None):
+        self.Node = node
+        self.logger = logger
+        self.registry = registry #shared state for the rest api, only in real time
+        self.simulation_limit = simulation_limit
+        self.finished = False
+        self.packet_counter = 0
+
+    def start(self, scheduler):
+        'Adds the node tasks to the scheduler'
+        self.scheduler = scheduler
+        scheduler.add_job(self.awake, 'interval', seconds=(self.Node.sleeptime / 1000), id='awake')
+        scheduler.add_job(self.sim_second, 'interval', seconds=self.Node.second / 1000, id='sim_sec')
+        scheduler.add_job(self.datalogger, 'interval', seconds=30 * self.Node.second / 1000, id='datalogger')
+        if self.registry != None:
+            scheduler.add_job(self.node_info, 'interval', seconds=5, id='node_info')
+
+    def awake(self): #sleep/awake
+        self.Node.awake() #this task is run when node is awake
+        self.Node.sleep() #node goes back to sleep
+        if self.Node.stop == False:
+            if self.Node.Battery.battery_percent <= 1 or self.Node.lock == False:
+                self.finish()
+
+    def sim_second(self): #1 tick per sim second
+        if self.Node.lock == False:
+            return
+        self.Node.simulation_seconds += 1
+        self.Node.simulation_tick_seconds += 1
+        self.Node.Network.tSinkCurrent += 1
+        if self.packet_counter > 5: #same traffic estimate main.py does every real second
+            self.Node.Network.traffic = self.Node.Network.packets / 5
+            self.Node.Network.packets = 0
+            self.packet_counter = 0
+        else:
+            self.packet_counter += 1
+        if self.Node.simulation_seconds > self.simulation_limit:
+            self.Node.lock = False
+
+    def datalogger(self):
+        if self.Node.lock == False:
+            return
+        self.logger.datalog(self.Node)
+
+    def node_info(self): #update node info and neighbours for rest every 5 real seconds
+        if self.Node.lock == False:
+            return
+        self.registry.update(self.Node)
+
+    def finish(self):
+        'Stops the node and writes its logs'
+        self.Node.lock = False
+        self.Node.stop = True
+        self.finished = True
+        self.logger.datalog(self.Node)
+        self.logger.log_messages(self.Node)
+        self.logger.log_energy(self.Node)
+        self.logger.log_timings(self.Node)
+        self.logger.close()
+        if self.registry != None:
+            try: #last state of the node next to the reports
+                self.registry.update(self.Node)
+                self.registry.export(self.Node.tag, "reports/" + self.logger.simdir)
+            except:
+                traceback.print_exc()
+            self.registry.release(self.Node.tag)
+        endfile = open("reports/" + self.logger.simdir + "/finished/" + self.Node.tag + ".csv", "w")
+        endfile.write('done\n')
+        endfile.close()
+        self.scheduler.shutdown()
+        try:
+            self.Node.shutdown()
+        except:
+            pass
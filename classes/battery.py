@@ -10,16 +10,84 @@ __maintainer__ = "Bruno Chianca Ferreira"
 __email__ = "brunobcf@gmail.com"
 
 import socket, os, math, random, struct, sys, json, traceback, hashlib
-import time
-from apscheduler.schedulers.background import BackgroundScheduler
+import time, threading
+from array import array
+from classes import metrics
+
+#Energy categories of the ledger
+COMP, COMM, SENSOR, SLEEP = range(4)
+CATEGORIES = ['comp', 'comm', 'sensor', 'sleep']
+
+class EnergyLedger:
+    '''Drain events (category, current, duration, fixed Ah) recorded in preallocated arrays.
+    Events are turned into Joules in batches, when the arrays are full or someone reads the totals'''
+
+    def __init__(self, voltage, capacity=1024, interval=30):
+        self.voltage = voltage
+        self.joules = 3600 # Wh to Joules
+        self.capacity = capacity
+        self.interval = interval #seconds in each bucket of the time series
+        self.category = array('B', bytes(capacity))
+        self.current = array('d', bytes(8 * capacity)) #A
+        self.duration = array('d', bytes(8 * capacity)) #hours
+        self.fixed = array('d', bytes(8 * capacity)) #Ah
+        self.at = array('d', bytes(8 * capacity)) #seconds
+        self.count = 0 #events waiting to be aggregated
+        self.totals = [0.0] * len(CATEGORIES) #Joules per category
+        self.buckets = {} #bucket -> Joules per category
+        self.events = 0
+        self.lock = threading.Lock() #the listener and the scheduler drain at the same time
+
+    def record(self, category, current_A, duration_h, fixed_Ah, at):
+        with self.lock:
+            i = self.count
+            self.category[i] = category
+            self.current[i] = current_A
+            self.duration[i] = duration_h
+            self.fixed[i] = fixed_Ah
+            self.at[i] = at
+            self.count = i + 1
+            if self.count == self.capacity:
+                self._aggregate()
+
+    def total(self, category=None):
+        'Joules drained in category, or in all of them'
+        with self.lock:
+            self._aggregate()
+            if category == None:
+                return sum(self.totals)
+            return self.totals[category]
+
+    def series(self):
+        'Time series as a list of [bucket start, comp, comm, sensor, sleep] in Joules, one row per interval with drain'
+        with self.lock:
+            self._aggregate()
+            return [[bucket * self.interval] + list(self.buckets[bucket]) for bucket in sorted(self.buckets)]
+
+    def _aggregate(self):
+        'Turns the waiting events into Joules, called with the lock held'
+        scale = self.voltage * self.joules
+        category, current, duration, fixed, at = self.category, self.current, self.duration, self.fixed, self.at
+        for i in range(self.count):
+            drain = ((duration[i] * current[i]) + fixed[i]) * scale
+            self.totals[category[i]] += drain
+            bucket = int(at[i] // self.interval)
+            row = self.buckets.get(bucket)
+            if row == None:
+                row = self.buckets[bucket] = [0.0] * len(CATEGORIES)
+            row[category[i]] += drain
+        self.events += self.count
+        self.count = 0
 
 class Battery:
 
-    def __init__(self, battery_mul, role, energy_model, full_energy = 50, voltage = 3.7):
-        #### UPDATER ###############################################################################
-        self.scheduler = BackgroundScheduler()
-        self.scheduler.add_job(self._updater, 'interval', seconds=1, id='updater')
-        self.scheduler.start()
+    def __init__(self, battery_mul, role, energy_model, full_energy = 50, voltage = 3.7, simulator=None, metrics=None):
+        #### CLOCK ###############################################################################
+        self.simulator = simulator #the level is read from the ledger, no updater job is needed
+        self.started = time.monotonic()
+        self.percent_at = None #clock time of the last battery level update
+        self.percent = 0
+        self.metrics = metrics #metrics.Metrics of the node, gets the time every charged operation took
         #### ELECTRICAL ###############################################################################
         self.voltage = voltage
         self.joules = 3600 # Wh to Joules
@@ -27,8 +95,7 @@ class Battery:
             self.battery_full_energy = 10 * full_energy * self.voltage * 3.6 # Joules
         else:
             self.battery_full_energy = full_energy * self.voltage * 3.6  # Joules
-        self.battery_energy  = self.battery_full_energy * (battery_mul / 100) 
-        self.battery_percent = self.battery_energy / self.battery_full_energy   
+        self.initial_energy = self.battery_full_energy * (battery_mul / 100)
         self.deepSleep_current = energy_model['deepSleep_current'] 
         self.modemSleep_current = energy_model['modemSleep_current'] 
         self.awake_current = energy_model['awake_current'] 
@@ -36,42 +103,88 @@ class Battery:
         self.tx_current = energy_model['tx_current'] 
         self.sensor_energy = energy_model['sensor_energy'] #25mA / 3600s  -> this value in mAh every second
         self.processor_multiplier = energy_model['multiplier']
+        self.energy_mode = 'measured' #measured: handlers are charged for the time they took, model: for the time of their operation
+        self.operation_time = {} #operation -> hours of processor time, from op_time_ms of the energy model
+        for operation, duration in energy_model.get('op_time_ms', {}).items():
+            self.operation_time[operation] = duration / 3600000
         #### ENERGY ###############################################################################
-        self.computational_energy = 0  #this accumulates the energy spent in calculations
-        self.communication_energy = 0  #this accumulates the energy spent in communication
-        self.sensor_reading_energy = 0  #this accumulates the energy spent in reading the sensor
-        self.sleeping_energy = 0  #this accumulates the energy spent in sleeping
+        self.ledger = EnergyLedger(self.voltage) #every drain goes here, split in comp, comm, sensor and sleep
         self.tx_time = 30 / 3600000 # this time is in hours
         self.rx_time = 40 / 3600000 # this time is in hours
         #### SETUP ###############################################################################
         self.setup(battery_mul,role)
 
-    def battery_drainer(self, current_A, start_time, fixed_Ah=0):
-        finish = time.monotonic_ns()/1000000
-        delta = (finish - start_time) * self.processor_multiplier # this is in millisenconds
-        delta = (delta / 3600000) # this is in hours
-        drain = ((delta * current_A) + fixed_Ah) * self.voltage * self.joules # Converting to Joules
-        self.battery_energy = self.battery_energy - drain # this has to be in joules
-        return drain
+    def battery_drainer(self, current_A, start_time, fixed_Ah=0, category=COMP, operation=None):
+        """Records a drain of current_A since start_time (ms), or for the time of operation in model mode, plus fixed_Ah in the ledger.
+        Returns the ms the operation really took, which the metrics of the node get in every mode"""
+        elapsed = time.monotonic_ns()/1000000 - start_time
+        if self.metrics != None and current_A != 0: #the rx fixed charge shares the start of its handler, it is not timed twice
+            self.metrics.labelled('wsn_operation_seconds', 'Processor time of the operations charged to the battery', metrics.TIME_BUCKETS, 'operation', operation or 'other').observe(elapsed / 1000)
+        if self.energy_mode == 'model':
+            delta = self.operation_time.get(operation, 0) # same cost for every run, whatever the load of the host
+        elif self.simulator == None:
+            delta = elapsed * self.processor_multiplier # this is in millisenconds
+            delta = (delta / 3600000) # this is in hours
+        else:
+            delta = 0 # handlers take no simulated time, only fixed costs are charged
+        self.ledger.record(category, current_A, delta, fixed_Ah, self.clock())
+        return elapsed
+
+    def clock(self):
+        'Seconds since the battery was created, simulated in the simulator'
+        if self.simulator == None:
+            return time.monotonic() - self.started
+        return self.simulator.now
+
+    @property
+    def battery_energy(self):
+        return self.initial_energy - self.ledger.total()
+
+    @property
+    def battery_percent(self):
+        'Battery level, updated at most once a second like the old updater job'
+        now = self.clock()
+        if self.percent_at == None or now - self.percent_at >= 1:
+            self.percent = round((self.battery_energy / self.battery_full_energy) * 100)
+            self.percent_at = now
+        return self.percent
+
+    @property
+    def computational_energy(self):
+        return self.ledger.total(COMP)
+
+    @property
+    def communication_energy(self):
+        return self.ledger.total(COMM)
+
+    @property
+    def sensor_reading_energy(self):
+        return self.ledger.total(SENSOR)
+
+    @property
+    def sleeping_energy(self):
+        return self.ledger.total(SLEEP)
 
     def setup(self,battery_mul, role):
         settings_file = open("settings.json","r").read()
         settings = json.loads(settings_file)
         self.voltage = settings['battery_voltage']
+        self.ledger.voltage = self.voltage
         if role == 'sink':
             self.battery_full_energy = settings['sink_battery_mAh'] * self.voltage * 3.6 
         else:
             self.battery_full_energy = settings['node_battery_mAh'] * self.voltage * 3.6  
-        self.battery_energy  = self.battery_full_energy * (battery_mul / 100) 
-        self.battery_percent = self.battery_energy / self.battery_full_energy 
+        self.initial_energy = self.battery_full_energy * (battery_mul / 100)
         self.tx_time = settings['tx_time_ms'] / 3600000 
         self.rx_time = settings['rx_time_ms'] / 3600000 
-
-    def _updater(self): #update battery level every sim second
-        self.battery_percent = round((self.battery_energy / self.battery_full_energy) * 100)
+        self.energy_mode = settings.get('energy_mode', self.energy_mode)
+        if self.energy_mode not in ['measured', 'model']:
+            raise ValueError("Unknown energy mode: " + str(self.energy_mode))
+        if self.energy_mode == 'model' and not self.operation_time:
+            raise ValueError("Energy model without op_time_ms, calibrate it with aux/calibrate.py") #it would charge no computation at all
 
     def shutdown(self):
-        self.scheduler.shutdown()
+        self.ledger.total() #aggregates what is left
 
     def printinfo(self):
         'Prints general information about the node'
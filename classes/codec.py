@@ -0,0 +1,139 @@
+#!/usr/bin/env python3.7
+
+"""
+Codec classes are part of a dissertation work about WSNs
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import json, struct, socket
+
+def get_codec(wire_format='json', layout='EAGP'):
+    'Returns the codec for the wire format set in settings.json'
+    if wire_format == 'json':
+        return JsonCodec()
+    elif wire_format == 'binary':
+        return BinaryCodec(layout)
+    raise ValueError("Unknown wire format: " + str(wire_format))
+
+class JsonCodec:
+    'Packets as json arrays, easy to read when debugging'
+
+    def encode(self, packet):
+        return json.dumps(packet).encode()
+
+    def decode(self, data):
+        return json.loads(data.decode())
+
+class BinaryCodec:
+    'Packets packed with struct. Every packet starts with the same fixed header, followed by the fields of the protocol'
+    VERSION = 1
+    #version, type, msg id, node id, ttl, hops, battery
+    HEADER = struct.Struct('!BBI8sBBB')
+    CREATED = struct.Struct('!I')
+    VALUE = struct.Struct('!f')
+    COUNT = struct.Struct('!H')
+    COST = struct.Struct('!I')
+    LAYOUTS = ['EAGP', 'GOSSIP', 'GOSSIPFO', 'MCFA']
+
+    def __init__(self, layout='EAGP'):
+        if layout not in self.LAYOUTS:
+            raise ValueError("Unknown packet layout: " + str(layout))
+        self.layout = layout
+
+    def encode(self, packet):
+        if self.layout == 'EAGP':
+            #[type, msg id, tag, 0, created, ttl, battery, last hop, hops, payload]
+            data = self._header(packet[0], packet[1], packet[2], packet[5], packet[8], packet[6])
+            data += self.CREATED.pack(packet[4]) + self._ip(packet[7])
+            if packet[0] == 1 or packet[0] == 3: #digest and request carry a list of ids
+                data += self._ids(packet[9])
+            else:
+                data += self.VALUE.pack(packet[9])
+            return data
+        elif self.layout == 'GOSSIP':
+            #[type, msg id, tag, value, created, ttl, last hop, 0, hops]
+            data = self._header(packet[0], packet[1], packet[2], packet[5], packet[8], 0)
+            return data + self.CREATED.pack(packet[4]) + self.VALUE.pack(packet[3]) + self._ip(packet[6])
+        elif self.layout == 'GOSSIPFO':
+            #[type, msg id, tag, value, created, ttl, last hop, fanout list, hops]
+            data = self._header(packet[0], packet[1], packet[2], packet[5], packet[8], 0)
+            data += self.CREATED.pack(packet[4]) + self.VALUE.pack(packet[3]) + self._ip(packet[6])
+            data += bytes([len(packet[7])])
+            for ip in packet[7]:
+                data += self._ip(ip)
+            return data
+        else:
+            if packet[0] == 1: #[1, tag, cost]
+                return self._header(1, 0, packet[1], 0, 0, 0) + self.COST.pack(packet[2])
+            #[2, msg id, tag, value, created, hops, cost]
+            data = self._header(packet[0], packet[1], packet[2], 0, packet[5], 0)
+            return data + self.CREATED.pack(packet[4]) + self.VALUE.pack(packet[3]) + self.COST.pack(packet[6])
+
+    def decode(self, data):
+        version, type, msg_id, tag, ttl, hops, battery = self.HEADER.unpack_from(data, 0)
+        if version != self.VERSION:
+            raise ValueError("Unsupported wire format version: " + str(version))
+        msg_id = hex(msg_id)
+        tag = tag.rstrip(b'\x00').decode()
+        offset = self.HEADER.size
+        if self.layout == 'MCFA':
+            if type == 1:
+                return [1, tag, self.COST.unpack_from(data, offset)[0]]
+            created, value, cost = struct.unpack_from('!IfI', data, offset)
+            return [type, msg_id, tag, value, created, hops, cost]
+        created = self.CREATED.unpack_from(data, offset)[0]
+        offset += self.CREATED.size
+        if self.layout == 'EAGP':
+            last_hop, offset = self._read_ip(data, offset)
+            if type == 1 or type == 3:
+                payload = self._read_ids(data, offset)
+            else:
+                payload = self.VALUE.unpack_from(data, offset)[0]
+            return [type, msg_id, tag, 0, created, ttl, battery, last_hop, hops, payload]
+        value = self.VALUE.unpack_from(data, offset)[0]
+        last_hop, offset = self._read_ip(data, offset + self.VALUE.size)
+        if self.layout == 'GOSSIP':
+            return [type, msg_id, tag, value, created, ttl, last_hop, 0, hops]
+        count = data[offset]
+        offset += 1
+        fanout = []
+        for i in range(count):
+            ip, offset = self._read_ip(data, offset)
+            fanout.append(ip)
+        return [type, msg_id, tag, value, created, ttl, last_hop, fanout, hops]
+
+    def _header(self, type, msg_id, tag, ttl, hops, battery):
+        tag = tag.encode()
+        if len(tag) > 8:
+            raise ValueError("Node name too long for the binary format: " + tag.decode())
+        if isinstance(msg_id, str):
+            msg_id = int(msg_id, 16)
+        return self.HEADER.pack(self.VERSION, type, msg_id, tag, ttl, hops, min(max(int(round(battery)), 0), 255))
+
+    def _ip(self, ip):
+        'Addresses are a length byte followed by the packed address, empty address is length 0'
+        if ip == '' or ip == None:
+            return b'\x00'
+        if ':' in ip:
+            return b'\x10' + socket.inet_pton(socket.AF_INET6, ip)
+        return b'\x04' + socket.inet_aton(ip)
+
+    def _read_ip(self, data, offset):
+        size = data[offset]
+        offset += 1
+        if size == 0:
+            return '', offset
+        elif size == 16:
+            return socket.inet_ntop(socket.AF_INET6, data[offset:offset + 16]), offset + 16
+        return socket.inet_ntoa(data[offset:offset + 4]), offset + 4
+
+    def _ids(self, ids):
+        return self.COUNT.pack(len(ids)) + struct.pack('!%dI' % len(ids), *[int(id, 16) for id in ids])
+
+    def _read_ids(self, data, offset):
+        count = self.COUNT.unpack_from(data, offset)[0]
+        return [hex(id) for id in struct.unpack_from('!%dI' % count, data, offset + self.COUNT.size)]
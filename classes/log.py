@@ -9,118 +9,197 @@ __version__ = "0.1"
 __maintainer__ = "Bruno Chianca Ferreira"
 __email__ = "brunobcf@gmail.com"
 
-import os, struct, sys, traceback, time
+import os, struct, sys, traceback, time, json
+
+#Fields of the node log: name in the header, struct code in the binary log, text format and how to read it from the node
+DATALOG_FIELDS = [
+    ('Simul. Seconds', 'q', '{0}', lambda node: node.simulation_seconds),
+    ('Battery %', 'd', '{0:5.2f}', lambda node: node.Battery.battery_percent),
+    (' Average Energy', 'd', '{0:5.2f}', lambda node: node.Network.average),
+    (' Mode', '8s', '{0}', lambda node: node.Network.mode),
+    (' Neighbours', 'I', '{0}', lambda node: len(node.Network.visible)),
+    (' Tmax', 'd', '{0}', lambda node: node.Network.tmax/node.multiplier),
+    (' Tnext', 'd', '{0}', lambda node: node.Network.tnext/node.multiplier),
+    (' Created', 'q', '{0}', lambda node: node.Network.protocol_stats[0]),
+    (' Forwarded', 'q', '{0}', lambda node: node.Network.protocol_stats[1]),
+    (' Delivered', 'q', '{0}', lambda node: node.Network.protocol_stats[2]),
+    (' Discarded', 'q', '{0}', lambda node: node.Network.protocol_stats[3]),
+    (' Comp Energy', 'd', '{0}', lambda node: node.Battery.computational_energy),
+    (' Comm Energy', 'd', '{0}', lambda node: node.Battery.communication_energy),
+    (' Sleep Energy', 'd', '{0}', lambda node: node.Battery.sleeping_energy),
+    (' Sensor Energy', 'd', '{0}', lambda node: node.Battery.sensor_reading_energy),
+    (' X', 'd', '{0}', lambda node: node.x),
+    (' Y', 'd', '{0}', lambda node: node.y),
+    (' Buffer', 'I', '{0}', lambda node: buffer_depth(node)),
+    (' Message Log', 'I', '{0}', lambda node: len(node.Network.messages)),
+    (' Traffic', 'd', '{0}', lambda node: node.Network.traffic),
+    (' Buffer Latency', 'd', '{0:5.3f}', lambda node: buffer_latency(node)),
+]
+
+BINARY_MAGIC = b'WSNLOG1\n'
+
+def buffer_depth(node):
+    try: #only routers with a forwarding buffer
+        return node.Network.fwd_buffer.depth()
+    except AttributeError:
+        return 0
+
+def buffer_latency(node):
+    try:
+        return node.Network.fwd_buffer.latency()[0]
+    except AttributeError:
+        return 0.0
 
 class Log:
 
-    def __init__(self, node, tag, role, board_type, topology, protocol):
-        self.simdir = str(time.localtime().tm_year) + "_" + str(time.localtime().tm_mon) + "_" + str(time.localtime().tm_mday) + "_" + str(time.localtime().tm_hour) + "_" + str(time.localtime().tm_min)
-        try:
-            os.mkdir("reports/" + self.simdir)
-            os.mkdir("reports/" + self.simdir + "/message_dumps")
-            os.mkdir("reports/" + self.simdir + "/finished")
-        except FileExistsError:
-            print("Report folder already created.")
+    def __init__(self, node, tag, role, board_type, topology, protocol, simdir=None, headless=False):
+        self.headless = headless #no terminal, messages are plain lines and nothing is drawn
+        if simdir == None:
+            self.simdir = str(time.localtime().tm_year) + "_" + str(time.localtime().tm_mon) + "_" + str(time.localtime().tm_mday) + "_" + str(time.localtime().tm_hour) + "_" + str(time.localtime().tm_min)
+        else:
+            self.simdir = simdir
+        try: #every node of the run shares the folder
+            os.makedirs("reports/" + self.simdir + "/message_dumps", exist_ok=True)
+            os.makedirs("reports/" + self.simdir + "/finished", exist_ok=True)
         except:
             traceback.print_exc()
-        self.logfile = open("reports/" + self.simdir + "/" + "sim_report_"+tag+"_"+role+"_"+str(node.sleep_s)+"_"+board_type+"_" + topology + "_" + protocol + "_" + time.asctime(time.localtime())+".csv","w") #
+        self.log_format = 'csv'
+        self.flush_rows = 20 #node log rows kept in memory before they are written
+        self._setup()
+        self.rows = [] #node log rows waiting to be written
+        self.row = struct.Struct('<' + ''.join([field[1] for field in DATALOG_FIELDS]))
+        if self.log_format == 'binary':
+            self.logfile = open("reports/" + self.simdir + "/" + "sim_report_"+tag+"_"+role+"_"+str(node.sleep_s)+"_"+board_type+"_" + topology + "_" + protocol + "_" + time.asctime(time.localtime())+".bin","wb") #
+        else:
+            self.logfile = open("reports/" + self.simdir + "/" + "sim_report_"+tag+"_"+role+"_"+str(node.sleep_s)+"_"+board_type+"_" + topology + "_" + protocol + "_" + time.asctime(time.localtime())+".csv","w") #
         self.msgfile = open("reports/" + self.simdir + "/" + "message_dumps/message_dump_"+tag+"_"+role+"_"+str(node.sleep_s)+"_"+time.asctime(time.localtime())+".csv","w") #
         if node.role != "sink":
             self.nodefile = open("reports/" + self.simdir + "/" + "message_dumps/node_dump_"+tag+"_"+str(node.sleep_s)+"_"+time.asctime(time.localtime())+".csv","w") #
-        self.logfile.write('Simul. Seconds;Battery %; Average Energy; Mode; Neighbours; Tmax; Tnext; Created; Forwarded; Delivered; Discarded; Comp Energy; Comm Energy; Sleep Energy; Sensor Energy; X; Y; Buffer; Message Log; Traffic\n')
+        if self.log_format == 'binary': #magic, length of the json schema, schema, fixed size records
+            schema = json.dumps({'fields': [[field[0], field[1], field[2]] for field in DATALOG_FIELDS]}).encode()
+            self.logfile.write(BINARY_MAGIC + struct.pack('<I', len(schema)) + schema)
+        else:
+            self.logfile.write(';'.join([field[0] for field in DATALOG_FIELDS]) + '\n')
         self.logfile.flush()
+        self.waits = [] #forwarding buffer waits to be written
+        self.queuefile = None
+        if hasattr(node.Network, 'fwd_buffer'): #only routers with a forwarding buffer
+            os.makedirs("reports/" + self.simdir + "/timings", exist_ok=True)
+            self.queuefile = open("reports/" + self.simdir + "/timings/queue_" + tag + ".csv", "w")
+            self.queuefile.write('Msg ID;Waited s\n')
+            node.Network.fwd_buffer.listener = self.log_wait
+
+    def _setup(self):
+        try:
+            settings = json.loads(open("settings.json","r").read())
+            self.log_format = settings.get('log_format', self.log_format)
+            self.flush_rows = settings.get('log_flush_rows', self.flush_rows)
+        except:
+            traceback.print_exc()
+        if self.log_format not in ['csv', 'binary']:
+            raise ValueError("Unknown log format: " + str(self.log_format))
 
     def print_error(self,text):
         'Print error message with special format'
+        if self.headless:
+            print("error: " + text, flush=True)
+            return
         print()
         print("\033[1;31;40m"+text+"  \n")
         print("\033[0;37;40m")
 
     def print_alert(self,text):
         'Print alert message with special format'
+        if self.headless:
+            print(text, flush=True)
+            return
         print()
         print("\033[1;32;40m"+text+"  \n")
         print("\033[0;37;40m")
 
     def printxy(self,x, y, text):
+        if self.headless:
+            return
         sys.stdout.write("\x1b7\x1b[%d;%df%s\x1b8" % (x, y, text))
         sys.stdout.flush()
 
+    def log_status(self, node):
+        'One plain status line, what the terminal shows when there is one'
+        print(node.tag + ": {0} s, {1:5.1f} pps, battery {2} %, created {3}, forwarded {4}, delivered {5}".format(node.simulation_seconds, node.Network.traffic,
+              node.Battery.battery_percent, node.Network.protocol_stats[0], node.Network.protocol_stats[1], node.Network.protocol_stats[2]), flush=True)
+
     def datalog(self, node):
-        'Dataloger writes current data to node log'
-        jobs = 0
-        try:
-            jobs = len(node.scheduler.get_jobs())
-        except:
-            pass
-        self.logfile.write(str(node.simulation_seconds)+";"
-                    +"{0:5.2f}".format(node.Battery.battery_percent)+";"
-                    +"{0:5.2f}".format(node.Network.average)+";"
-                    +node.Network.mode+";"
-                    +str(len(node.Network.visible))+";"
-                    +str(node.Network.tmax/node.multiplier)+";"
-                    +str(node.Network.tnext/node.multiplier)+";"
-                    +str(node.Network.protocol_stats[0])+";"
-                    +str(node.Network.protocol_stats[1])+";"
-                    +str(node.Network.protocol_stats[2])+";"
-                    +str(node.Network.protocol_stats[3])+";"
-                    +str(node.Battery.computational_energy)+";"
-                    +str(node.Battery.communication_energy)+";"
-                    +str(node.Battery.sleeping_energy)+";"
-                    +str(node.Battery.sensor_reading_energy)+";"
-                    +str(node.x)+";"
-                    +str(node.y)+";"
-                    +str(jobs)+";"
-                    +str(len(node.Network.messages))+";"
-                    +str(node.Network.traffic)+";"
-                    +"\n")
+        'Dataloger adds the current data to node log, rows are written in batches'
+        values = [field[3](node) for field in DATALOG_FIELDS]
+        if self.log_format == 'binary':
+            values[3] = values[3].encode()
+            self.rows.append(self.row.pack(*values))
+        else:
+            self.rows.append(';'.join([field[2].format(value) for field, value in zip(DATALOG_FIELDS, values)]) + ';\n')
+        if len(self.rows) >= self.flush_rows:
+            self.flush()
+
+    def log_wait(self, msg_id, waited):
+        'Adds how long a message waited in the forwarding buffer to the queue log, written in batches like the node log'
+        self.waits.append(str(msg_id) + ';' + str(waited) + '\n')
+        if len(self.waits) >= self.flush_rows and self.queuefile != None:
+            self.queuefile.write(''.join(self.waits))
+            self.waits = []
+
+    def flush(self):
+        'Writes the rows kept in memory'
+        if self.queuefile != None:
+            self.queuefile.write(''.join(self.waits))
+            self.waits = []
+            self.queuefile.flush()
+        if len(self.rows) > 0:
+            if self.log_format == 'binary':
+                self.logfile.write(b''.join(self.rows))
+            else:
+                self.logfile.write(''.join(self.rows))
+            self.rows = []
         self.logfile.flush()
 
     def log_messages(self, node):
         'Dumps all shared messages to file'
         if node.role == "sink":
             self.msgfile.write('Msg ID;Sender;Created at;Delivered at;Counter;Max Hops;Min Hops\n')
-            for item in range(len(node.Network.messages_delivered)):
-                self.msgfile.write(str(node.Network.messages_delivered[item][0])+";"
-                            +node.Network.messages_delivered[item][1]+";"
-                            +str(node.Network.messages_delivered[item][2])+";"
-                            +str(node.Network.messages_delivered[item][3])+";"
-                            +str(node.Network.messages_delivered[item][4])+";"
-                            +str(node.Network.messages_delivered[item][5])+";"
-                            +str(node.Network.messages_delivered[item][6])+"\n")
-                self.msgfile.flush()
+            self.msgfile.write(''.join([';'.join([str(field) for field in record]) + '\n' for record in node.Network.messages_delivered]))
+            self.msgfile.flush()
         else:
             self.msgfile.write('Msg ID;Created at\n')
-            for item in range(len(node.Network.messages_created)):
-                self.msgfile.write(str(node.Network.messages_created[item][0])+";"
-                            +str(node.Network.messages_created[item][1])+"\n")
-                self.msgfile.flush()
+            self.msgfile.write(''.join([str(message[0]) + ';' + str(message[1]) + '\n' for message in node.Network.messages_created]))
+            self.msgfile.flush()
             self.nodefile.write('Msg ID;Sender;Created at;Delivered at;Counter;Max Hops;Min Hops\n')
-            for item in range(len(node.Network.messages)):
-                self.nodefile.write(str(node.Network.messages[item][0])+";"
-                            +node.Network.messages[item][1]+";"
-                            +str(node.Network.messages[item][2])+";"
-                            +str(node.Network.messages[item][3])+";"
-                            +str(node.Network.messages[item][4])+";"
-                            +str(node.Network.messages[item][5])+";"
-                            +str(node.Network.messages[item][6])+"\n")
-                self.nodefile.flush()
-
-    def clean_nodedumps(self, node):
-        'Clean node dumps before new simulation'
-        if node.role == "sink":
-            print('Removing old node dumps')
-            path ="./node_dumps" 
-            files = []
-            for (dirpath, dirnames, filenames) in os.walk(path):
-                files.extend(filenames)
-                break
-            for dump in files:
-                os.remove(path+'/'+dump)
-            path ="./message_dumps" 
-            files = []
-            for (dirpath, dirnames, filenames) in os.walk(path):
-                files.extend(filenames)
-                break
-            for dump in files:
-                os.remove(path+'/'+dump)
+            self.nodefile.write(''.join([';'.join([str(field) for field in record]) + '\n' for record in node.Network.messages]))
+            self.nodefile.flush()
+
+    def log_energy(self, node):
+        'Writes the energy time series of the battery ledger to energy/<node>.csv'
+        os.makedirs("reports/" + self.simdir + "/energy", exist_ok=True)
+        with open("reports/" + self.simdir + "/energy/" + node.tag + ".csv", "w") as energyfile:
+            energyfile.write('Seconds;Comp Energy;Comm Energy;Sensor Energy;Sleep Energy\n')
+            energyfile.write(''.join([';'.join([str(field) for field in row]) + '\n' for row in node.Battery.ledger.series()]))
+
+    def log_timings(self, node):
+        'Writes the histograms of the node (handler and operation run times, queueing delay, packet sizes) to timings/<node>.csv'
+        os.makedirs("reports/" + self.simdir + "/timings", exist_ok=True)
+        with open("reports/" + self.simdir + "/timings/" + node.tag + ".csv", "w") as timingfile:
+            timingfile.write('Histogram;Label;Count;Sum;Mean;P50;P90;P99\n')
+            for histogram in node.metrics.histograms():
+                mean = histogram.sum / histogram.count if histogram.count > 0 else 0
+                fields = [histogram.name, ','.join(histogram.labels.values()), histogram.count, histogram.sum, mean, histogram.quantile(0.5), histogram.quantile(0.9), histogram.quantile(0.99)]
+                timingfile.write(';'.join([str(field) for field in fields]) + '\n')
+
+    def close(self):
+        'Writes what is left and closes all log files'
+        self.flush()
+        self.logfile.close()
+        self.msgfile.close()
+        if self.queuefile != None:
+            self.queuefile.close()
+            self.queuefile = None #waits of packets still in the buffer are dropped
+        try:
+            self.nodefile.close()
+        except AttributeError:
+            pass
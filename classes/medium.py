@@ -0,0 +1,182 @@
+#!/usr/bin/env python3.7
+
+"""
+Medium class is part of a dissertation work about WSNs
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import math, random, socket, threading, json, os, traceback, types, itertools
+from classes import transport, spatial
+
+def open_medium(loop, topology, seed=0):
+    'Medium with the radius, delay, jitter and loss of a topology file'
+    return Medium(loop, radius=topology['radius'], delay=topology.get('delay_ms', 5) / 1000, jitter=topology.get('jitter_ms', 0) / 1000,
+                  loss=topology.get('loss', 0), seed=seed)
+
+class Medium(transport.Loopback):
+    '''In memory broadcast medium. Works like the BasicRangeModel of the CORE wlan: everybody inside radius hears a packet after a delay,
+    plus up to jitter seconds, and each copy is lost with probability loss. Runs on the simulator or on a real time Runtime'''
+
+    def __init__(self, simulator, radius=154, delay=0.005, network='10.0.0.', jitter=0, loss=0, seed=0):
+        transport.Loopback.__init__(self, network)
+        self.simulator = simulator #anything with schedule(delay, callback, *args)
+        self.simulator.medium = self
+        self.radius = radius #range of the radio
+        self.delay = delay #propagation delay in seconds
+        self.jitter = jitter #extra random delay in seconds, up to this much
+        self.loss = loss #probability of losing each copy
+        self.random = random.Random("medium " + str(seed)) #own draws, the nodes see the same random sequence with or without loss
+        self.lost = 0 #copies lost
+        self.neighbours = {} #transport -> list of transports in range, in order of attachment
+        self.index = spatial.GridIndex(radius) #positions of the members, cells as large as the range
+        self.order = {} #transport -> order of attachment, packets go out to the neighbours in this order
+        self.sequence = itertools.count()
+
+    def attach(self, endpoint):
+        'Attaches the transport of a node. Position is taken from the node'
+        ip = transport.Loopback.attach(self, endpoint)
+        self.order[endpoint] = next(self.sequence)
+        self.index.insert(endpoint, endpoint.node.x, endpoint.node.y)
+        self.neighbours[endpoint] = self._in_range(endpoint)
+        for other in self.neighbours[endpoint]:
+            self._link(other, endpoint)
+        return ip
+
+    def detach(self, endpoint):
+        'Removes a node from the medium, it does not send or receive anymore'
+        if endpoint in self.members:
+            self.members.remove(endpoint)
+            for other in self.neighbours.pop(endpoint, []):
+                self.neighbours[other].remove(endpoint)
+            self.index.remove(endpoint)
+
+    def move(self, endpoint):
+        """Updates the links of a node after its position changed. Only the node and the ones it gained or lost are touched.
+        Returns the nodes that came into range and the ones that went out of range"""
+        if endpoint not in self.index or not self.index.move(endpoint, endpoint.node.x, endpoint.node.y):
+            return [], []
+        old = self.neighbours[endpoint]
+        new = self._in_range(endpoint)
+        old_set = set(old)
+        new_set = set(new)
+        added = [other for other in new if other not in old_set]
+        removed = [other for other in old if other not in new_set]
+        for other in added:
+            self._link(other, endpoint)
+        for other in removed:
+            self.neighbours[other].remove(endpoint)
+        self.neighbours[endpoint] = new
+        return added, removed
+
+    def broadcast(self, endpoint, data):
+        'Sends data to every node in range of the sender'
+        sender_ip = self.addresses[endpoint]
+        for receiver in self.neighbours.get(endpoint, []):
+            if self.loss > 0 and self.random.random() < self.loss:
+                self.lost += 1
+                continue
+            delay = self.delay
+            if self.jitter > 0:
+                delay += self.random.uniform(0, self.jitter)
+            self.simulator.schedule(delay, self._deliver, receiver, data, sender_ip)
+
+    def in_range(self, a, b):
+        return math.hypot(a.node.x - b.node.x, a.node.y - b.node.y) <= self.radius
+
+    def _in_range(self, endpoint):
+        'Members in range of endpoint from the index, in order of attachment'
+        return sorted(self.index.near(endpoint, self.radius), key=self.order.__getitem__)
+
+    def _link(self, endpoint, other):
+        'Adds other to the neighbours of endpoint, keeping them in order of attachment'
+        neighbours = self.neighbours[endpoint]
+        neighbours.append(other)
+        if len(neighbours) > 1 and self.order[neighbours[-2]] > self.order[other]:
+            neighbours.sort(key=self.order.__getitem__)
+
+class MediumServer(Medium):
+    '''Medium for nodes running in other processes. Each node joins from its own unix datagram socket (transport.UnixTransport)
+    and the server delivers its packets to the sockets of the nodes in range. Everything but receiving runs in the loop of runtime'''
+
+    def __init__(self, runtime, path, radius=154, delay=0.005, jitter=0, loss=0, seed=0, max_packet=65535):
+        Medium.__init__(self, runtime, radius=radius, delay=delay, jitter=jitter, loss=loss, seed=seed)
+        self.path = path
+        self.max_packet = max_packet
+        self.endpoints = {} #socket path of a node -> its endpoint
+        self.running = False
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.bind(path)
+        self.socket.settimeout(0.5) #so the listener can see it was closed
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._listener, name='medium', daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.running = False
+        self.thread.join(timeout=2)
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def _listener(self):
+        while self.running:
+            try:
+                data, address = self.socket.recvfrom(self.max_packet + 1)
+            except socket.timeout:
+                continue
+            self.simulator.call_soon(self._handle, data, address)
+        self.socket.close()
+
+    def _handle(self, data, address):
+        kind = data[:1]
+        endpoint = self.endpoints.get(address)
+        try:
+            if kind == transport.UNIX_DATA and endpoint != None:
+                self.broadcast(endpoint, data[1:])
+            elif kind == transport.UNIX_JOIN:
+                info = json.loads(data[1:].decode())
+                if endpoint != None: #joining again, the node restarted
+                    self.detach(endpoint)
+                endpoint = RemoteEndpoint(self, address, info['tag'], info['x'], info['y'])
+                self.endpoints[address] = endpoint
+                ip = self.attach(endpoint)
+                self.socket.sendto(transport.UNIX_JOIN + ip.encode(), address)
+            elif kind == transport.UNIX_MOVE and endpoint != None:
+                info = json.loads(data[1:].decode())
+                endpoint.node.x, endpoint.node.y = info['x'], info['y']
+                self.move(endpoint)
+            elif kind == transport.UNIX_LEAVE and endpoint != None:
+                endpoint.running = False
+                self.detach(endpoint)
+                del self.endpoints[address]
+        except:
+            traceback.print_exc()
+
+class RemoteEndpoint:
+    'A node of another process as seen by the MediumServer, same attributes the Medium uses from a LoopbackTransport'
+
+    def __init__(self, server, address, tag, x, y):
+        self.server = server
+        self.address = address #socket path of the node
+        self.node = types.SimpleNamespace(tag=tag, x=x, y=y)
+        self.running = True
+        self.received = 0
+
+    def receiver(self, data, sender_ip):
+        ip = sender_ip.encode()
+        try:
+            self.server.socket.sendto(transport.UNIX_DATA + bytes([len(ip)]) + ip + data, self.address)
+        except OSError: #the node is gone without leaving
+            self.running = False
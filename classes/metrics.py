@@ -0,0 +1,329 @@
+#!/usr/bin/env python3.7
+
+"""
+Metrics classes are part of a dissertation work about WSNs
+Counters, gauges and histograms of a node, served on a unix socket in the prometheus text format
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import socket, threading, os, bisect, traceback, json, time
+from classes import log
+
+METRICS_PATH = "/tmp/ouroboros/metrics" #one socket per process in here
+HANDLERS = ['_packet_handler', '_adv_handler', '_data_handler', '_forwarder', '_sink', '_node_message'] #timed in every network that has them
+TIME_BUCKETS = [0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1] #seconds
+QUEUE_BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250] #seconds
+
+def open_server(name, folder=None):
+    'Started server on folder/name.sock, folder from metrics_socket in settings.json. None when it is empty'
+    if folder == None:
+        try:
+            settings = json.loads(open("settings.json","r").read())
+            folder = settings.get('metrics_socket', METRICS_PATH)
+        except:
+            traceback.print_exc()
+            folder = METRICS_PATH
+    if not folder:
+        return None
+    server = MetricsServer(os.path.join(folder, name + ".sock"))
+    server.start()
+    return server
+
+class Counter:
+    '''Count that only goes up. inc is a plain add with no lock: only the loop thread of the node updates it,
+    a scrape from another thread reads a value that is at most one update behind. With function the value is read from the node instead'''
+    kind = 'counter'
+
+    def __init__(self, name, help, function=None):
+        self.name = name
+        self.help = help
+        self.function = function
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self):
+        'Lines of the metric as (suffix, labels, value)'
+        value = self.value if self.function == None else self.function()
+        if isinstance(value, tuple): #labels and value
+            return [('', value[0], value[1])]
+        return [('', {}, value)]
+
+class Gauge(Counter):
+    'Value that goes up and down'
+    kind = 'gauge'
+
+    def set(self, value):
+        self.value = value
+
+class Histogram:
+    'Counts of observations per bucket, lock free like Counter'
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets, labels=None):
+        self.name = name
+        self.help = help
+        self.labels = labels or {} #for histograms of one family, like one per handler
+        self.bounds = sorted(buckets) #upper bounds, +Inf is added
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        samples = []
+        total = 0
+        for bound, count in zip(self.bounds + ['+Inf'], self.counts):
+            total += count
+            samples.append(('_bucket', dict(self.labels, le=str(bound)), total))
+        samples.append(('_sum', self.labels, self.sum))
+        samples.append(('_count', self.labels, self.count))
+        return samples
+
+    def quantile(self, q):
+        'Upper bound of the bucket holding the q quantile, the largest bound when it is past them'
+        if self.count == 0:
+            return 0
+        total = 0
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            if total >= q * self.count:
+                return bound
+        return self.bounds[-1]
+
+class Metrics:
+    'Metrics of one node, every line labelled with its name'
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.metrics = []
+        self.families = {} #(name, label value) -> histogram of a family
+        self._first = {} #name -> position of its first metric
+
+    def counter(self, name, help, function=None):
+        return self._add(Counter(name, help, function))
+
+    def gauge(self, name, help, function=None):
+        return self._add(Gauge(name, help, function))
+
+    def histogram(self, name, help, buckets):
+        return self._add(Histogram(name, help, buckets))
+
+    def labelled(self, name, help, buckets, label, value):
+        'Histogram of the family name for one value of label, made on first use'
+        histogram = self.families.get((name, value))
+        if histogram == None:
+            histogram = self.families[(name, value)] = self._add(Histogram(name, help, buckets, {label: value}))
+        return histogram
+
+    def histograms(self):
+        return [metric for metric in self.metrics if metric.kind == 'histogram']
+
+    def render(self):
+        'The metrics in the prometheus text format'
+        return render([self])
+
+    def collect(self, families):
+        'Adds the sample lines of the metrics to families, name -> header lines and sample lines'
+        for metric in sorted(self.metrics, key=lambda metric: self._first[metric.name]): #lines of a family together
+            try:
+                samples = metric.samples()
+            except: #the node is not fully set up, or is shutting down
+                continue
+            if metric.name not in families:
+                families[metric.name] = (['# HELP ' + metric.name + ' ' + metric.help, '# TYPE ' + metric.name + ' ' + metric.kind], [])
+            lines = families[metric.name][1]
+            for suffix, labels, value in samples:
+                labels = dict(labels, node=self.tag)
+                text = ','.join([key + '="' + str(labels[key]) + '"' for key in sorted(labels)])
+                lines.append(metric.name + suffix + '{' + text + '} ' + str(float(value)))
+
+    def _add(self, metric):
+        self._first.setdefault(metric.name, len(self.metrics))
+        self.metrics.append(metric)
+        return metric
+
+def render(nodes):
+    'Prometheus text of the Metrics of many nodes, each family once with the lines of every node'
+    families = {}
+    for metrics in nodes:
+        metrics.collect(families)
+    return join(families)
+
+def join(families):
+    lines = []
+    for header, samples in families.values():
+        lines.extend(header)
+        lines.extend(samples)
+    return '\n'.join(lines) + '\n'
+
+def runtime_value(node, name):
+    'Counter of the event loop of the node, 0 in the simulator'
+    if node.runtime == None:
+        return 0
+    if name == 'pending':
+        return node.runtime.pending()
+    return getattr(node.runtime, name)
+
+#Node metrics read at scrape time: name, type, help and how to read it from the node. Nothing is done on the hot path for these
+NODE_METRICS = [
+    ('wsn_msgs_created_total', 'counter', 'Messages created by the sensor', lambda node: node.Network.protocol_stats[0]),
+    ('wsn_msgs_forwarded_total', 'counter', 'Messages forwarded', lambda node: node.Network.protocol_stats[1]),
+    ('wsn_msgs_delivered_total', 'counter', 'Messages delivered to the sink', lambda node: node.Network.protocol_stats[2]),
+    ('wsn_msgs_discarded_total', 'counter', 'Messages discarded', lambda node: node.Network.protocol_stats[3]),
+    ('wsn_packets_sent_total', 'counter', 'Packets sent by the transport', lambda node: node.Network.transport.sent),
+    ('wsn_packets_received_total', 'counter', 'Packets received by the transport', lambda node: node.Network.transport.received),
+    ('wsn_errors_total', 'counter', 'Protocol errors', lambda node: sum(node.Network.errors)),
+    ('wsn_traffic_pps', 'gauge', 'Packets per second received', lambda node: node.Network.traffic),
+    ('wsn_mode', 'gauge', 'Routing mode of the node, always 1', lambda node: ({'mode': node.Network.mode}, 1)),
+    ('wsn_tmax_ms', 'gauge', 'TMAX in simulated ms', lambda node: node.Network.tmax / node.multiplier),
+    ('wsn_tnext_ms', 'gauge', 'Time a packet waits before being forwarded, in simulated ms', lambda node: node.Network.tnext / node.multiplier),
+    ('wsn_buffer_depth', 'gauge', 'Packets waiting in the forwarding buffer', lambda node: log.buffer_depth(node)),
+    ('wsn_buffer_latency', 'gauge', 'Mean wait of the packets forwarded from the buffer', lambda node: log.buffer_latency(node)),
+    ('wsn_neighbours', 'gauge', 'Visible neighbours', lambda node: len(node.Network.visible)),
+    ('wsn_battery_percent', 'gauge', 'Battery level', lambda node: node.Battery.battery_percent),
+    ('wsn_battery_energy', 'gauge', 'Energy left in the battery', lambda node: node.Battery.battery_energy),
+    ('wsn_comm_energy', 'gauge', 'Energy spent communicating', lambda node: node.Battery.communication_energy),
+    ('wsn_comp_energy', 'gauge', 'Energy spent computing', lambda node: node.Battery.computational_energy),
+    ('wsn_simulation_seconds', 'gauge', 'Simulated seconds elapsed', lambda node: node.simulation_seconds),
+    ('wsn_runtime_events_total', 'counter', 'Events run by the event loop', lambda node: runtime_value(node, 'events')),
+    ('wsn_runtime_errors_total', 'counter', 'Events of the event loop that raised', lambda node: runtime_value(node, 'errors')),
+    ('wsn_runtime_pending', 'gauge', 'Timers waiting in the event loop', lambda node: runtime_value(node, 'pending')),
+]
+
+def node_metrics(node):
+    'Metrics of a node. The ones updated on the hot path are attributes of the result'
+    metrics = Metrics(node.tag)
+    for name, kind, help, function in NODE_METRICS:
+        getattr(metrics, kind)(name, help, lambda function=function: function(node))
+    metrics.rx_bytes = metrics.histogram('wsn_rx_packet_bytes', 'Size of the received packets', [32, 64, 128, 256, 512, 1024, 2048])
+    return metrics
+
+def instrument(network, metrics, names=HANDLERS):
+    """Replaces the handlers of a network object by timed ones, each with a histogram of its run time in real seconds.
+    Must run before the handlers are handed to transports or timers. Times include the handlers called inside"""
+    for name in names:
+        method = getattr(network, name, None)
+        if method != None:
+            setattr(network, name, timed(method, metrics.labelled('wsn_handler_seconds', 'Run time of the protocol handlers', TIME_BUCKETS, 'handler', name)))
+
+def timed(method, histogram):
+    'method observing its run time in histogram, about a microsecond per call'
+    clock = time.perf_counter
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            histogram.observe(clock() - start)
+    return wrapper
+
+class MetricsServer:
+    '''Serves the metrics of the nodes of a process on a unix socket. A plain connection gets the text,
+    an http GET gets it as an http response, so curl --unix-socket and prometheus (through a socket proxy) work'''
+
+    def __init__(self, path):
+        self.path = path
+        self.nodes = [] #Metrics of every node served
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.bind(path)
+        self.socket.listen(8)
+        self.socket.settimeout(0.5) #so the server can see it was closed
+        self.running = False
+
+    def add(self, metrics):
+        self.nodes.append(metrics)
+
+    def render(self):
+        return render(self.nodes)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._server, name='metrics', daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.running = False
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def _server(self):
+        while self.running:
+            try:
+                conn, addr = self.socket.accept()
+            except socket.timeout:
+                continue
+            try:
+                conn.settimeout(0.2) #plain readers send nothing
+                try:
+                    request = conn.recv(1024)
+                except socket.timeout:
+                    request = b''
+                body = self.render().encode()
+                if request.startswith(b'GET'):
+                    conn.sendall(b'HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body)
+                else:
+                    conn.sendall(body)
+            except OSError:
+                pass
+            except:
+                traceback.print_exc()
+            finally:
+                conn.close()
+        self.socket.close()
+
+def scrape(path):
+    'Metrics text of the process serving path'
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(2)
+    try:
+        s.connect(path)
+        s.sendall(b'GET /metrics HTTP/1.0\r\n\r\n')
+        data = b''
+        while True:
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        s.close()
+    return data.split(b'\r\n\r\n', 1)[-1].decode()
+
+def scrape_all(folder=METRICS_PATH):
+    'Metrics of every process serving in folder, one text with each family once'
+    families = {}
+    for name in sorted(os.listdir(folder)) if os.path.isdir(folder) else []:
+        try:
+            text = scrape(os.path.join(folder, name))
+        except OSError: #stale socket of a node that is gone
+            continue
+        family = None
+        for line in text.splitlines():
+            if line.startswith('# HELP '):
+                family = line.split(' ')[2]
+                if family not in families:
+                    families[family] = ([], [])
+            if family == None: #not our format
+                continue
+            if line.startswith('#'):
+                if len(families[family][0]) < 2:
+                    families[family][0].append(line)
+            elif line:
+                families[family][1].append(line)
+    return join(families)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3.7
+
+"""
+Mobility classes are part of a dissertation work about WSNs
+Moves every node of a medium at once with numpy, only the links that change are pushed to the medium
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import numpy as np
+
+def open_mobility(settings, nodes, medium=None, seed=0):
+    '''Mobility model from a dict like the mobility entry of a topology file: model (walk, waypoint or gauss-markov),
+    interval in simulated seconds, the area (width and height, the box around the nodes by default) and the parameters of the model'''
+    settings = dict(settings)
+    model = settings.pop('model')
+    if model not in MODELS:
+        raise ValueError("Unknown mobility model: " + model)
+    return MODELS[model](nodes, medium=medium, seed=seed, **settings)
+
+class Mobility:
+    '''Positions of all the nodes as one array, moved every interval simulated seconds by the model of the subclass.
+    Nodes that moved get their new x and y, for the logs, and the medium relinks them'''
+
+    def __init__(self, nodes, medium=None, seed=0, interval=1, width=None, height=None, sinks=False):
+        self.nodes = nodes #Node objects, in the order of the rows
+        self.medium = medium #None only keeps the positions of the nodes
+        self.interval = interval #simulated seconds between steps
+        self.random = np.random.default_rng(seed) #own draws, the nodes see the same random sequence with or without mobility
+        self.positions = np.array([[node.x, node.y] for node in nodes], dtype=float)
+        self.low = self.positions.min(axis=0) if width == None else np.zeros(2)
+        self.high = self.positions.max(axis=0) if width == None else np.array([width, height], dtype=float)
+        self.fixed = np.array([node.role == 'sink' and not sinks for node in nodes]) #sinks stay put unless sinks is set
+        self.steps = 0
+        self.moves = 0 #node moves pushed to the medium
+        self.links = 0 #links made or broken
+
+    def start(self, scheduler, multiplier=1):
+        'Adds the steps to a scheduler, multiplier is the time multiplier of the nodes. They end when every node has stopped'
+        self.scheduler = scheduler
+        scheduler.add_job(self.step, 'interval', seconds=self.interval * multiplier, id='mobility')
+
+    def step(self):
+        'Moves everybody one interval. Returns the rows of the nodes that moved'
+        if all([node.stop for node in self.nodes]): #nothing left to move, and the simulator ends when its queue is empty
+            self.scheduler.remove_job('mobility')
+            return np.zeros(0, dtype=int)
+        old = self.positions.copy()
+        self._advance(self.interval)
+        self.positions[self.fixed] = old[self.fixed]
+        np.clip(self.positions, self.low, self.high, out=self.positions)
+        moved = np.nonzero((self.positions != old).any(axis=1))[0]
+        for row in moved.tolist():
+            node = self.nodes[row]
+            node.x, node.y = float(self.positions[row, 0]), float(self.positions[row, 1])
+            if self.medium != None:
+                added, removed = self.medium.move(node.Network.transport)
+                self.links += len(added) + len(removed)
+        self.moves += len(moved)
+        self.steps += 1
+        return moved
+
+    def _advance(self, dt):
+        raise NotImplementedError
+
+class RandomWalk(Mobility):
+    'Every node takes a random step of up to step units on each axis, like Auxiliar.random_walk of the CORE scripts. Bounces off the borders'
+
+    def __init__(self, nodes, step=6, **options):
+        Mobility.__init__(self, nodes, **options)
+        self.step_size = step
+
+    def _advance(self, dt):
+        self.positions += self.random.integers(-self.step_size, self.step_size + 1, size=self.positions.shape)
+        self.positions = np.where(self.positions < self.low, 2 * self.low - self.positions, self.positions)
+        self.positions = np.where(self.positions > self.high, 2 * self.high - self.positions, self.positions)
+
+class RandomWaypoint(Mobility):
+    'Every node walks in a straight line to a random point of the area at a random speed, waits pause seconds there and picks another one'
+
+    def __init__(self, nodes, speed=(1, 5), pause=30, **options):
+        Mobility.__init__(self, nodes, **options)
+        self.speed_range = speed #units per simulated second
+        self.pause = pause
+        count = len(nodes)
+        self.targets = self._draw_targets(count)
+        self.speeds = self.random.uniform(speed[0], speed[1], count)
+        self.waiting = np.zeros(count) #pause left at the waypoint
+
+    def _advance(self, dt):
+        walking = self.waiting <= 0
+        self.waiting[~walking] -= dt
+        way = self.targets - self.positions
+        distance = np.hypot(way[:, 0], way[:, 1])
+        reach = self.speeds * dt
+        arrived = walking & (distance <= reach)
+        going = walking & ~arrived
+        self.positions[going] += way[going] * (reach[going] / distance[going])[:, None]
+        self.positions[arrived] = self.targets[arrived]
+        count = int(arrived.sum())
+        if count > 0:
+            self.waiting[arrived] = self.pause
+            self.targets[arrived] = self._draw_targets(count)
+            self.speeds[arrived] = self.random.uniform(self.speed_range[0], self.speed_range[1], count)
+
+    def _draw_targets(self, count):
+        return self.random.uniform(self.low, self.high, size=(count, 2))
+
+class GaussMarkov(Mobility):
+    '''Speed and direction keep alpha of their last value and drift to their means with gaussian noise, so paths are smooth.
+    Near the borders the mean direction turns to the centre of the area'''
+
+    def __init__(self, nodes, speed=3, alpha=0.75, speed_sd=1, direction_sd=0.5, margin=None, **options):
+        Mobility.__init__(self, nodes, **options)
+        count = len(nodes)
+        self.alpha = alpha
+        self.mean_speed = speed
+        self.speed_sd = speed_sd
+        self.direction_sd = direction_sd
+        self.margin = margin if margin != None else 0.1 * (self.high - self.low).min() #border where nodes turn back
+        self.speeds = np.full(count, float(speed))
+        self.directions = self.random.uniform(-np.pi, np.pi, count)
+        self.mean_directions = self.directions.copy()
+
+    def _advance(self, dt):
+        keep = np.sqrt(1 - self.alpha ** 2)
+        count = len(self.speeds)
+        near = ((self.positions - self.low) < self.margin).any(axis=1) | ((self.high - self.positions) < self.margin).any(axis=1)
+        centre = (self.low + self.high) / 2 - self.positions
+        self.mean_directions = np.where(near, np.arctan2(centre[:, 1], centre[:, 0]), self.mean_directions)
+        self.speeds = self.alpha * self.speeds + (1 - self.alpha) * self.mean_speed + keep * self.speed_sd * self.random.standard_normal(count)
+        self.speeds = np.maximum(self.speeds, 0)
+        turn = np.angle(np.exp(1j * (self.mean_directions - self.directions))) #shortest way to the mean, across -pi and pi
+        self.directions = self.directions + (1 - self.alpha) * turn + keep * self.direction_sd * self.random.standard_normal(count)
+        self.positions += (self.speeds * dt)[:, None] * np.column_stack((np.cos(self.directions), np.sin(self.directions)))
+
+MODELS = {'walk': RandomWalk, 'waypoint': RandomWaypoint, 'gauss-markov': GaussMarkov}
@@ -11,6 +11,7 @@ __email__ = "brunobcf@gmail.com"
 
 import socket, os, math, struct, sys, json, traceback, zlib, fcntl, threading
 import time
+from classes import transport, codec, tables, battery, metrics
 
 class Network():
 
@@ -18,12 +19,13 @@ class Network():
         'Initializes the properties of the Node object'
         #### SENSOR ###############################################################################
         self.Node = Node
-        self.visible = [] #our visibble neighbours
+        metrics.instrument(self, Node.metrics) #handler run times, before the handlers are handed out
         self.messages_created = [] #messages created by each node
-        self.messages_delivered = [] #messages delivered at the sink
-        self.messages = []
+        self.messages_delivered = tables.MessageTable() #messages delivered at the sink
+        self.messages = tables.MessageTable() #messages seen by a mote
         self.average = 0
         self.visible_timeout = 3 * (Node.sleeptime / 1000) #timeout when visible neighbours should be removed from list in ms
+        self.visible = tables.NeighbourTable(self.visible_timeout) #our visible neighbours
         #### NETWORK ##############################################################################
         self.net_trans = net_trans #adhoc or sixLoWPANLink
         #print(self.net_trans)
@@ -54,8 +56,9 @@ class Network():
         self.battery_percent_old = 0
         ##################### END OF DEFAULT SETTINGS ###########################################################
         self._setup() #Try to get settings from file
-        self.t2 = threading.Thread(target=self._listener, args=())
-        self.t2.start()
+        self.transport = transport.open_transport(Node, self.bcast_group, self.port, self.net_trans)
+        self.transport.start(self._receive)
+        self.myip = self.transport.address
 
     ############### Public methods ###########################
     def awake_callback(self):
@@ -70,45 +73,24 @@ class Network():
         self._sender(payload)
 
     def shutdown(self):
-        self.t2.join(timeout=2)
+        self.transport.close()
     
     ############### Private methods ##########################
-    def _listener(self):
-        'This method opens a UDP socket to receive data. It runs in infinite loop as long as the node is up'
-        addrinfo = socket.getaddrinfo(self.bcast_group, None)[1]
-        listen_socket = socket.socket(addrinfo[0], socket.SOCK_DGRAM) #UDP
-        listen_socket.bind(('', self.port))
-        self.myip = self._get_ip('eth0')
-        if (self.net_trans=='SIXLOWPANLINK'):
-            group_bin = socket.inet_pton(addrinfo[0], addrinfo[4][0])
-            mreq = group_bin + struct.pack('@I', 0)
-            listen_socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_JOIN_GROUP, mreq)
-        while self.Node.lock: #this infinity loop handles the received packets
-            payload, sender = listen_socket.recvfrom(self.max_packet)
-            payload = json.loads(payload.decode())
-            sender_ip = str(sender[0])
-            self.packets += 1
-            self._packet_handler(payload, sender_ip)
-        listen_socket.close()
+    def _receive(self, payload, sender_ip):
+        'Decodes a received packet and hands it to the packet handler'
+        self.Node.metrics.rx_bytes.observe(len(payload))
+        payload = self.codec.decode(payload)
+        self.packets += 1
+        self._packet_handler(payload, sender_ip)
 
     def _sender(self, value):
         'This method sends an epidemid message with the data read by the sensor'
         start = time.monotonic_ns()/1000000
-        addrinfo = socket.getaddrinfo(self.bcast_group, None)[1] 
-        #getting the first one [0] is related to stream, [1] dgram and [2] raw
-        #addrinfo[0] is the address family, which is same for stream dgram ow raw
-        sender_socket = socket.socket(addrinfo[0], socket.SOCK_DGRAM)
-        if (self.net_trans=='SIXLOWPANLINK'):
-            ttl_bin  = struct.pack('@i', 1) #ttl=1
-            sender_socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_HOPS, ttl_bin)
-        elif (self.net_trans=='ADHOC'):
-            sender_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
         msg_id = zlib.crc32(str((self.Node.simulation_seconds+value)).encode())
         self.messages_created.append([hex(msg_id),self.Node.simulation_seconds])
-        bytes_to_send = json.dumps([2 , hex(msg_id), self.Node.tag, value, self.Node.simulation_seconds, self.ttl, '',0,0]).encode()
-        sender_socket.sendto(bytes_to_send, (addrinfo[4][0], self.port))
-        self.Node.Battery.communication_energy += self.Node.Battery.battery_drainer(self.Node.Battery.modemSleep_current, start, self.Node.Battery.tx_time * self.Node.Battery.tx_current)
-        sender_socket.close()
+        bytes_to_send = self.codec.encode([2 , hex(msg_id), self.Node.tag, value, self.Node.simulation_seconds, self.ttl, '',0,0])
+        self.transport.send(bytes_to_send)
+        self.Node.Battery.battery_drainer(self.Node.Battery.modemSleep_current, start, self.Node.Battery.tx_time * self.Node.Battery.tx_current, category=battery.COMM, operation='tx')
 
     def _packet_handler(self, payload, sender_ip):
         'When a message of type gossip is received from neighbours this method unpacks and handles it'
@@ -128,67 +110,26 @@ class Network():
                     self._forwarder(payload)
                 else:
                     self.protocol_stats[3] +=1
-        self.Node.Battery.communication_energy += self.Node.Battery.battery_drainer(0, start, self.Node.Battery.rx_current * self.Node.Battery.rx_time)
-        self.Node.Battery.computational_energy += self.Node.Battery.battery_drainer(self.Node.Battery.modemSleep_current, start)
+        self.Node.Battery.battery_drainer(0, start, self.Node.Battery.rx_current * self.Node.Battery.rx_time, category=battery.COMM, operation='rx')
+        self.Node.Battery.battery_drainer(self.Node.Battery.modemSleep_current, start, category=battery.COMP, operation='rx')
 
     def _sink(self, payload):
         # This method does not use energy, only for simulation statistics
-        if len(self.messages_delivered) > 0: 
-            for element in range(len(self.messages_delivered)): #check if it's a new message
-                if self.messages_delivered[element][0] == payload[1]: #we already delivered that one
-                    self.messages_delivered[element][4] += 1 #increment counter
-                    if (payload[8]>self.messages_delivered[element][5]): #calculate max and min hops
-                        self.messages_delivered[element][5]=payload[8]
-                    elif (payload[8]<self.messages_delivered[element][6]):
-                        self.messages_delivered[element][6]=payload[8]
-                    self.protocol_stats[2] += 1
-                    not_delivered = False
-                    break
-                else: #new message
-                    not_delivered = True
-        else: #fresh list, add directly
-            not_delivered = True
-            #print("I'm a sink and got a message to dispatch")
-        if not_delivered:
-            self.messages_delivered.append([payload[1],payload[2],payload[4],self.Node.simulation_seconds,1,payload[8],payload[8]]) #add with counter 1
-            self.protocol_stats[2] += 1
+        if self.messages_delivered.update(payload[1], payload[2], payload[4], self.Node.simulation_seconds, payload[8]): #new message, otherwise counter and hops are updated
             self.tSinkCurrent = 0
+        self.protocol_stats[2] += 1
 
     def _node_message(self, packet):
-        if len(self.messages) > 0: 
-            for element in range(len(self.messages)): #check if it's a new message
-                if self.messages[element][0] == packet[1]: #we already delivered that one
-                    self.messages[element][4] += 1 #increment counter
-                    if (packet[8]>self.messages[element][5]): #calculate max and min hops
-                        self.messages[element][5]=packet[8]
-                    elif (packet[8]<self.messages[element][6]):
-                        self.messages[element][6]=packet[8]
-                    not_delivered = False
-                    break
-                else: #new message
-                    not_delivered = True
-        else: #fresh list, add directly
-            not_delivered = True
-        if not_delivered:
-            self.messages.append([packet[1],packet[2],packet[4],self.Node.simulation_seconds,1,packet[8],packet[8]]) #add with counter 1
+        self.messages.update(packet[1], packet[2], packet[4], self.Node.simulation_seconds, packet[8]) #adds it or updates counter and hops
 
     def _forwarder(self, msg):
         'This method forwards a received gossip package to all neighbours'
         'This should be in routing layer'
         start = time.monotonic_ns()/1000000
-        addrinfo = socket.getaddrinfo(self.bcast_group, None)[1] #getting the first one [0] is related to stream, [1] dgram and [2] raw
-        #addrinfo[0] is the address family, which is same for stream dgram ow raw
-        forwarder_socket = socket.socket(addrinfo[0], socket.SOCK_DGRAM)
-        if (self.net_trans=='SIXLOWPANLINK'):
-            ttl_bin = struct.pack('@i', 1) #ttl=1
-            forwarder_socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_HOPS, ttl_bin)
-        elif (self.net_trans=='ADHOC'):
-            forwarder_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        bytes_to_send = json.dumps(msg).encode()
-        forwarder_socket.sendto(bytes_to_send, (addrinfo[4][0], self.port))
+        bytes_to_send = self.codec.encode(msg)
+        self.transport.send(bytes_to_send)
         self.protocol_stats[1] += 1
-        forwarder_socket.close()
-        self.Node.Battery.communication_energy += self.Node.Battery.battery_drainer(self.Node.Battery.modemSleep_current, start, self.Node.Battery.tx_time * self.Node.Battery.tx_current)
+        self.Node.Battery.battery_drainer(self.Node.Battery.modemSleep_current, start, self.Node.Battery.tx_time * self.Node.Battery.tx_current, category=battery.COMM, operation='tx')
 
     def _checkNewMessage(self):
         #this is for sink only
@@ -229,24 +170,11 @@ class Network():
             print ("| "+self.messages_created[member][0]+" \t\t|")
         print("=========================================================")
 
-    def _get_ip(self,iface = 'eth0'):
-        'This should be in routing layer'
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sockfd = sock.fileno()
-        SIOCGIFADDR = 0x8915
-        ifreq = struct.pack('16sH14s', iface.encode('utf-8'), socket.AF_INET, b'\x00'*14)
-        try:
-            res = fcntl.ioctl(sockfd, SIOCGIFADDR, ifreq)
-        except:
-            traceback.print_exc()
-            return None
-        ip = struct.unpack('16sH2x4s8x', res)[2]
-        return socket.inet_ntoa(ip)
-
     def _setup(self):
         settings_file = open("settings.json","r").read()
         settings = json.loads(settings_file)
         self.tSinkMax = settings['sink_starvation'] 
+        self.codec = codec.get_codec(settings.get('wire_format', 'json'), 'GOSSIP')
         self.fanout_max = settings['fan_out_max']
         self.ttl = settings['ttl']
 
@@ -10,6 +10,7 @@ __maintainer__ = "Bruno Chianca Ferreira"
 __email__ = "brunobcf@gmail.com"
 
 import socket, os, math, struct, sys, json, traceback, zlib, fcntl, threading, time, random
+from classes import transport, codec, tables, battery, metrics
 
 class Network():
 
@@ -17,12 +18,13 @@ class Network():
         'Initializes the properties of the Node object'
         #### SENSOR ###############################################################################
         self.Node = Node
-        self.visible = [] #our visibble neighbours
+        metrics.instrument(self, Node.metrics) #handler run times, before the handlers are handed out
         self.messages_created = [] #messages created by each node
-        self.messages_delivered = [] #messages delivered at the sink
-        self.messages = []
+        self.messages_delivered = tables.MessageTable() #messages delivered at the sink
+        self.messages = tables.MessageTable() #messages seen by a mote
         self.average = 0
         self.visible_timeout = 3 * (Node.sleeptime / 1000) #timeout when visible neighbours should be removed from list in ms
+        self.visible = tables.NeighbourTable(self.visible_timeout) #our visible neighbours
         #### NETWORK ##############################################################################
         self.net_trans = net_trans #adhoc or sixLoWPANLink
         #print(self.net_trans)
@@ -53,7 +55,6 @@ class Network():
         self.tmax = tmax * self.Node.second
         self.tSinkCurrent = 0
         self.tSinkMax = 30 * self.Node.sleep_s
-        self.visible = []
         self.mode = "MCFA"
         self.netRatio = 0
         self.packets = 0
@@ -61,8 +62,9 @@ class Network():
         self.ttl = 16
         ##################### END OF DEFAULT SETTINGS ###########################################################
         self._setup() #Try to get settings from file
-        self.t2 = threading.Thread(target=self._listener, args=())
-        self.t2.start()
+        self.transport = transport.open_transport(Node, self.bcast_group, self.port, self.net_trans)
+        self.transport.start(self._receive)
+        self.myip = self.transport.address
 
     ############### Public methods ###########################
     def awake_callback(self):
@@ -75,7 +77,8 @@ class Network():
         elif (self.state=="BACKOFF"):
             if (self.Node.simulation_seconds-self.backoff_timer > self.backoff):
                 self.print_alert("Going to ADV")
-                print(self.Node.prompt_str)
+                if not self.Node.headless:
+                    print(self.Node.prompt_str)
                 self.state = "ADV"
         elif (self.state=="RUNNING"):
             if (self.Node.role == "sink"):
@@ -86,7 +89,7 @@ class Network():
             self._sender(payload)
 
     def shutdown(self):
-        self.t2.join(timeout=2)
+        self.transport.close()
     
     ############### Private methods ##########################
 
@@ -94,21 +97,13 @@ class Network():
         'Sends a bradcast message to advertize itself ot the neighbours'
         start = time.monotonic_ns()/1000000
         #this adv is like a radar ping, trying to find other friends in the ether
-        addrinfo = socket.getaddrinfo(self.bcast_group, None)[1] 
-        #getting the first one [0] is related to stream, [1] dgram and [2] raw
-        #addrinfo[0] is the address family, which is same for stream dgram ow raw
-        adv_socket = socket.socket(addrinfo[0], socket.SOCK_DGRAM)
-        adv_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        if (self.net_trans=='SIXLOWPANLINK'):
-            ttl_bin = struct.pack('@i', 1) #ttl=1
-            adv_socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_HOPS, ttl_bin)
-        bytes_to_send = json.dumps([1 , self.Node.tag, self.cost]).encode()
-        adv_socket.sendto(bytes_to_send, (self.bcast_group, self.port))
-        self.Node.Battery.communication_energy += self.Node.Battery.battery_drainer(self.Node.Battery.modemSleep_current, start, self.Node.Battery.tx_time * self.Node.Battery.tx_current)
-        adv_socket.close()
+        bytes_to_send = self.codec.encode([1 , self.Node.tag, self.cost])
+        self.transport.send(bytes_to_send)
+        self.Node.Battery.battery_drainer(self.Node.Battery.modemSleep_current, start, self.Node.Battery.tx_time * self.Node.Battery.tx_current, category=battery.COMM, operation='tx')
         if (self.adv_counter == 0) and (self.state == "ADV"):
             self.print_alert("Going to RUNNING")
-            print(self.Node.prompt_str)
+            if not self.Node.headless:
+                print(self.Node.prompt_str)
             self.state = "RUNNING"
         else:
             self.adv_counter -= 1
@@ -121,53 +116,32 @@ class Network():
                 self.cost = payload[2] + 1
                 self.backoff = self.boc * self.cost
                 self.backoff_timer = self.Node.simulation_seconds
-        self.Node.Battery.communication_energy += self.Node.Battery.battery_drainer(0, start, self.Node.Battery.rx_current * self.Node.Battery.rx_time)
-        self.Node.Battery.computational_energy += self.Node.Battery.battery_drainer(self.Node.Battery.modemSleep_current, start)
-
-    def _listener(self):
-        'This method opens a UDP socket to receive data. It runs in infinite loop as long as the node is up'
-        addrinfo = socket.getaddrinfo(self.bcast_group, None)[1]
-        listen_socket = socket.socket(addrinfo[0], socket.SOCK_DGRAM) #UDP
-        listen_socket.bind(('', self.port))
-        self.myip = self._get_ip('eth0')
-        if (self.net_trans=='SIXLOWPANLINK'):
-            group_bin = socket.inet_pton(addrinfo[0], addrinfo[4][0])
-            mreq = group_bin + struct.pack('@I', 0)
-            listen_socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_JOIN_GROUP, mreq)
-        while self.Node.lock: #this infinity loop handles the received packets
-            payload, sender = listen_socket.recvfrom(self.max_packet)
-            payload = json.loads(payload.decode())
-            sender_ip = str(sender[0])
-            self.packets += 1
-            if (payload[0]==1): #we got a adv!
-                if self.monitor_mode: print("I am in state:" + self.state + " and got a ADV")
-                if (self.state == "BACKOFF"):
-                    self._adv_handler(payload, sender_ip)
-            elif (payload[0]==2): #we got a data!
-                if self.monitor_mode: 
-                    print("I am in state:" + self.state + " and got a DATA")
-                if (self.state == "RUNNING"):
-                    self._data_handler(payload, sender_ip)
-        listen_socket.close()
+        self.Node.Battery.battery_drainer(0, start, self.Node.Battery.rx_current * self.Node.Battery.rx_time, category=battery.COMM, operation='rx')
+        self.Node.Battery.battery_drainer(self.Node.Battery.modemSleep_current, start, category=battery.COMP, operation='rx')
+
+    def _receive(self, payload, sender_ip):
+        'Decodes a received packet and hands it to the right handler'
+        self.Node.metrics.rx_bytes.observe(len(payload))
+        payload = self.codec.decode(payload)
+        self.packets += 1
+        if (payload[0]==1): #we got a adv!
+            if self.monitor_mode: print("I am in state:" + self.state + " and got a ADV")
+            if (self.state == "BACKOFF"):
+                self._adv_handler(payload, sender_ip)
+        elif (payload[0]==2): #we got a data!
+            if self.monitor_mode: 
+                print("I am in state:" + self.state + " and got a DATA")
+            if (self.state == "RUNNING"):
+                self._data_handler(payload, sender_ip)
 
     def _sender(self, value):
         'This method sends an epidemid message with the data read by the sensor'
         start = time.monotonic_ns()/1000000
-        addrinfo = socket.getaddrinfo(self.bcast_group, None)[1] 
-        #getting the first one [0] is related to stream, [1] dgram and [2] raw
-        #addrinfo[0] is the address family, which is same for stream dgram ow raw
-        sender_socket = socket.socket(addrinfo[0], socket.SOCK_DGRAM)
-        if (self.net_trans=='SIXLOWPANLINK'):
-            ttl_bin  = struct.pack('@i', 1) #ttl=1
-            sender_socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_HOPS, ttl_bin)
-        elif (self.net_trans=='ADHOC'):
-            sender_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
         msg_id = zlib.crc32(str((self.Node.simulation_seconds+value)).encode())
         self.messages_created.append([hex(msg_id),self.Node.simulation_seconds])
-        bytes_to_send = json.dumps([2 , hex(msg_id), self.Node.tag, value, self.Node.simulation_seconds, 0, self.cost]).encode()
-        sender_socket.sendto(bytes_to_send, (addrinfo[4][0], self.port))
-        self.Node.Battery.communication_energy += self.Node.Battery.battery_drainer(self.Node.Battery.modemSleep_current, start, self.Node.Battery.tx_time * self.Node.Battery.tx_current)
-        sender_socket.close()
+        bytes_to_send = self.codec.encode([2 , hex(msg_id), self.Node.tag, value, self.Node.simulation_seconds, 0, self.cost])
+        self.transport.send(bytes_to_send)
+        self.Node.Battery.battery_drainer(self.Node.Battery.modemSleep_current, start, self.Node.Battery.tx_time * self.Node.Battery.tx_current, category=battery.COMM, operation='tx')
 
     def _data_handler(self, payload, sender_ip):
         payload[5] += 1 # adds one hop
@@ -186,68 +160,27 @@ class Network():
                     self.protocol_stats[3] += 1
                     if self.monitor_mode:
                         print(time.asctime(time.localtime())+ " Got a bad data: "+str(payload))
-        self.Node.Battery.communication_energy += self.Node.Battery.battery_drainer(0, start, self.Node.Battery.rx_current * self.Node.Battery.rx_time)
-        self.Node.Battery.computational_energy += self.Node.Battery.battery_drainer(self.Node.Battery.modemSleep_current, start)
+        self.Node.Battery.battery_drainer(0, start, self.Node.Battery.rx_current * self.Node.Battery.rx_time, category=battery.COMM, operation='rx')
+        self.Node.Battery.battery_drainer(self.Node.Battery.modemSleep_current, start, category=battery.COMP, operation='rx')
 
     def _sink(self, payload):
         'This should be in app layer'
         # This method does not use energy, only for simulation statistics
-        if len(self.messages_delivered) > 0: 
-            for element in range(len(self.messages_delivered)): #check if it's a new message
-                if self.messages_delivered[element][0] == payload[1]: #we already delivered that one
-                    self.messages_delivered[element][4] += 1 #increment counter
-                    if (payload[5]>self.messages_delivered[element][5]): #calculate max and min hops
-                        self.messages_delivered[element][5]=payload[5]
-                    elif (payload[5]<self.messages_delivered[element][6]):
-                        self.messages_delivered[element][6]=payload[5]
-                    self.protocol_stats[2] += 1
-                    not_delivered = False
-                    break
-                else: #new message
-                    not_delivered = True
-        else: #fresh list, add directly
-            not_delivered = True
-            #print("I'm a sink and got a message to dispatch")
-        if not_delivered:
-            self.messages_delivered.append([payload[1],payload[2],payload[4],self.Node.simulation_seconds,1,payload[5],payload[5]]) #add with counter 1
-            self.protocol_stats[2] += 1
+        if self.messages_delivered.update(payload[1], payload[2], payload[4], self.Node.simulation_seconds, payload[5]): #new message, otherwise counter and hops are updated
             self.tSinkCurrent = 0
+        self.protocol_stats[2] += 1
 
     def _node_message(self, packet):
-        if len(self.messages) > 0: 
-            for element in range(len(self.messages)): #check if it's a new message
-                if self.messages[element][0] == packet[1]: #we already delivered that one
-                    self.messages[element][4] += 1 #increment counter
-                    if (packet[5]>self.messages[element][5]): #calculate max and min hops
-                        self.messages[element][5]=packet[5]
-                    elif (packet[5]<self.messages[element][6]):
-                        self.messages[element][6]=packet[5]
-                    not_delivered = False
-                    break
-                else: #new message
-                    not_delivered = True
-        else: #fresh list, add directly
-            not_delivered = True
-        if not_delivered:
-            self.messages.append([packet[1],packet[2],packet[4],self.Node.simulation_seconds,1,packet[5],packet[5]]) #add with counter 1
+        self.messages.update(packet[1], packet[2], packet[4], self.Node.simulation_seconds, packet[5]) #adds it or updates counter and hops
 
     def _forwarder(self, msg):
         'This method forwards a received gossip package to all neighbours'
         'This should be in routing layer'
         start = time.monotonic_ns()/1000000
-        addrinfo = socket.getaddrinfo(self.bcast_group, None)[1] #getting the first one [0] is related to stream, [1] dgram and [2] raw
-        #addrinfo[0] is the address family, which is same for stream dgram ow raw
-        forwarder_socket = socket.socket(addrinfo[0], socket.SOCK_DGRAM)
-        if (self.net_trans=='SIXLOWPANLINK'):
-            ttl_bin = struct.pack('@i', 1) #ttl=1
-            forwarder_socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_HOPS, ttl_bin)
-        elif (self.net_trans=='ADHOC'):
-            forwarder_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        bytes_to_send = json.dumps([2 , msg[1], msg[2], msg[3], msg[4], msg[5], msg[6]]).encode()
-        forwarder_socket.sendto(bytes_to_send, (addrinfo[4][0], self.port))
+        bytes_to_send = self.codec.encode([2 , msg[1], msg[2], msg[3], msg[4], msg[5], msg[6]])
+        self.transport.send(bytes_to_send)
         self.protocol_stats[1] += 1
-        forwarder_socket.close()
-        self.Node.Battery.communication_energy += self.Node.Battery.battery_drainer(self.Node.Battery.modemSleep_current, start, self.Node.Battery.tx_time * self.Node.Battery.tx_current)
+        self.Node.Battery.battery_drainer(self.Node.Battery.modemSleep_current, start, self.Node.Battery.tx_time * self.Node.Battery.tx_current, category=battery.COMM, operation='tx')
 
     def _checkNewMessage(self):
         #this is for sink only
@@ -292,33 +225,26 @@ class Network():
 
     def print_error(self,text):
         'Print error message with special format'
+        if self.Node.headless:
+            print("error: " + text, flush=True)
+            return
         print()
         print("\033[1;31;40m"+text+"  \n")
         print("\033[0;37;40m")
 
     def print_alert(self,text):
         'Print alert message with special format'
+        if self.Node.headless:
+            print(text, flush=True)
+            return
         print()
         print("\033[1;32;40m"+text+"  \n")
         print("\033[0;37;40m")
 
-    def _get_ip(self,iface = 'eth0'):
-        'This should be in routing layer'
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sockfd = sock.fileno()
-        SIOCGIFADDR = 0x8915
-        ifreq = struct.pack('16sH14s', iface.encode('utf-8'), socket.AF_INET, b'\x00'*14)
-        try:
-            res = fcntl.ioctl(sockfd, SIOCGIFADDR, ifreq)
-        except:
-            traceback.print_exc()
-            return None
-        ip = struct.unpack('16sH2x4s8x', res)[2]
-        return socket.inet_ntoa(ip)
-
     def _setup(self):
         settings_file = open("settings.json","r").read()
         settings = json.loads(settings_file)
         self.tSinkMax = settings['sink_starvation'] 
+        self.codec = codec.get_codec(settings.get('wire_format', 'json'), 'MCFA')
         self.ttl = settings['ttl']
 
@@ -11,19 +11,26 @@ __email__ = "brunobcf@gmail.com"
 
 import socket, os, math, random, struct, sys, json, traceback, zlib, fcntl, time
 #My classes
-from classes import networkEAGPD, networkGossip, networkMCFA, networkGossipFanout, battery
+from classes import networkEAGPD, networkGossip, networkMCFA, networkGossipFanout, battery, metrics
 
 class Node:
 
-    def __init__(self, energy_model, tag='node', role='mote', multiplier = 1, x=0, y=0, batlim=100, net_trans='ADHOC', protocol='EAGP', tmax=100):
+    def __init__(self, energy_model, tag='node', role='mote', multiplier = 1, x=0, y=0, batlim=100, net_trans='ADHOC', protocol='EAGP', tmax=100, simulator=None, runtime=None, netns=None, iface='eth0', bind_device=False, medium_socket=None, headless=False):
         'Initializes the properties of the Node object'
         random.seed(tag)
         ##################### DEFAULT SETTINGS ###########################################################
         self.lock  = True # when this is false the simulation stops
         self.stop = False
         self.prompt_str = tag + "#>"
+        self.headless = headless #plain output lines, no terminal codes
         #### Simulation specific ##################################################################
         self.multiplier = multiplier #time multiplier for the simulator
+        self.simulator = simulator #discrete event kernel, None when running in real time
+        self.runtime = runtime #real time event loop running the timers of the node, None in the simulator
+        self.netns = netns #network namespace of the node when a host process runs many nodes, None for our own
+        self.iface = iface #interface of the node radio
+        self.bind_device = bind_device #sockets bound to iface, for nodes sharing a namespace
+        self.medium_socket = medium_socket #socket of an emulated radio medium to use instead of the network, see emulate.py
         self.second = 1000 * self.multiplier #duration of a second in ms // this is the simulation second
         #### SENSOR ###############################################################################
         self.role = role #are we a mote or a sink?
@@ -39,7 +46,8 @@ class Node:
         self.simulation_tick_seconds = 0 # this is the total time spent in real world time
         ##################### END OF DEFAULT SETTINGS ###########################################################
         self.setup() #Try to get settings from file
-        self.Battery = battery.Battery(batlim, role, energy_model) #create battery object
+        self.metrics = metrics.node_metrics(self) #counters read by the metrics server, see metrics_socket in settings.json
+        self.Battery = battery.Battery(batlim, role, energy_model, simulator=simulator, metrics=self.metrics) #create battery object
         if protocol == 'EAGP':
             self.Network = networkEAGPD.Network(self, self.Battery, 56123, tmax, net_trans) #create network object        
         elif protocol == 'GOSSIP':
@@ -57,7 +65,7 @@ class Node:
         start = time.monotonic_ns()/1000000
         self.value = random.random()*100
         #self.computational_energy += self.battery_drainer(self.modemSleep_current, start, self.sensor_energy)
-        self.Battery.sensor_reading_energy += self.Battery.battery_drainer(self.Battery.modemSleep_current, start, self.Battery.sensor_energy)
+        self.Battery.battery_drainer(self.Battery.modemSleep_current, start, self.Battery.sensor_energy, category=battery.SENSOR, operation='sensor')
         self.Network.dispatch(self.value)
         self.Network.protocol_stats[0] += 1
 
@@ -71,7 +79,7 @@ class Node:
     def sleep(self):
         #sleep
         self.status = "SLEEP" 
-        self.Battery.sleeping_energy += self.Battery.battery_drainer(0, 0 , self.Battery.modemSleep_current * (self.sleep_s / 3600)) #using sleep = awake energy for now
+        self.Battery.battery_drainer(0, 0 , self.Battery.modemSleep_current * (self.sleep_s / 3600), category=battery.SLEEP) #using sleep = awake energy for now
 
     def printinfo(self):
         'Prints general information about the node'
@@ -10,6 +10,7 @@ __maintainer__ = "Bruno Chianca Ferreira"
 __email__ = "brunobcf@gmail.com"
 
 import os, struct, sys, traceback, threading, time, readline
+from classes import runtime
 from collections import deque
 
 class Prompt:
@@ -47,6 +48,7 @@ class Prompt:
                     elif command[0] == 'buffer':
                         try:
                             node.Network.scheduler.print_jobs()
+                            print("Waiting to be forwarded: " + str(list(node.Network.fwd_buffer.entries)))
                         except:
                             self.print_alert("Not available with this router")
                     elif command[0] == 'backlog':
@@ -62,6 +64,8 @@ class Prompt:
                             sys.stdout.write('.')
                             sys.stdout.flush()
                             time.sleep(1)
+                    elif command[0] == 'threads':
+                        print(runtime.thread_report())
                     elif command[0] == 'msg':
                         node.Network.print_msg_table()
                     elif command[0] == 'monitor':
@@ -90,6 +94,7 @@ class Prompt:
         print("visible   - Display the list of visible neighbours - EAGP Only")
         print("monitor   - Enable monitor mode")
         print("buffer    - Print buffer scheduler")
+        print("threads   - Display the threads of the node")
         print("clear     - Clear the display")
         print("help      - Diplay this help message")
         print("quit      - Exit the agent")
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3.7
+
+"""
+Registry class is part of a dissertation work about WSNs
+Shared memory table with the state of every node of a host, read by the rest api
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import os, mmap, struct, fcntl, json, time
+
+REGISTRY_PATH = "/tmp/ouroboros/registry" #same folder as the socket of the rest api
+
+#Node info: key in the json dumps, struct code and how to read it from the node
+INFO_FIELDS = [
+    ('nodename', '16s', lambda node: node.tag),
+    ('node mode', '8s', lambda node: node.Network.mode),
+    ('current value', 'd', lambda node: node.value),
+    ('battery energy', 'd', lambda node: node.Battery.battery_energy),
+    ('battery percent', 'd', lambda node: node.Battery.battery_percent),
+    ('average level', 'd', lambda node: node.Network.average),
+    ('sleep virtual time', 'd', lambda node: node.sleeptime/node.multiplier),
+    ('sleep time', 'd', lambda node: node.sleeptime),
+    ('node tmax', 'd', lambda node: node.Network.tmax/node.multiplier),
+    ('node tnext', 'd', lambda node: node.Network.tnext/node.multiplier),
+    ('bcast address', '40s', lambda node: node.Network.bcast_group),
+    ('role', '8s', lambda node: node.role),
+    ('msgs created', 'q', lambda node: node.Network.protocol_stats[0]),
+    ('msgs forwarded', 'q', lambda node: node.Network.protocol_stats[1]),
+    ('msgs discarded', 'q', lambda node: node.Network.protocol_stats[3]),
+    ('msgs delivered', 'q', lambda node: node.Network.protocol_stats[2]),
+    ('energy in comp', 'd', lambda node: node.Battery.computational_energy),
+    ('energy in comm', 'd', lambda node: node.Battery.communication_energy),
+    ('elapsed virtual time', 'd', lambda node: node.simulation_seconds),
+    ('elapsed time', 'd', lambda node: node.simulation_tick_seconds),
+]
+
+class Registry:
+    '''Fixed layout table in a mmap'ed file. Every node owns one slot and rewrites it in place,
+    readers copy the slots straight from memory. A sequence number, odd while the slot is being written, lets readers retry torn reads.
+    One object can hold the slots of many nodes of a process. The file grows when it is full'''
+    MAGIC = b'WSNREG1\n'
+    HEADER = struct.Struct('<8sII') #magic, slots, slot size
+    SEQ = struct.Struct('<I')
+    INFO = struct.Struct('<' + ''.join([field[1] for field in INFO_FIELDS]))
+    NEIGHBOUR = struct.Struct('<40sdd') #ip, last seen, battery
+    COUNT = struct.Struct('<H')
+
+    def __init__(self, path=REGISTRY_PATH, slots=256, max_neighbours=32, create=True):
+        'At least slots slots, an existing file with fewer is grown'
+        self.path = path
+        self.slot = None #slot of the last node claimed
+        self.owned = {} #tag -> slot of the nodes claimed here
+        self.max_neighbours = max_neighbours
+        self.neighbours_offset = self.SEQ.size + self.INFO.size
+        self.slot_size = self.neighbours_offset + self.COUNT.size + self.NEIGHBOUR.size * max_neighbours
+        if create:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        else:
+            fd = os.open(path, os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX) #only one process lays out a new file
+            size = os.fstat(fd).st_size
+            if size < self.HEADER.size and create:
+                os.ftruncate(fd, self.HEADER.size + slots * self.slot_size)
+                os.pwrite(fd, self.HEADER.pack(self.MAGIC, slots, self.slot_size), 0)
+            magic, self.slots, slot_size = self.HEADER.unpack(os.pread(fd, self.HEADER.size, 0))
+            if magic != self.MAGIC or slot_size != self.slot_size:
+                raise ValueError("Registry with another layout at: " + path)
+            self.memory = mmap.mmap(fd, self.HEADER.size + self.slots * self.slot_size)
+            if create and self.slots < slots:
+                self._grow(fd, slots)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd) #the map keeps the memory, no descriptor is left open
+
+    def claim(self, tag):
+        'Takes the slot of tag, or the first free one. A node running again reuses its slot'
+        name = tag.encode()[:16]
+        fd = os.open(self.path, os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX) #two nodes must not take the same free slot
+            self._refresh()
+            free = None
+            for slot in range(self.slots):
+                owner = self._name(slot)
+                if owner == name:
+                    self.slot = slot
+                    break
+                elif owner == b'' and free == None:
+                    free = slot
+            else:
+                if free == None: #full, twice as many slots
+                    free = self.slots
+                    self._grow(fd, self.slots * 2)
+                self.slot = free
+                self._write(self.slot, self.SEQ.size, struct.pack('<16s', name))
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        self.owned[tag] = self.slot
+        return self.slot
+
+    def release(self, tag):
+        'Frees the slot of tag, name and sequence number zeroed, so finished nodes do not fill the registry'
+        name = tag.encode()[:16]
+        fd = os.open(self.path, os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX) #not while another node claims
+            self._refresh()
+            self.owned.pop(tag, None)
+            for slot in range(self.slots):
+                if self._name(slot) == name:
+                    start = self._offset(slot)
+                    self.memory[start:start + self.slot_size] = bytes(self.slot_size)
+                    if slot == self.slot:
+                        self.slot = None
+                    return True
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        return False
+
+    def update(self, node):
+        'Writes the info and the visible neighbours of node in its slot'
+        slot = self.owned.get(node.tag)
+        if slot == None:
+            slot = self.claim(node.tag)
+        values = [field[2](node) for field in INFO_FIELDS]
+        for i, field in enumerate(INFO_FIELDS):
+            if field[1].endswith('s'):
+                values[i] = str(values[i]).encode()
+        neighbours = list(node.Network.visible)[:self.max_neighbours]
+        data = self.INFO.pack(*values) + self.COUNT.pack(len(neighbours))
+        for member in neighbours:
+            data += self.NEIGHBOUR.pack(str(member[0]).encode(), member[1], member[2])
+        self._write(slot, self.SEQ.size, data)
+
+    def info(self, tag):
+        'Info of a node as a dict with the keys of the old node dumps, None if it is not there or its slot is stale'
+        data = self._find(tag)
+        return None if data == None else data[0]
+
+    def neighbours(self, tag):
+        'Visible neighbours of a node as a list of dicts, None if it is not there or its slot is stale'
+        data = self._find(tag)
+        return None if data == None else data[1]
+
+    def nodes(self):
+        'Info of every node in the registry, stale slots left out'
+        nodes = []
+        self._refresh()
+        for slot in range(self.slots):
+            if self._name(slot) != b'':
+                data = self._read(slot)
+                if data != None:
+                    nodes.append(data[0])
+        return nodes
+
+    def export(self, tag, folder):
+        'Writes the state of a node as json in folder/node_dumps and folder/neighbours, like the old dumps'
+        for subfolder, data in [("node_dumps", self.info(tag)), ("neighbours", self.neighbours(tag))]:
+            os.makedirs(folder + "/" + subfolder, exist_ok=True)
+            with open(folder + "/" + subfolder + "/" + tag + ".json", "w") as dumpfile:
+                dumpfile.write(json.dumps(data))
+
+    def close(self):
+        self.memory.close()
+
+    def _find(self, tag):
+        self._refresh()
+        for slot in range(self.slots):
+            if self._name(slot) == tag.encode()[:16]:
+                return self._read(slot)
+        return None
+
+    def _grow(self, fd, slots):
+        'Makes room for slots slots, called with the file locked. New slots are zeroes, free'
+        os.ftruncate(fd, self.HEADER.size + slots * self.slot_size)
+        os.pwrite(fd, self.HEADER.pack(self.MAGIC, slots, self.slot_size), 0)
+        self._refresh()
+
+    def _refresh(self):
+        'Maps the slots another process, or another Registry, added to the file'
+        slots = self.HEADER.unpack_from(self.memory, 0)[1]
+        if slots != self.slots:
+            fd = os.open(self.path, os.O_RDWR)
+            try:
+                self.memory = mmap.mmap(fd, self.HEADER.size + slots * self.slot_size) #the old map goes when nobody reads it anymore
+                self.slots = slots
+            finally:
+                os.close(fd)
+
+    def _offset(self, slot):
+        return self.HEADER.size + slot * self.slot_size
+
+    def _name(self, slot):
+        offset = self._offset(slot) + self.SEQ.size
+        return bytes(self.memory[offset:offset + 16]).rstrip(b'\x00')
+
+    def _write(self, slot, offset, data):
+        start = self._offset(slot)
+        seq = ((self.SEQ.unpack_from(self.memory, start)[0] + 1) | 1) & 0xffffffff #odd, being written. Also odd when a dead writer left it odd
+        self.SEQ.pack_into(self.memory, start, seq)
+        self.memory[start + offset:start + offset + len(data)] = data
+        self.SEQ.pack_into(self.memory, start, (seq + 1) & 0xffffffff)
+
+    def _read(self, slot, attempts=100):
+        """Info and neighbours of a slot. None when no clean copy was read in attempts tries:
+        the writer died in the middle of an update (seq left odd) or kept changing the slot"""
+        start = self._offset(slot)
+        values = None
+        members = None
+        for attempt in range(attempts):
+            seq = self.SEQ.unpack_from(self.memory, start)[0]
+            if seq % 2 == 1: #a writer is there
+                time.sleep(0)
+                continue
+            values = self.INFO.unpack_from(self.memory, start + self.SEQ.size)
+            count = self.COUNT.unpack_from(self.memory, start + self.neighbours_offset)[0]
+            members = [self.NEIGHBOUR.unpack_from(self.memory, start + self.neighbours_offset + self.COUNT.size + i * self.NEIGHBOUR.size) for i in range(min(count, self.max_neighbours))]
+            if self.SEQ.unpack_from(self.memory, start)[0] == seq:
+                break
+            values = None #torn, try again
+        if values == None:
+            return None
+        info = {}
+        for field, value in zip(INFO_FIELDS, values):
+            if field[1].endswith('s'):
+                value = value.rstrip(b'\x00').decode()
+            info[field[0]] = value
+        neighbours = []
+        for member in members:
+            ip = member[0].rstrip(b'\x00').decode()
+            neighbours.append({'nodename': ip, 'ip': ip, 'last seen': member[1], 'battery': member[2]})
+        return info, neighbours
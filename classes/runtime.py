@@ -0,0 +1,183 @@
+#!/usr/bin/env python3.7
+
+"""
+Runtime class is part of a dissertation work about WSNs
+Real time event loop of a node, same api as the discrete event simulator
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import heapq, itertools, threading, time, traceback, json, asyncio
+from classes.simulator import Event, Scheduler
+
+def open_runtime(event_loop=None):
+    'Returns the event loop a node should run on, threads or asyncio as set by event_loop in settings.json'
+    if event_loop == None:
+        try:
+            settings = json.loads(open("settings.json","r").read())
+            event_loop = settings.get('event_loop', 'asyncio')
+        except:
+            traceback.print_exc()
+            event_loop = 'asyncio'
+    if event_loop == 'asyncio':
+        return AsyncioRuntime()
+    elif event_loop == 'threads':
+        return Runtime()
+    raise ValueError("Unknown event loop: " + str(event_loop))
+
+class Runtime:
+    '''Event loop running every timer of a node from one queue, in the thread that calls run. Time is in seconds.
+    Other threads may schedule events, the loop wakes up when one of them is due before the one it waits for'''
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.queue = [] #heap of events
+        self.counter = itertools.count() #sequence number for events at the same time
+        self.condition = threading.Condition() #guards the queue, notified when the first event changes
+        self.events = 0 #number of events processed
+        self.errors = 0 #callbacks that raised
+        self.running = False
+        self.thread = None #thread running the loop
+        self.medium = None #emulated radio shared by the nodes of the loop, set by the medium itself
+
+    @property
+    def now(self):
+        return time.monotonic() - self.started
+
+    def schedule(self, delay, callback, *args):
+        'Schedules callback to run delay seconds from now. Safe to call from any thread'
+        with self.condition:
+            event = Event(self.now + delay, next(self.counter), callback, args)
+            heapq.heappush(self.queue, event)
+            if self.queue[0] is event: #the loop may be sleeping for a later event
+                self.condition.notify()
+        return event
+
+    def call_soon(self, callback, *args):
+        'Runs callback in the loop thread as soon as possible'
+        return self.schedule(0, callback, *args)
+
+    def cancel(self, event):
+        'Cancels a scheduled event. It is discarded when it reaches the top of the queue'
+        event.cancelled = True
+
+    def run(self):
+        'Runs events when they are due until stop is called'
+        self.thread = threading.current_thread()
+        with self.condition:
+            self.running = True
+        while True:
+            with self.condition:
+                if not self.running:
+                    break
+                if len(self.queue) == 0:
+                    self.condition.wait()
+                    continue
+                event = self.queue[0]
+                wait = event.time - self.now
+                if wait > 0:
+                    self.condition.wait(wait)
+                    continue
+                heapq.heappop(self.queue)
+            if event.cancelled:
+                continue
+            self.events += 1
+            try:
+                event.callback(*event.args)
+            except: #like apscheduler, a failing job does not stop the others
+                self.errors += 1
+                traceback.print_exc()
+
+    def start(self):
+        'Runs the loop in a new thread'
+        self.thread = threading.Thread(target=self.run, name='runtime', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+    def scheduler(self):
+        'Returns a job scheduler running on this loop'
+        return Scheduler(self)
+
+    def pending(self):
+        'Number of events waiting in the queue, cancelled ones included'
+        return len(self.queue)
+
+class AsyncioRuntime(Runtime):
+    '''Same api as Runtime on top of an asyncio loop, so sockets are served by the loop too and no listener thread is needed.
+    Stopping it cancels whatever is still pending in the loop'''
+
+    def __init__(self):
+        Runtime.__init__(self)
+        self.loop = asyncio.new_event_loop()
+        self.started = self.loop.time()
+
+    @property
+    def now(self):
+        return self.loop.time() - self.started
+
+    def schedule(self, delay, callback, *args):
+        'Schedules callback to run delay seconds from now. Safe to call from any thread'
+        event = Event(self.now + delay, next(self.counter), callback, args)
+        if self._in_loop():
+            self.loop.call_later(delay, self._fire, event)
+        else:
+            self.loop.call_soon_threadsafe(self.loop.call_later, delay, self._fire, event)
+        return event
+
+    def submit(self, coroutine):
+        'Runs a coroutine in the loop. Waits for its result unless called from the loop itself'
+        if self._in_loop():
+            return asyncio.ensure_future(coroutine, loop=self.loop)
+        elif self.loop.is_running():
+            return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+        return self.loop.run_until_complete(coroutine)
+
+    def run(self):
+        'Runs the loop until stop is called, then cancels the tasks left'
+        self.thread = threading.current_thread()
+        self.running = True
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            if len(tasks) > 0:
+                self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        finally:
+            self.running = False
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def close(self):
+        'Releases the loop, after run returned'
+        self.loop.close()
+
+    def pending(self):
+        return len(self.loop._scheduled) #timers waiting, cancelled ones included
+
+    def _in_loop(self):
+        return self.running and self.thread is threading.current_thread()
+
+    def _fire(self, event):
+        if event.cancelled:
+            return
+        self.events += 1
+        try:
+            event.callback(*event.args)
+        except: #like apscheduler, a failing job does not stop the others
+            self.errors += 1
+            traceback.print_exc()
+
+def thread_report():
+    'Threads of this process, to check a node runs with one loop'
+    threads = threading.enumerate()
+    return str(len(threads)) + " threads: " + ", ".join([thread.name for thread in threads])
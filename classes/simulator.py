@@ -0,0 +1,134 @@
+#!/usr/bin/env python3.7
+
+"""
+Simulator class is part of a dissertation work about WSNs
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import heapq, itertools
+
+class JobLookupError(KeyError):
+    'Raised when a job id is not known by the scheduler, same as apscheduler does'
+    pass
+
+class Event:
+    'One entry of the event queue'
+    __slots__ = ('time', 'seq', 'callback', 'args', 'cancelled')
+
+    def __init__(self, time, seq, callback, args):
+        self.time = time
+        self.seq = seq
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.time, self.seq) < (other.time, other.seq) #seq breaks ties, so the order is always the same
+
+class Simulator:
+    'Discrete event kernel: a virtual clock plus a priority queue of events. Time is in seconds.'
+
+    def __init__(self):
+        self.now = 0.0 #virtual clock
+        self.queue = [] #heap of events
+        self.counter = itertools.count() #sequence number for events at the same time
+        self.events = 0 #number of events processed
+        self.running = False
+        self.medium = None #broadcast medium, set by the medium itself
+
+    def schedule(self, delay, callback, *args):
+        'Schedules callback to run delay seconds from now'
+        event = Event(self.now + delay, next(self.counter), callback, args)
+        heapq.heappush(self.queue, event)
+        return event
+
+    def cancel(self, event):
+        'Cancels a scheduled event. It is discarded when it reaches the top of the queue'
+        event.cancelled = True
+
+    def run(self, until=None):
+        'Runs events in time order until the queue is empty, stop is called or the clock reaches until'
+        self.running = True
+        while self.running and len(self.queue) > 0:
+            event = self.queue[0]
+            if until != None and event.time > until:
+                self.now = until
+                break
+            heapq.heappop(self.queue)
+            if event.cancelled:
+                continue
+            self.now = event.time
+            self.events += 1
+            event.callback(*event.args)
+        self.running = False
+
+    def stop(self):
+        self.running = False
+
+    def scheduler(self):
+        'Returns a job scheduler running on this kernel'
+        return Scheduler(self)
+
+class Job:
+    'Periodic job, keeps the fields of apscheduler jobs that are used by the nodes'
+
+    def __init__(self, id, func, args, interval):
+        self.id = id
+        self.func = func
+        self.args = args
+        self.interval = interval
+        self.event = None
+
+    def __str__(self):
+        return self.id + " (trigger: interval[" + str(self.interval) + "s])"
+
+class Scheduler:
+    'Drop in replacement for the apscheduler BackgroundScheduler that runs on simulated time'
+
+    def __init__(self, simulator):
+        self.simulator = simulator
+        self.jobs = {}
+
+    def start(self):
+        pass
+
+    def shutdown(self, wait=True):
+        for job in self.jobs.values():
+            self.simulator.cancel(job.event)
+        self.jobs = {}
+
+    def add_job(self, func, trigger='interval', seconds=0, id=None, args=[]):
+        'Adds an interval job. First run is one interval from now, like apscheduler'
+        if id == None:
+            id = str(next(self.simulator.counter))
+        if id in self.jobs:
+            raise ValueError("Job identifier (" + id + ") conflicts with an existing job")
+        job = Job(id, func, args, seconds)
+        job.event = self.simulator.schedule(seconds, self._run_job, job)
+        self.jobs[id] = job
+        return job
+
+    def remove_job(self, job_id):
+        try:
+            job = self.jobs.pop(job_id)
+        except KeyError:
+            raise JobLookupError(job_id)
+        self.simulator.cancel(job.event)
+
+    def get_jobs(self):
+        return list(self.jobs.values())
+
+    def print_jobs(self):
+        print("Jobstore default:")
+        if len(self.jobs) == 0:
+            print("    No scheduled jobs")
+        for job in self.jobs.values():
+            print("    " + str(job))
+
+    def _run_job(self, job):
+        job.event = self.simulator.schedule(job.interval, self._run_job, job) #rearm first, the job may remove itself
+        job.func(*job.args)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3.7
+
+"""
+Spatial index class is part of a dissertation work about WSNs
+Uniform grid over the positions of the nodes, to find who is in range without comparing every pair
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import math
+
+class GridIndex:
+    '''Positions of keys bucketed in square cells. With cells the size of the radio range the keys in range of a point
+    are in the 9 cells around it, so a query looks at the neighbourhood only and a move touches at most two cells'''
+
+    def __init__(self, cell_size):
+        self.cell_size = max(cell_size, 1e-9)
+        self.cells = {} #(column, row) -> {key: (x, y)}
+        self.positions = {} #key -> (x, y)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, key):
+        return key in self.positions
+
+    def insert(self, key, x, y):
+        self.positions[key] = (x, y)
+        self.cells.setdefault(self._cell(x, y), {})[key] = (x, y)
+
+    def remove(self, key):
+        x, y = self.positions.pop(key)
+        cell = self._cell(x, y)
+        del self.cells[cell][key]
+        if len(self.cells[cell]) == 0:
+            del self.cells[cell]
+
+    def move(self, key, x, y):
+        'Updates the position of key. Returns False if it did not change'
+        old = self.positions[key]
+        if old == (x, y):
+            return False
+        old_cell = self._cell(*old)
+        new_cell = self._cell(x, y)
+        if old_cell == new_cell:
+            self.cells[old_cell][key] = (x, y)
+            self.positions[key] = (x, y)
+        else:
+            self.remove(key)
+            self.insert(key, x, y)
+        return True
+
+    def query(self, x, y, radius):
+        'Keys at most radius away from (x, y)'
+        span = max(1, math.ceil(radius / self.cell_size)) #cells to look at on each side
+        column, row = self._cell(x, y)
+        found = []
+        for dx in range(-span, span + 1):
+            for dy in range(-span, span + 1):
+                for key, (kx, ky) in self.cells.get((column + dx, row + dy), {}).items():
+                    if math.hypot(kx - x, ky - y) <= radius:
+                        found.append(key)
+        return found
+
+    def near(self, key, radius):
+        'Keys in range of key, itself excluded'
+        x, y = self.positions[key]
+        return [other for other in self.query(x, y, radius) if other != key]
+
+    def _cell(self, x, y):
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
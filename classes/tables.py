@@ -0,0 +1,180 @@
+#!/usr/bin/env python3.7
+
+"""
+Protocol tables are part of a dissertation work about WSNs
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import heapq
+from collections import OrderedDict
+
+class MessageTable:
+    'Messages seen by a node indexed by msg id. Records are [msg id, sender, created at, delivered at, counter, max hops, min hops]'
+
+    def __init__(self):
+        self.records = {} #msg id -> record, kept in arrival order
+
+    def update(self, msg_id, sender, created, now, hops):
+        'Adds a new message with counter 1 or counts a copy of a known one. Returns True when the message is new'
+        record = self.records.get(msg_id)
+        if record == None:
+            self.records[msg_id] = [msg_id, sender, created, now, 1, hops, hops]
+            return True
+        record[4] += 1 #increment counter
+        if (hops > record[5]): #calculate max and min hops
+            record[5] = hops
+        elif (hops < record[6]):
+            record[6] = hops
+        return False
+
+    def __contains__(self, msg_id):
+        return msg_id in self.records
+
+    def __getitem__(self, msg_id):
+        return self.records[msg_id]
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(list(self.records.values())) #a copy, the listener may add while we dump
+
+class BoundedStore:
+    'Keeps the last capacity items in insertion order, indexed by key. Like a deque with maxlen but with O(1) lookup and removal'
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.items = OrderedDict() #key -> value, oldest first
+
+    def append(self, key, value=None):
+        'Adds key at the end, a known key is moved to the end. The oldest item is evicted when full'
+        if key in self.items:
+            self.items.move_to_end(key)
+        self.items[key] = value
+        if len(self.items) > self.capacity:
+            self.items.popitem(last=False)
+
+    def get(self, key, default=None):
+        return self.items.get(key, default)
+
+    def pop(self, key, default=None):
+        'Removes key and returns its value'
+        return self.items.pop(key, default)
+
+    def clear(self):
+        self.items.clear()
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(list(self.items))
+
+    def __repr__(self):
+        return 'BoundedStore(' + repr(list(self.items.values())) + ', capacity=' + str(self.capacity) + ')'
+
+class NeighbourTable:
+    '''Visible neighbours indexed by ip. Records are [ip, last seen, battery].
+    Stale neighbours leave through an expiry heap and the battery average, min and max are kept up to date as records change'''
+
+    def __init__(self, timeout):
+        self.timeout = timeout #a neighbour not heard for longer than this is removed
+        self.records = {} #ip -> record, kept in order of arrival
+        self.expiry = [] #heap of (last seen, ip), refreshed records leave old items behind
+        self.batteries = {} #battery level -> number of neighbours with it
+        self.battery_sum = 0
+        self.bmin = None
+        self.bmax = None
+
+    def refresh(self, ip, now, battery=0):
+        'Adds a neighbour or refreshes its timestamp and battery level'
+        record = self.records.get(ip)
+        if record == None:
+            record = [ip, now, battery]
+            self.records[ip] = record
+            self._add_battery(battery)
+        else:
+            if record[1] == now and record[2] == battery: #heard again in the same second
+                return
+            record[1] = now
+            if record[2] != battery:
+                self._remove_battery(record[2])
+                record[2] = battery
+                self._add_battery(battery)
+        heapq.heappush(self.expiry, (now, ip))
+
+    def expire(self, now):
+        'Removes every neighbour not heard for longer than the timeout. Returns how many were removed'
+        removed = 0
+        while len(self.expiry) > 0 and now - self.expiry[0][0] > self.timeout:
+            last_seen, ip = heapq.heappop(self.expiry)
+            record = self.records.get(ip)
+            if record != None and record[1] == last_seen: #not refreshed since
+                del self.records[ip]
+                self._remove_battery(record[2])
+                removed += 1
+        return removed
+
+    def remove(self, ip):
+        record = self.records.pop(ip, None)
+        if record != None:
+            self._remove_battery(record[2])
+
+    def average(self):
+        'Average battery level of the neighbours, None when there are none'
+        if len(self.records) == 0:
+            return None
+        return self.battery_sum / len(self.records)
+
+    def min(self):
+        return self.bmin
+
+    def max(self):
+        return self.bmax
+
+    def ips(self):
+        return list(self.records)
+
+    def clear(self):
+        self.__init__(self.timeout)
+
+    def __contains__(self, ip):
+        return ip in self.records
+
+    def __getitem__(self, ip):
+        return self.records[ip]
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(list(self.records.values()))
+
+    def _add_battery(self, battery):
+        self.batteries[battery] = self.batteries.get(battery, 0) + 1
+        self.battery_sum += battery
+        if self.bmin == None or battery < self.bmin:
+            self.bmin = battery
+        if self.bmax == None or battery > self.bmax:
+            self.bmax = battery
+
+    def _remove_battery(self, battery):
+        self.battery_sum -= battery
+        self.batteries[battery] -= 1
+        if self.batteries[battery] == 0:
+            del self.batteries[battery]
+            if len(self.batteries) == 0:
+                self.bmin = None
+                self.bmax = None
+                self.battery_sum = 0
+            elif battery == self.bmin: #levels are few, finding the next one is cheap
+                self.bmin = min(self.batteries)
+            elif battery == self.bmax:
+                self.bmax = max(self.batteries)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3.7
+
+"""
+Timer wheel class is part of a dissertation work about WSNs
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import threading
+
+class TimerWheel:
+    '''Hashed timer wheel holding packets waiting to be forwarded, keyed by msg id.
+    One scheduler job turns the wheel while it has entries, instead of one job per packet'''
+
+    def __init__(self, scheduler, callback, tick=0.1, slots=512, clock=None, job_id='fwd_wheel', histogram=None):
+        self.scheduler = scheduler #anything with the apscheduler add_job/remove_job api
+        self.callback = callback #called with the value of every entry that expires
+        self.tick = tick #resolution of the wheel in seconds
+        self.slots = [[] for i in range(slots)] #entries are [key, value, expire tick, added at]
+        self.entries = {} #key -> entry, for O(1) lookup and cancel
+        self.current = 0 #ticks turned so far
+        self.clock = clock #function returning the current time, used for the latency stats
+        self.job_id = job_id
+        self.armed = False
+        self.lock = threading.Lock() #the listener adds while the scheduler turns
+        self.stats = [0, 0, 0, 0.0, 0.0] #added, expired, cancelled, total latency, max latency
+        self.listener = None #called with the key and the wait of every entry that expires
+        self.histogram = histogram #metrics.Histogram of the waits, or None
+
+    def add(self, key, value, delay):
+        'Adds value to expire after delay seconds. Returns False if key is already waiting'
+        with self.lock:
+            if key in self.entries:
+                return False
+            expire = self.current + max(1, int(round(delay / self.tick)))
+            entry = [key, value, expire, self._now()]
+            self.entries[key] = entry
+            self.slots[expire % len(self.slots)].append(entry)
+            self.stats[0] += 1
+            if not self.armed: #first entry, start turning
+                self.scheduler.add_job(self._turn, 'interval', seconds=self.tick, id=self.job_id)
+                self.armed = True
+        return True
+
+    def cancel(self, key):
+        'Cancels key, a duplicate arrived before it expired. Returns True if it was waiting'
+        if self.remove(key):
+            self.stats[2] += 1
+            return True
+        return False
+
+    def remove(self, key):
+        'Removes key from the wheel without counting it as cancelled. Returns True if it was waiting'
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry == None:
+                return False
+            entry[1] = None #the slot drops it when its time comes
+            return True
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def depth(self):
+        'Number of entries waiting'
+        return len(self.entries)
+
+    def latency(self):
+        'Average and max time in seconds the expired entries waited in the wheel'
+        if self.stats[1] == 0:
+            return 0.0, 0.0
+        return self.stats[3] / self.stats[1], self.stats[4]
+
+    def clear(self):
+        with self.lock:
+            for slot in self.slots:
+                slot.clear()
+            self.entries.clear()
+            self._disarm()
+
+    def _turn(self):
+        'Scheduler job, one tick of the wheel'
+        with self.lock:
+            self.current += 1
+            slot = self.slots[self.current % len(self.slots)]
+            due = []
+            keep = []
+            for entry in slot:
+                if entry[1] == None: #cancelled
+                    continue
+                if entry[2] <= self.current:
+                    due.append(entry)
+                else: #more than one turn ahead
+                    keep.append(entry)
+            slot[:] = keep
+        for entry in due:
+            with self.lock:
+                value = entry[1]
+                waited = self._now() - entry[3]
+            if value == None: #cancelled by a previous callback
+                continue
+            self.callback(value) #the entry is still there, like a running job
+            with self.lock:
+                if self.entries.get(entry[0]) is entry:
+                    del self.entries[entry[0]]
+                self.stats[1] += 1
+                self.stats[3] += waited
+                if waited > self.stats[4]:
+                    self.stats[4] = waited
+            if self.histogram != None:
+                self.histogram.observe(waited)
+            if self.listener != None:
+                self.listener(entry[0], waited)
+        with self.lock:
+            if len(self.entries) == 0: #nothing waiting, stop turning
+                self._disarm()
+
+    def _disarm(self):
+        'Removes the scheduler job, called with the lock held'
+        if self.armed:
+            self.armed = False
+            try:
+                self.scheduler.remove_job(self.job_id)
+            except:
+                pass
+
+    def _now(self):
+        if self.clock == None: #wheel time, good to one tick
+            return self.current * self.tick
+        return self.clock()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3.7
+
+"""
+Transport classes are part of a dissertation work about WSNs
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import socket, struct, fcntl, threading, traceback, asyncio, os, ctypes, contextlib, json
+from collections import deque
+
+def open_transport(node, bcast_group, port=56123, net_trans='ADHOC'):
+    'Returns the transport a network layer should use for this node'
+    if node.simulator != None:
+        return LoopbackTransport(node.simulator.medium, node)
+    if node.runtime.medium != None: #emulated radio in this process
+        return LoopbackTransport(node.runtime.medium, node)
+    if node.medium_socket != None: #emulated radio of a medium server
+        return UnixTransport(node.medium_socket, node, loop=node.runtime)
+    if getattr(node.runtime, 'loop', None) != None: #asyncio runtime, no listener thread
+        return AsyncioTransport(bcast_group, port, net_trans, node.iface, loop=node.runtime, netns=node.netns, bind_device=node.bind_device)
+    return BroadcastTransport(bcast_group, port, net_trans, node.iface, loop=node.runtime, netns=node.netns, bind_device=node.bind_device)
+
+CLONE_NEWNET = 0x40000000
+
+#First byte of the datagrams between a UnixTransport and a medium server
+UNIX_JOIN = b'J' #node -> server: json with tag and position. server -> node: ip given to the node
+UNIX_DATA = b'D' #node -> server: packet. server -> node: length of the sender ip, sender ip and packet
+UNIX_MOVE = b'M' #node -> server: json with the new position
+UNIX_LEAVE = b'L' #node -> server: the node is gone
+
+@contextlib.contextmanager
+def network_namespace(path):
+    '''Runs the block inside the network namespace at path, like /proc/<pid>/ns/net of a CORE node or /var/run/netns/<name>.
+    Sockets created there stay in that namespace. Only the calling thread changes namespace, and it is back when the block ends'''
+    if path == None:
+        yield
+        return
+    own = os.open('/proc/thread-self/ns/net', os.O_RDONLY)
+    target = os.open(path, os.O_RDONLY)
+    try:
+        _setns(target)
+        try:
+            yield
+        finally:
+            _setns(own)
+    finally:
+        os.close(target)
+        os.close(own)
+
+def _setns(fd):
+    if hasattr(os, 'setns'): #python 3.12
+        os.setns(fd, CLONE_NEWNET)
+    elif ctypes.CDLL(None, use_errno=True).setns(fd, CLONE_NEWNET) != 0:
+        error = ctypes.get_errno()
+        raise OSError(error, os.strerror(error))
+
+def get_ip(iface = 'eth0'):
+    'Gets ip address of an interface'
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sockfd = sock.fileno()
+    SIOCGIFADDR = 0x8915
+    ifreq = struct.pack('16sH14s', iface.encode('utf-8'), socket.AF_INET, b'\x00'*14)
+    try:
+        res = fcntl.ioctl(sockfd, SIOCGIFADDR, ifreq)
+    except:
+        traceback.print_exc()
+        return None
+    finally:
+        sock.close()
+    ip = struct.unpack('16sH2x4s8x', res)[2]
+    return socket.inet_ntoa(ip)
+
+class Transport:
+    'Interface used by the network layers to send and receive broadcast packets'
+
+    def __init__(self):
+        self.address = '' #local address, known after start
+        self.receiver = None #callback receiving (payload, sender_ip)
+        self.sent = 0
+        self.received = 0
+
+    def start(self, receiver):
+        'Starts delivering received packets to receiver(payload, sender_ip)'
+        raise NotImplementedError
+
+    def send(self, data):
+        'Broadcasts data to all neighbours'
+        raise NotImplementedError
+
+    def close(self):
+        'Stops the transport and releases its resources'
+        raise NotImplementedError
+
+class BroadcastTransport(Transport):
+    'UDP broadcast (ipv4 adhoc) or multicast (6LoWPAN link) with one long lived socket for sending'
+
+    def __init__(self, bcast_group, port=56123, net_trans='ADHOC', iface='eth0', max_packet=65535, loop=None, netns=None, bind_device=False):
+        Transport.__init__(self)
+        self.loop = loop #node runtime, packets are handled in its thread. None handles them in the listener thread
+        self.net_trans = net_trans
+        self.port = port
+        self.iface = iface
+        self.max_packet = max_packet
+        self.netns = netns #network namespace of the node when many nodes share a process, None for our own
+        self.bind_device = bind_device #sockets only use iface, for nodes sharing a namespace
+        self.running = False
+        #resolved once, getting [1] is related to dgram, [0] is stream and [2] raw
+        self.addrinfo = socket.getaddrinfo(bcast_group, None)[1]
+        self.destination = (self.addrinfo[4][0], port)
+        with network_namespace(self.netns):
+            self.sender_socket = socket.socket(self.addrinfo[0], socket.SOCK_DGRAM)
+        if self.bind_device:
+            self.sender_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, self.iface.encode())
+        if (self.net_trans=='SIXLOWPANLINK'):
+            ttl_bin = struct.pack('@i', 1) #ttl=1
+            self.sender_socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_HOPS, ttl_bin)
+        elif (self.net_trans=='ADHOC'):
+            self.sender_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+
+    def start(self, receiver):
+        self.receiver = receiver
+        self.listen_socket = self._listen_socket()
+        self.listen_socket.settimeout(0.5) #so the listener can see it was closed
+        with network_namespace(self.netns):
+            self.address = get_ip(self.iface)
+        self.running = True
+        self.thread = threading.Thread(target=self._listener, args=(), name='listener')
+        self.thread.start()
+
+    def send(self, data):
+        self.sender_socket.sendto(data, self.destination)
+        self.sent += 1
+
+    def close(self):
+        self.running = False
+        try:
+            self.thread.join(timeout=2)
+        except AttributeError:
+            pass
+        self.sender_socket.close()
+
+    def _listen_socket(self):
+        'UDP socket bound to the port, joined to the multicast group on 6LoWPAN'
+        with network_namespace(self.netns):
+            listen_socket = socket.socket(self.addrinfo[0], socket.SOCK_DGRAM)
+        if self.bind_device: #other nodes of the process listen on the same port
+            listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, self.iface.encode())
+        listen_socket.bind(('', self.port))
+        if (self.net_trans=='SIXLOWPANLINK'):
+            group_bin = socket.inet_pton(self.addrinfo[0], self.addrinfo[4][0])
+            mreq = group_bin + struct.pack('@I', 0)
+            listen_socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_JOIN_GROUP, mreq)
+        return listen_socket
+
+    def _listener(self):
+        'Receives packets while the transport is running'
+        while self.running: #this infinity loop handles the received packets
+            try:
+                payload, sender = self.listen_socket.recvfrom(self.max_packet)
+            except socket.timeout:
+                continue
+            self.received += 1
+            if self.loop != None:
+                self.loop.call_soon(self.receiver, payload, str(sender[0]))
+            else:
+                self.receiver(payload, str(sender[0]))
+        self.listen_socket.close()
+
+class AsyncioTransport(BroadcastTransport):
+    '''Same sockets as BroadcastTransport, but packets are received by an asyncio DatagramProtocol in the loop of an AsyncioRuntime.
+    There is no listener thread to wait for, close returns at once'''
+
+    def start(self, receiver):
+        self.receiver = receiver
+        with network_namespace(self.netns):
+            self.address = get_ip(self.iface)
+        listen_socket = self._listen_socket()
+        listen_socket.setblocking(False)
+        self.running = True
+        self.endpoint = None
+        self.loop.submit(self.loop.loop.create_datagram_endpoint(lambda: _DatagramReceiver(self), sock=listen_socket))
+
+    def close(self):
+        self.running = False
+        if self.endpoint != None:
+            self.loop.call_soon(self.endpoint.close) #in the loop thread, whichever thread closes
+        self.sender_socket.close()
+
+class _DatagramReceiver(asyncio.DatagramProtocol):
+    'Hands the packets received by the asyncio endpoint to its transport'
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def connection_made(self, endpoint):
+        self.transport.endpoint = endpoint
+
+    def datagram_received(self, data, address):
+        if self.transport.running:
+            self.transport.received += 1
+            self.transport.receiver(data, str(address[0]))
+
+    def error_received(self, error):
+        traceback.print_exception(type(error), error, error.__traceback__)
+
+class Loopback:
+    'In memory broadcast hub. Every attached transport receives what the others send'
+
+    def __init__(self, network='10.0.0.'):
+        self.network = network #prefix for the addresses given to the transports
+        self.members = [] #attached transports, in order of attachment
+        self.addresses = {} #transport -> ip
+        self.pending = deque() #packets waiting to be delivered
+        self.delivering = False
+        self.deliveries = 0
+
+    def attach(self, transport):
+        ip = self.network + str(len(self.addresses) + 1)
+        self.addresses[transport] = ip
+        self.members.append(transport)
+        return ip
+
+    def detach(self, transport):
+        if transport in self.members:
+            self.members.remove(transport)
+
+    def broadcast(self, transport, data):
+        sender_ip = self.addresses[transport]
+        for receiver in self.members:
+            if receiver is not transport:
+                self.pending.append((receiver, data, sender_ip))
+        if self.delivering: #a handler is sending, the outer loop delivers it
+            return
+        self.delivering = True
+        try:
+            while len(self.pending) > 0:
+                receiver, data, sender_ip = self.pending.popleft()
+                self._deliver(receiver, data, sender_ip)
+        finally:
+            self.delivering = False
+
+    def _deliver(self, receiver, data, sender_ip):
+        if receiver.running: #it may have left in the meantime
+            self.deliveries += 1
+            receiver.received += 1
+            receiver.receiver(data, sender_ip)
+
+class LoopbackTransport(Transport):
+    'Transport on an in memory hub, a Loopback or a Medium'
+
+    def __init__(self, hub, node=None):
+        Transport.__init__(self)
+        self.hub = hub
+        self.node = node #the medium uses its position
+        self.running = False
+
+    def start(self, receiver):
+        self.receiver = receiver
+        self.address = self.hub.attach(self)
+        self.running = True
+
+    def send(self, data):
+        if self.running:
+            self.sent += 1
+            self.hub.broadcast(self, data)
+
+    def close(self):
+        self.running = False
+        self.hub.detach(self)
+
+class UnixTransport(Transport):
+    '''Transport on a medium server of another process (medium.MediumServer), through unix datagram sockets.
+    The server decides who is in range, so the node needs no network namespace or CORE'''
+
+    def __init__(self, server_path, node, loop=None, max_packet=65535):
+        Transport.__init__(self)
+        self.server_path = server_path
+        self.node = node
+        self.loop = loop #node runtime, packets are handled in its thread. None handles them in the listener thread
+        self.max_packet = max_packet
+        self.path = server_path + "." + node.tag #our own socket, next to the one of the server
+        self.running = False
+
+    def start(self, receiver):
+        self.receiver = receiver
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.bind(self.path)
+        self.socket.settimeout(5)
+        self.socket.sendto(UNIX_JOIN + json.dumps({'tag': self.node.tag, 'x': self.node.x, 'y': self.node.y}).encode(), self.server_path)
+        while True: #packets of the others may arrive before the answer
+            data = self.socket.recv(self.max_packet + 64)
+            if data[:1] == UNIX_JOIN:
+                self.address = data[1:].decode()
+                break
+        self.socket.settimeout(0.5) #so the listener can see it was closed
+        self.running = True
+        self.thread = threading.Thread(target=self._listener, args=(), name='listener')
+        self.thread.start()
+
+    def send(self, data):
+        if self.running:
+            self.socket.sendto(UNIX_DATA + data, self.server_path)
+            self.sent += 1
+
+    def move(self, x, y):
+        'Tells the server the node is somewhere else'
+        if self.running:
+            self.socket.sendto(UNIX_MOVE + json.dumps({'x': x, 'y': y}).encode(), self.server_path)
+
+    def close(self):
+        if not self.running:
+            return
+        self.running = False
+        try:
+            self.socket.sendto(UNIX_LEAVE, self.server_path)
+        except OSError: #the server is gone already
+            pass
+        self.thread.join(timeout=2)
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def _listener(self):
+        while self.running:
+            try:
+                data = self.socket.recv(self.max_packet + 64)
+            except socket.timeout:
+                continue
+            if data[:1] != UNIX_DATA:
+                continue
+            size = data[1]
+            sender_ip = data[2:2 + size].decode()
+            payload = data[2 + size:]
+            self.received += 1
+            if self.loop != None:
+                self.loop.call_soon(self.receiver, payload, sender_ip)
+            else:
+                self.receiver(payload, sender_ip)
+        self.socket.close()
@@ -1,5 +1,7 @@
-import flask, json, requests, os, socket, traceback
+import flask, json, requests, os, sys, socket, traceback
 from multiprocessing import Process
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from classes import registry, metrics
 
 motes_global = []
 class Api(flask.Flask):
@@ -18,8 +20,15 @@ class Api(flask.Flask):
             #pass
             traceback.print_exc()
 
+    def registry(self):
+        'Node state shared by the nodes, mapped on the first request'
+        if self.shared == None:
+            self.shared = registry.Registry(create=False)
+        return self.shared
+
     def __init__(self, _motes):
         app = flask.Flask(__name__)
+        self.shared = None
         list_nodes = []
         for mote in _motes:
             list_nodes.append(mote.name)
@@ -65,17 +74,10 @@ class Api(flask.Flask):
         @app.route("/nodedumps")
         def dumps():
             qnode = flask.request.args.get('node')
-            path ="./node_dumps" 
-            f = []
             node_info={}
-            for (dirpath, dirnames, filenames) in os.walk(path):
-                f.extend(filenames)
-                break
-            for node in f:
-                if node.split('.')[0] == qnode:
-                    dump_file = open(path+"/"+node,"r").read()
-                    info=json.loads(dump_file)
-                    node_info = json.dumps({qnode:info})
+            info = self.registry().info(qnode)
+            if info != None:
+                node_info = json.dumps({qnode:info})
             if node_info != {}:
                 response = app.response_class(
                     response=node_info,
@@ -98,20 +100,10 @@ class Api(flask.Flask):
         @app.route("/neighbours")
         def neighbours():
             qnode = flask.request.args.get('node')
-            path ="./neighbours" 
-            files = []
             neighbours=[]
-            for (dirpath, dirnames, filenames) in os.walk(path):
-                files.extend(filenames)
-                break
-            for node in files:
-                if node.split('.')[0] == qnode:
-                    dump_file = open(path+"/"+node,"r").read()
-                    nodes = dump_file.split(';')
-                    for vizinho in range(len(nodes)-1):
-                        info=json.loads(nodes[vizinho])
-                        neighbours.append(info)
-                    neighbours = json.dumps(neighbours)
+            visible = self.registry().neighbours(qnode)
+            if visible != None and len(visible) > 0:
+                neighbours = json.dumps(visible)
             if neighbours != []:
                 response = app.response_class(
                     response=neighbours,
@@ -131,6 +123,16 @@ class Api(flask.Flask):
                 header = response.headers
                 header['Access-Control-Allow-Origin'] = '*'
                 return response
+        @app.route("/metrics")
+        def node_metrics():
+            response = app.response_class(
+                response=metrics.scrape_all(),
+                status=200,
+                mimetype='text/plain'
+            )
+            header = response.headers
+            header['Access-Control-Allow-Origin'] = '*'
+            return response
         @app.route("/shutdown") #deprecated
         def shutdown():
             self.server.terminate()
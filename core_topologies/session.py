@@ -0,0 +1,246 @@
+#!/usr/bin/python3
+#
+# builds a CORE session from a topology file of the topologies folder: one wlan
+# with the range and delay of the topology, one node per entry at its position,
+# and runs the agent in each of them until all of them finish. With host mode one
+# host.py runs all the agents, each one in the network namespace of its CORE node
+
+import threading, sys, time, random, os, traceback, playsound, json, argparse, subprocess
+import rest, socket
+
+
+import logging
+from builtins import range
+from core import load_logging_config
+from core.emulator.coreemu import CoreEmu
+from core.emulator.emudata import IpPrefixes, NodeOptions
+from core.emulator.enumerations import NodeTypes, EventTypes
+from core.location.mobility import BasicRangeModel
+from core import constants
+
+load_logging_config()
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+TOPOLOGIES_DIR = os.path.join(ROOT_DIR, 'topologies')
+MAX_NODES = 253 #the agents broadcast to 10.0.0.255, so all of them must fit in 10.0.0.0/24
+
+nodes_to_send = []
+
+class Auxiliar:
+
+    def __init__(self, path, motes):
+        self.motes = motes
+        self.path = path
+        self.nodesfinished = 0
+
+    def random_walk(self,motes):
+        for mote in motes:
+            pos = mote.getposition()
+            #print(motes[0].getposition())
+            mote.setposition(pos[0]+random.randint(-6,6),pos[1]+random.randint(-6,6))
+
+    def check_finished(self):
+        files = []
+        for (dirpath, dirnames, filenames) in os.walk(self.path):
+            files.extend(filenames)
+            break
+        if len(files) >= len(self.motes):
+            print('should be finished')
+            return False
+        if len(files) > self.nodesfinished:
+            self.nodesfinished = len(files)
+            logging.info(str(self.nodesfinished) + " nodes finished")
+        return True
+
+def load(name):
+    'Reads a topology by name (chaos) or by path (topologies/chaos.json)'
+    path = name
+    if not os.path.exists(path):
+        path = os.path.join(TOPOLOGIES_DIR, name + '.json')
+    return json.loads(open(path, "r").read())
+
+def nodes_file(topo, motes, ifaces, path):
+    'Writes the nodes file of host.py: topo with the namespace and interface of the CORE node of every entry'
+    nodes = dict(topo)
+    nodes['nodes'] = [dict(spec, netns="/proc/" + str(mote.pid) + "/ns/net", iface=iface) for spec, mote, iface in zip(topo['nodes'], motes, ifaces)]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as nodesfile:
+        nodesfile.write(json.dumps(nodes, indent=4))
+    return path
+
+def fire(motes, time_to_start, timeout=60):
+    'Sends the start time to every agent, on the socket it waits on. Agents still starting are retried until timeout'
+    deadline = time.time() + timeout
+    for mote in motes:
+        while True:
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                s.connect("/tmp/ouroboros.sock."+str(mote.name))
+                s.send(str(time_to_start).encode())
+                break
+            except OSError:
+                if time.time() > deadline:
+                    traceback.print_exc()
+                    break
+                time.sleep(0.2)
+            finally:
+                s.close()
+
+def topology(topo, tmax=10, protocol='eagp', time_mul=0.1, simul_max=20000, board_type='esp8266', host_mode=False, headless=False):
+    '''Runs topo, a dict in the format of the topologies folder, in a new CORE session.
+    With host_mode all the agents run in one host.py process on this machine instead of one main.py in each CORE node.
+    With headless the main.py of each CORE node runs without an xterm, its output in /tmp/ouroboros/logs'''
+    global nodes_to_send
+    radius = topo['radius']
+    topofile = topo['name']
+    specs = topo['nodes']
+    if len(specs) > MAX_NODES:
+        raise ValueError("CORE sessions take up to " + str(MAX_NODES) + " nodes, use sim.py or host.py for " + str(len(specs)))
+    motes = []
+    # ip generator for example
+    prefixes = IpPrefixes("10.0.0.0/24")
+
+    # create emulator instance for creating sessions and utility methods
+    coreemu = CoreEmu()
+    session = coreemu.create_session()
+
+    # must be in configuration state for nodes to start, when using "node_add" below
+    session.set_state(EventTypes.CONFIGURATION_STATE)
+
+    # create wlan network node
+    wlan = session.add_node(_type=NodeTypes.WIRELESS_LAN)
+    session.mobility.set_model(wlan, BasicRangeModel,config={'range':radius, 'bandwidth': 54000000, 'jitter': int(topo.get('jitter_ms', 0) * 1000), 'delay': int(topo.get('delay_ms', 5) * 1000), 'error': int(topo.get('loss', 0) * 100)})
+    session.mobility.get_models(wlan)
+
+    # create nodes, must set a position for wlan basic range model
+    node_options=[]
+    for spec in specs:
+        options = NodeOptions(name=spec['name'])
+        options.set_position(spec['x'], spec['y'])
+        node_options.append(options)
+    #adding the nodes
+    for node_opt in node_options:
+        motes.append(session.add_node(node_options=node_opt))
+
+    #configuring links
+    ifaces = []
+    for mote in motes:
+        interface = prefixes.create_interface(mote)
+        session.add_link(mote.id, wlan.id, interface_one=interface)
+        ifaces.append(interface.name or 'eth0')
+
+    # instantiate session
+    session.instantiate()
+
+    #get simdir
+    simdir = str(time.localtime().tm_year) + "_" + str(time.localtime().tm_mon) + "_" + str(time.localtime().tm_mday) + "_" + str(time.localtime().tm_hour) + "_" + str(time.localtime().tm_min)
+
+    host = None
+    if host_mode: #one process for all the agents, it enters the namespace of each CORE node
+        path = nodes_file(topo, motes, ifaces, os.path.join(ROOT_DIR, "reports", simdir, "nodes.json"))
+        output = open(os.path.join(ROOT_DIR, "reports", simdir, "host.log"), "w")
+        host = subprocess.Popen([sys.executable, "host.py", path, str(tmax), protocol, str(time_mul), str(simul_max), '-m', board_type, '-o', simdir, '--headless'],
+                                cwd=ROOT_DIR, stdin=subprocess.DEVNULL, stdout=output, stderr=subprocess.STDOUT)
+        output.close()
+        path = os.path.join(ROOT_DIR, "reports", simdir, "finished")
+    else:
+        #create sinks and motes, each one with the role, position and battery of its entry
+        for mote, spec in zip(motes, specs):
+            arguments = str(mote.name) + ' ' + spec['role'] + ' ' + str(time_mul) + ' ' + board_type + ' ' + str(tmax) + ' ' + topofile + ' ' + str(spec['x'])  + ' ' +  str(spec['y']) + ' ' + protocol + ' adhoc '+ str(spec['battery']) + ' ' + str(simul_max)
+            if headless:
+                mote.cmd("bash /opt/eagp_sim/run.sh '" + arguments + "' --headless", wait=False, shell=True)
+            else:
+                mote.client.term_cmd("bash","/opt/eagp_sim/run.sh",[arguments])
+        path ="./reports/" + simdir + "/finished"
+
+    time.sleep(5 + len(motes) / 50) #wait for nodes to start and create socket
+    time_to_start = time.time()+2
+    #firing up the motes
+    fire(motes, time_to_start)
+
+    time.sleep(1)
+    t1 = threading.Thread(target=send_nodes)
+    t1.start() #starts socket
+    Rest = rest.Api(motes)
+    logging.info("Checking for nodes finished in: " + path)
+    Aux = Auxiliar(path, motes)
+    lock=True
+    counter = 0
+    while lock==True:
+        lock = Aux.check_finished()
+        if host != None and host.poll() != None: #host.py is gone, nothing else will finish
+            logging.info("host.py exited with " + str(host.returncode))
+            lock = False
+        #if counter > 40: Aux.random_walk(motes)
+        nodes_to_send = []
+        for mote in motes:
+            data = mote.data('node')
+            nodes_to_send.append(data)
+        nodes_to_send.append(radius)
+        counter += 1
+        time.sleep(1)
+
+    # shutdown session
+    Rest.shutdown()
+    stop_thread()
+    t1.join(timeout=1)
+    playsound.playsound('fim.mp3')
+    coreemu.shutdown()
+
+def send_nodes():
+    global nodes_to_send
+    #this section is a synchronizer so that all nodes can start at the same time
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        os.remove("/tmp/ouroboros/nodes.sock")
+        os.mkdir("/tmp/ouroboros/")
+    except OSError:
+        #traceback.print_exc()
+        pass
+    s.bind("/tmp/ouroboros/nodes.sock")
+    s.listen(1)
+    while True:
+        conn, addr = s.accept()
+        data = conn.recv(64)
+        if data.decode()=='get':
+            conn.send(json.dumps(nodes_to_send).encode())
+        elif data.decode()=='quit':
+            break
+        conn.close()
+    #print(float(data))
+    #receives the global time when they should start. Same for all and in this simulation the clock is universal since all nodes run in the same computer
+    s.close()
+    return data
+
+def stop_thread():
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.connect("/tmp/ouroboros/nodes.sock")
+    s.send('quit'.encode())
+    s.close()
+
+def main(name=None):
+    'Command line of the topology scripts: tmax protocol time_mul simul_max, with the topology fixed by the script'
+    parser = argparse.ArgumentParser(description='Runs a topology file in CORE')
+    if name == None:
+        parser.add_argument('topology', type=str, help='Topology name or file, see the topologies folder')
+    parser.add_argument('args', nargs='*', help='tmax protocol time_mul simul_max')
+    parser.add_argument('--host', help='All the agents in one host.py process, in the namespaces of the CORE nodes, instead of one main.py in each node', action='store_true')
+    parser.add_argument('--headless', help='No xterm for the agents, main.py runs with --headless and logs to /tmp/ouroboros/logs', action='store_true')
+    arguments = parser.parse_args()
+    if name == None:
+        name = arguments.topology
+    argv = arguments.args
+    try:
+        tmax = argv[0]
+        protocol = argv[1]
+        time_mul = float(argv[2])
+        simul_max = int(argv[3])
+    except:
+        tmax = 100
+        protocol = 'eagp'
+        time_mul = 1
+        simul_max = 20000
+    topology(load(name),tmax,protocol,time_mul,simul_max,host_mode=arguments.host,headless=arguments.headless)
+
+if __name__ == "__main__":
+    main()
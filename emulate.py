@@ -0,0 +1,113 @@
+#!/usr/bin/env python3.7
+
+"""
+Radio emulator is part of a dissertation work about WSNs
+Runs a topology in real time without CORE: the wlan is replaced by an emulated medium with delay, jitter and loss
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import sys, os, json, time, argparse, traceback, socket, subprocess
+from classes import medium, runtime
+import host
+
+def start_nodes(tags, timeout=30):
+    'Sends the same start time to every node, on the sockets main.py waits on. Returns the start time'
+    sockets = []
+    deadline = time.time() + timeout
+    for tag in tags:
+        while True: #the node may not be listening yet
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                s.connect("/tmp/ouroboros.sock." + tag)
+                break
+            except OSError:
+                s.close()
+                if time.time() > deadline:
+                    raise TimeoutError("Node " + tag + " did not start")
+                time.sleep(0.1)
+        sockets.append(s)
+    start = time.time() + 1
+    for s in sockets:
+        s.send(str(start).encode())
+        s.close()
+    return start
+
+def spawn(topology, tmax, protocol, time_multi, simulation_limit, board_type='esp8266', simdir=None, seed=0, path=None):
+    '''Runs one main.py process per node, all of them on a medium server of this process. Node output goes to logs/ in the report folder.
+    Only one such run at a time, nodes wait for the start time on sockets named after them'''
+    if simdir == None:
+        simdir = str(time.localtime().tm_year) + "_" + str(time.localtime().tm_mon) + "_" + str(time.localtime().tm_mday) + "_" + str(time.localtime().tm_hour) + "_" + str(time.localtime().tm_min)
+    if path == None:
+        path = "/tmp/ouroboros/medium/" + str(os.getpid()) + ".sock"
+    Runtime = runtime.Runtime() #only delivers packets, no asyncio needed
+    server = medium.MediumServer(Runtime, path, radius=topology['radius'], delay=topology.get('delay_ms', 5) / 1000, jitter=topology.get('jitter_ms', 0) / 1000,
+                                 loss=topology.get('loss', 0), seed=seed)
+    server.start()
+    Runtime.start()
+    os.makedirs("reports/" + simdir + "/logs", exist_ok=True)
+    processes = []
+    try:
+        for spec in topology['nodes']:
+            output = open("reports/" + simdir + "/logs/" + spec['name'] + ".log", "w")
+            arguments = [sys.executable, "main.py", spec['name'], spec['role'], str(time_multi), board_type, str(tmax), topology['name'], str(int(spec['x'])), str(int(spec['y'])),
+                         protocol, 'adhoc', str(spec['battery']), str(simulation_limit), '--headless', '--medium', path, '--simdir', simdir]
+            processes.append(subprocess.Popen(arguments, stdin=subprocess.DEVNULL, stdout=output, stderr=subprocess.STDOUT))
+            output.close()
+        start_nodes([spec['name'] for spec in topology['nodes']])
+        print(str(len(processes)) + " nodes started on " + path)
+        for process in processes:
+            process.wait()
+    finally:
+        for process in processes:
+            if process.poll() == None:
+                process.terminate()
+        Runtime.stop()
+        server.close()
+    print(str(server.deliveries) + " packets delivered, " + str(server.lost) + " lost")
+    return "reports/" + simdir
+
+if __name__ == '__main__':  #for main run the main function. This is only run when this main python file is called, not when imported as a class
+    print("Radio emulator for the routing agents")
+    print()
+    parser = argparse.ArgumentParser(description='Options as below')
+    parser.add_argument('topology', type=str, help='Topology file, see the topologies folder')
+    parser.add_argument('tmax', type=int, help='TMAX parameter of the EAGP protocol')
+    parser.add_argument('protocol', type=str, help='Protocol to use', choices=['eagp', 'gossip', 'gossipfo', 'mcfa'])
+    parser.add_argument('multiplier', type=float, help='Time multiplier')
+    parser.add_argument('maxtime', type=int, help='Maximum simulation time in seconds')
+    parser.add_argument('-m','--model', type=str, help='Energy model', default='esp8266')
+    parser.add_argument('-o','--simdir', type=str, help='Report folder inside reports/', default=None)
+    parser.add_argument('-d','--delay', type=float, help='Delay of the medium in ms, overrides the topology', default=None)
+    parser.add_argument('-j','--jitter', type=float, help='Extra random delay of the medium in ms, overrides the topology', default=None)
+    parser.add_argument('-l','--loss', type=float, help='Probability of losing each copy of a packet, overrides the topology', default=None)
+    parser.add_argument('-s','--seed', type=int, help='Seed for the jitter and loss draws', default=0)
+    parser.add_argument('-b','--mobility', type=str, help='Mobility model with its defaults, overrides the one of the topology', choices=['walk', 'waypoint', 'gauss-markov'], default=None)
+    parser.add_argument('-p','--processes', help='One main.py process per node on unix sockets instead of all the nodes in this process', action='store_true')
+    parser.add_argument('--headless', help='Plain output lines without terminal codes, for runs logged to a file. With -p the nodes always run so', action='store_true')
+    arguments = parser.parse_args()
+    try:
+        topology = json.loads(open(arguments.topology,"r").read())
+        for key, value in [('delay_ms', arguments.delay), ('jitter_ms', arguments.jitter), ('loss', arguments.loss)]:
+            if value != None:
+                topology[key] = value
+        start = time.time()
+        mobility = None
+        if arguments.mobility != None:
+            mobility = {'model': arguments.mobility}
+        if arguments.processes:
+            if mobility != None or 'mobility' in topology:
+                print("Nodes do not move with -p, only in process")
+            folder = spawn(topology, arguments.tmax, arguments.protocol, arguments.multiplier, arguments.maxtime, arguments.model, arguments.simdir, arguments.seed)
+        else:
+            folder = host.host(topology, arguments.tmax, arguments.protocol, arguments.multiplier, arguments.maxtime, arguments.model, arguments.simdir, sync=False, emulate=True, seed=arguments.seed, mobility=mobility, headless=arguments.headless)
+        print("Emulation finished in {0:5.2f} s. Reports in: ".format(time.time() - start) + folder)
+        os._exit(0)
+    except KeyboardInterrupt:
+        os._exit(1)
+    except:
+        traceback.print_exc()
+        os._exit(1)
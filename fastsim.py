@@ -0,0 +1,385 @@
+#!/usr/bin/env python3.7
+
+"""
+Round level model is part of a dissertation work about WSNs
+Forwarding rules of the four protocols as matrix operations over the adjacency of a topology, for quick parameter scans
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import sys, os, json, random, time, argparse, traceback, itertools
+import numpy as np
+
+PROTOCOLS = ['eagp', 'gossip', 'gossipfo', 'mcfa']
+COLUMNS = ['protocol', 'tmax', 'fanout', 'ttl', 'coverage', 'copies', 'min_hops', 'max_hops', 'tx_per_msg', 'comm_J_h', 'max_drain_J_h', 'lifetime_h']
+
+class Model:
+    '''Expected behaviour of one message of every source, all sources at once. Messages of different sources do not interact,
+    so each protocol is run for all of them as arrays of shape (sources, nodes) or (sources, edges)'''
+
+    def __init__(self, topology, energy_model, settings):
+        self.topology = topology
+        self.settings = settings
+        self.energy_model = energy_model
+        nodes = topology['nodes']
+        self.names = [spec['name'] for spec in nodes]
+        self.n = len(nodes)
+        self.sink = [i for i, spec in enumerate(nodes) if spec['role'] == 'sink'][0]
+        self.sources = np.array([i for i in range(self.n) if i != self.sink])
+        xy = np.array([[spec['x'], spec['y']] for spec in nodes], dtype=float)
+        distance = np.hypot(xy[:, 0][:, None] - xy[:, 0][None, :], xy[:, 1][:, None] - xy[:, 1][None, :])
+        self.adjacency = (distance <= topology['radius']) & ~np.eye(self.n, dtype=bool) #same rule as the Medium
+        self.degree = self.adjacency.sum(axis=1)
+        #directed edges u -> v sorted by v, so sums over the incoming edges of each node are one reduceat
+        dst, src = np.nonzero(self.adjacency.T)
+        self.src = src
+        self.dst = dst
+        self.starts = np.searchsorted(dst, np.arange(self.n))
+        self.has_in = self.degree > 0
+        index = {(u, v): e for e, (u, v) in enumerate(zip(src, dst))}
+        self.rev = np.array([index[(v, u)] for u, v in zip(src, dst)], dtype=int)
+        self.battery = np.array([spec['battery'] for spec in nodes], dtype=float)
+        #the same draws Node makes: awake period from the first, sleep energy from the second
+        self.period = np.zeros(self.n)
+        self.sleep_s = np.zeros(self.n)
+        for i, name in enumerate(self.names):
+            draw = random.Random(name)
+            self.period[i] = 15 + draw.random() * 35
+            self.sleep_s[i] = settings['base_sleep_time_s'] + draw.random() * 35
+        self.hops_to_sink = self._bfs(self.sink)
+
+    def incoming(self, values):
+        'Sums per node of values given per edge, on the last axis'
+        out = np.zeros(values.shape[:-1] + (self.n,))
+        if len(self.src) > 0:
+            sums = np.add.reduceat(values, self.starts[self.has_in], axis=-1)
+            out[..., self.has_in] = sums
+        return out
+
+    def gossip(self, ttl, fanout=None):
+        '''Flooding with the checks of networkGossip: a copy is not sent back to the node it came from and dies when the ttl is over.
+        With fanout, as networkGossipFanout, only min(1, fanout/neighbours) of the receivers forward it, in expectation'''
+        S = len(self.sources)
+        tx = np.zeros((S, self.n)) #transmissions of each node per message of each source
+        rx = np.zeros((S, self.n))
+        sink = np.zeros((S, ttl + 1)) #copies reaching the sink at each hop
+        sending = np.zeros((S, self.n))
+        sending[np.arange(S), self.sources] = 1 #hop 0, the source
+        tx += sending
+        eligible = sending[:, self.src] #copies sent on each edge the receiver does not drop as its own
+        select = np.ones(len(self.src))
+        if fanout != None:
+            select = np.minimum(1.0, fanout / np.maximum(self.degree[self.src], 1))
+        forwarder = np.ones((S, self.n))
+        forwarder[:, self.sink] = 0
+        forwarder[np.arange(S), self.sources] = 0 #the source ignores its own message
+        for hop in range(1, ttl + 1):
+            heard = self.incoming(sending[:, self.src])
+            rx += heard
+            sink[:, hop] = heard[:, self.sink]
+            if hop >= ttl: #ttl is over at the receiver
+                break
+            if hop == 1 or fanout == None:
+                forwarded = eligible * forwarder[:, self.dst]
+            else:
+                forwarded = eligible * select * forwarder[:, self.dst]
+            sending = self.incoming(forwarded)
+            tx += sending
+            eligible = sending[:, self.src] - forwarded[:, self.rev] #not back to where it came from
+            if sending.sum() == 0:
+                break
+        return self._result(tx, rx, sink)
+
+    def mcfa(self):
+        'Cost field forwarding of networkMCFA: a node forwards when hops + its cost equal the cost of the source, so along every shortest path'
+        S = len(self.sources)
+        reachable = np.isfinite(self.hops_to_sink[self.sources])
+        cost = np.where(np.isfinite(self.hops_to_sink), self.hops_to_sink, -1)
+        tx = np.zeros((S, self.n))
+        rx = np.zeros((S, self.n))
+        sink = np.zeros((S, self.n + 1))
+        sending = np.zeros((S, self.n))
+        sending[np.arange(S), self.sources] = 1
+        tx += sending
+        forwarder = np.ones((S, self.n))
+        forwarder[:, self.sink] = 0
+        forwarder[np.arange(S), self.sources] = 0
+        for hop in range(1, self.n + 1):
+            heard = self.incoming(sending[:, self.src])
+            rx += heard
+            sink[:, hop] = heard[:, self.sink]
+            on_path = (hop + cost[None, :] == cost[self.sources][:, None]) & reachable[:, None]
+            sending = heard * on_path * forwarder
+            tx += sending
+            if sending.sum() == 0:
+                break
+        return self._result(tx, rx, sink)
+
+    def eagp(self, tmax, ttl, tick=0.1):
+        '''Forwarding buffer of networkEAGPD in ticks of its timer wheel: a copy waits tnext, a second copy arriving meanwhile
+        cancels both. tnext and the eager/lazy mode come from the initial batteries. The lazy digests and requests are left out'''
+        S = len(self.sources)
+        tnext = self._tnext(tmax)
+        wait = np.maximum(1, np.round(tnext / 1000 / tick)).astype(int)
+        tx = np.zeros((S, self.n))
+        rx = np.zeros((S, self.n))
+        sink = np.zeros((S, ttl + 1))
+        pending = np.full((S, self.n), -1) #tick when the waiting copy is forwarded
+        came_from = np.full((S, self.n), -1) #node the waiting copy came from, -1 for none
+        hops = np.zeros((S, self.n), dtype=int)
+        forwarder = np.ones((S, self.n), dtype=bool)
+        forwarder[:, self.sink] = False
+        forwarder[np.arange(S), self.sources] = False
+        sending = np.zeros((S, self.n), dtype=bool)
+        sending[np.arange(S), self.sources] = True
+        sent_from = np.full((S, self.n), -1)
+        sent_hops = np.zeros((S, self.n), dtype=int)
+        now = 0
+        while True:
+            tx += sending
+            on_edge = sending[:, self.src]
+            heard = self.incoming(on_edge.astype(float))
+            rx += heard
+            arrival = sent_hops[:, self.src] + 1
+            at_sink = on_edge & (self.dst == self.sink)[None, :]
+            for hop in range(1, ttl + 1):
+                sink[:, hop] += (at_sink & (arrival == hop)).sum(axis=1)
+            eligible = on_edge & (sent_from[:, self.src] != self.dst[None, :]) & (arrival < ttl)
+            count = self.incoming(eligible.astype(float)).astype(int)
+            #every copy toggles the buffer: it waits if nothing was waiting, otherwise both go
+            waiting = pending >= 0
+            after = ((waiting.astype(int) + count) % 2 == 1) & forwarder
+            restart = after & (count > 0)
+            sender = np.zeros((S, self.n), dtype=int)
+            if len(self.src) > 0:
+                sender[:, self.has_in] = np.maximum.reduceat(np.where(eligible, self.src[None, :] + 1, 0), self.starts[self.has_in], axis=1)
+            sender -= 1
+            pending = np.where(after, np.where(restart, now + wait[None, :], pending), -1)
+            came_from = np.where(restart, sender, came_from)
+            rows = np.arange(S)[:, None]
+            hops = np.where(restart, sent_hops[rows, np.maximum(sender, 0)] + 1, hops)
+            if not (pending >= 0).any():
+                break
+            now = pending[pending >= 0].min()
+            sending = pending == now
+            sent_from = np.where(sending, came_from, -1)
+            sent_hops = np.where(sending, hops, 0)
+            pending = np.where(sending, -1, pending)
+        return self._result(tx, rx, sink)
+
+    def energy(self, tx, rx):
+        'Drain of every node in J per simulated hour, from the expected tx and rx of each message'
+        model = self.energy_model
+        voltage = self.settings['battery_voltage']
+        scale = voltage * 3600 #Ah to J
+        tx_J = model['tx_current'] * self.settings['tx_time_ms'] / 3600000 * scale
+        rx_J = model['rx_current'] * self.settings['rx_time_ms'] / 3600000 * scale
+        if self.settings.get('energy_mode', 'measured') == 'model':
+            times = model.get('op_time_ms', {})
+            tx_J += model['modemSleep_current'] * times.get('tx', 0) / 3600000 * scale
+            rx_J += model['modemSleep_current'] * times.get('rx', 0) / 3600000 * scale
+        rate = 1 / self.period[self.sources] #messages per second of each source
+        comm = (rate[:, None] * (tx * tx_J + rx * rx_J)).sum(axis=0) * 3600
+        sleep = model['modemSleep_current'] * (self.sleep_s / 3600) / self.period * scale * 3600
+        sensor = np.where(np.arange(self.n) == self.sink, 0, model['sensor_energy'] / self.period * scale * 3600)
+        return comm, comm + sleep + sensor
+
+    def lifetime(self, drain):
+        'Hours until the first mote runs out of battery'
+        full = np.where(np.arange(self.n) == self.sink, self.settings['sink_battery_mAh'], self.settings['node_battery_mAh']) * self.settings['battery_voltage'] * 3.6
+        hours = full * self.battery / 100 / drain
+        return hours[np.arange(self.n) != self.sink].min()
+
+    def summary(self, protocol, result, tmax=None, fanout=None, ttl=None):
+        'Averages over messages, as measure() does, so each source counts with its rate'
+        tx, rx, sink = result
+        rate = 1 / self.period[self.sources]
+        copies = sink.sum(axis=1)
+        delivered = copies > 0
+        hop = np.arange(sink.shape[1])
+        present = sink > 0
+        min_hops = np.where(present, hop[None, :], sink.shape[1]).min(axis=1)
+        max_hops = np.where(present, hop[None, :], -1).max(axis=1)
+        comm, drain = self.energy(tx, rx)
+        return {'protocol': protocol, 'tmax': tmax, 'fanout': fanout, 'ttl': ttl,
+                'coverage': np.average(delivered, weights=rate),
+                'copies': np.average(copies[delivered], weights=rate[delivered]) if delivered.any() else 0.0,
+                'min_hops': np.average(min_hops[delivered], weights=rate[delivered]) if delivered.any() else 0.0,
+                'max_hops': np.average(max_hops[delivered], weights=rate[delivered]) if delivered.any() else 0.0,
+                'tx_per_msg': np.average(tx.sum(axis=1), weights=rate),
+                'comm_J_h': comm.mean(),
+                'max_drain_J_h': drain.max(),
+                'lifetime_h': self.lifetime(drain)}
+
+    def _result(self, tx, rx, sink):
+        return tx, rx, sink
+
+    def _bfs(self, start):
+        hops = np.full(self.n, np.inf)
+        hops[start] = 0
+        frontier = np.zeros(self.n, dtype=bool)
+        frontier[start] = True
+        level = 0
+        while frontier.any():
+            level += 1
+            reached = self.adjacency[frontier].any(axis=0) & ~np.isfinite(hops)
+            hops[reached] = level
+            frontier = reached
+        return hops
+
+    def _tnext(self, tmax):
+        'tnext of each node in ms as _update_visible, _calc_tnext and _update_mode set it, from the batteries of the neighbours'
+        tmax_ms = tmax * 1000
+        tnext = np.full(self.n, float(tmax_ms))
+        for v in range(self.n):
+            neighbours = self.battery[self.adjacency[v]]
+            if len(neighbours) == 0:
+                continue
+            bmax = max(self.battery[v], neighbours.max())
+            bmin = min(self.battery[v], neighbours.min())
+            eager = self.battery[v] >= round(neighbours.mean())
+            if eager and bmax != bmin:
+                tnext[v] = tmax_ms - (tmax_ms * (self.battery[v] - bmin) / (bmax - bmin))
+                if tnext[v] == 0:
+                    tnext[v] = 50
+        return tnext
+
+def load_settings():
+    return json.loads(open("settings.json","r").read())
+
+def load_energy_model(board_type):
+    for board in json.loads(open("energy_models.json","r").read()):
+        if board['board'] == board_type:
+            return board
+    raise ValueError("Unknown energy model: " + board_type)
+
+def scan(model, protocols, tmaxs, fanouts, ttls):
+    'Every parameter point of the protocols, parameters a protocol ignores are not expanded'
+    rows = []
+    for protocol in protocols:
+        if protocol == 'eagp':
+            for tmax, ttl in itertools.product(tmaxs, ttls):
+                rows.append(model.summary(protocol, model.eagp(tmax, ttl), tmax=tmax, ttl=ttl))
+        elif protocol == 'gossip':
+            for ttl in ttls:
+                rows.append(model.summary(protocol, model.gossip(ttl), ttl=ttl))
+        elif protocol == 'gossipfo':
+            for fanout, ttl in itertools.product(fanouts, ttls):
+                rows.append(model.summary(protocol, model.gossip(ttl, fanout), fanout=fanout, ttl=ttl))
+        elif protocol == 'mcfa':
+            rows.append(model.summary(protocol, model.mcfa()))
+    return rows
+
+def measure(folder):
+    '''Same metrics from the reports of a packet level run: message dumps and node logs. Only the messages created once
+    every source sends are counted, with the energy and forwards from the log row before that time on. This leaves out the
+    BACKOFF and ADV rounds of MCFA, which the model does not have'''
+    created = [] #creation times of the messages of each source
+    records = [] #messages at the sink
+    for filename in os.listdir(folder + "/message_dumps"):
+        lines = open(folder + "/message_dumps/" + filename, "r").read().splitlines()[1:]
+        if filename.startswith("message_dump_"):
+            if lines and len(lines[0].split(';')) > 2: #the sink
+                records += [line.split(';') for line in lines]
+            elif lines:
+                created.append([int(line.split(';')[1]) for line in lines])
+    start = max([times[0] for times in created]) if created else 0
+    copies = [int(record[4]) for record in records if int(record[2]) >= start]
+    max_hops = [int(record[5]) for record in records if int(record[2]) >= start]
+    min_hops = [int(record[6]) for record in records if int(record[2]) >= start]
+    messages = sum([len([time for time in times if time >= start]) for times in created])
+    forwarded = 0
+    comm = []
+    for filename in os.listdir(folder):
+        if filename.startswith("sim_report_") and filename.endswith(".bin"):
+            raise ValueError("Validation reads csv node logs, set log_format to csv in settings.json")
+        if filename.startswith("sim_report_") and filename.endswith(".csv"):
+            lines = open(folder + "/" + filename, "r").read().splitlines()
+            header = [name.strip() for name in lines[0].split(';')]
+            seconds = header.index('Simul. Seconds')
+            rows = [line.split(';') for line in lines[1:]]
+            before = [row for row in rows if int(row[seconds]) <= start]
+            first = before[-1] if before else None
+            last = rows[-1]
+            def since(column, kind):
+                value = kind(last[header.index(column)])
+                return value if first == None else value - kind(first[header.index(column)])
+            forwarded += since('Forwarded', int)
+            comm.append(since('Comm Energy', float) / max(1, since('Simul. Seconds', int)) * 3600)
+    return {'start': start,
+            'coverage': len(copies) / max(1, messages),
+            'copies': np.mean(copies) if copies else 0.0,
+            'min_hops': np.mean(min_hops) if min_hops else 0.0,
+            'max_hops': np.mean(max_hops) if max_hops else 0.0,
+            'tx_per_msg': (messages + forwarded) / max(1, messages),
+            'comm_J_h': np.mean(comm)}
+
+def validate(model, topology, row, maxtime, board_type):
+    'Runs the packet level simulator at the parameters of row and prints both next to each other'
+    import sim
+    settings = dict(model.settings)
+    protocol = row['protocol']
+    simdir = "fastsim_validation_" + protocol + time.strftime("_%Y_%m_%d_%H_%M_%S") #a folder of its own, measure() reads every log in it
+    if row['ttl'] != None and row['ttl'] != settings['ttl'] or row['fanout'] != None and row['fanout'] != settings['fan_out_max']:
+        print("Validation runs with ttl and fan_out_max of settings.json, " + str(settings['ttl']) + " and " + str(settings['fan_out_max']))
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        folder = sim.simulate(topology, row['tmax'] or 10, protocol, maxtime, board_type, 0, simdir, headless=True)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    measured = measure(folder)
+    print("Validation of " + protocol + " against " + folder + ", from " + str(measured['start']) + " s")
+    print("{0:12s} {1:>10s} {2:>10s} {3:>8s}".format('metric', 'model', 'packets', 'error'))
+    for key in ['coverage', 'copies', 'min_hops', 'max_hops', 'tx_per_msg', 'comm_J_h']:
+        error = abs(row[key] - measured[key]) / measured[key] if measured[key] != 0 else 0.0
+        print("{0:12s} {1:10.3f} {2:10.3f} {3:7.1f}%".format(key, row[key], measured[key], error * 100))
+    return measured
+
+def write_rows(rows, output):
+    with open(output, "w") as outfile:
+        outfile.write(';'.join(COLUMNS) + '\n')
+        for row in rows:
+            outfile.write(';'.join(['' if row[column] == None else str(row[column]) for column in COLUMNS]) + '\n')
+
+if __name__ == '__main__':  #for main run the main function. This is only run when this main python file is called, not when imported as a class
+    print("Round level model of the routing agents")
+    print()
+    parser = argparse.ArgumentParser(description='Options as below')
+    parser.add_argument('topology', type=str, help='Topology file, see the topologies folder')
+    parser.add_argument('protocols', type=str, nargs='+', help='Protocols to scan', choices=PROTOCOLS)
+    parser.add_argument('-t','--tmax', type=int, nargs='+', help='TMAX values for eagp', default=[10])
+    parser.add_argument('-f','--fanout', type=int, nargs='+', help='Fan out values for gossipfo, defaults to settings.json', default=None)
+    parser.add_argument('-l','--ttl', type=int, nargs='+', help='TTL values, defaults to settings.json', default=None)
+    parser.add_argument('-m','--model', type=str, help='Energy model', default='esp8266')
+    parser.add_argument('-o','--output', type=str, help='csv file for the results', default=None)
+    parser.add_argument('-v','--validate', type=int, help='Also run the packet level simulator for this many seconds at the first point of each protocol and compare', default=None)
+    arguments = parser.parse_args()
+    try:
+        topology = json.loads(open(arguments.topology,"r").read())
+        settings = load_settings()
+        model = Model(topology, load_energy_model(arguments.model), settings)
+        fanouts = arguments.fanout or [settings['fan_out_max']]
+        ttls = arguments.ttl or [settings['ttl']]
+        start = time.time()
+        rows = scan(model, arguments.protocols, arguments.tmax, fanouts, ttls)
+        print(str(len(rows)) + " points in {0:5.2f} s".format(time.time() - start))
+        print(' '.join(["{0:>10s}".format(column[:10]) for column in COLUMNS]))
+        for row in rows:
+            print(' '.join(["{0:>10s}".format('-' if row[column] == None else str(row[column]) if isinstance(row[column], str) else "{0:.4g}".format(row[column])) for column in COLUMNS]))
+        if arguments.output != None:
+            write_rows(rows, arguments.output)
+        if arguments.validate != None:
+            for protocol in arguments.protocols:
+                print()
+                validate(model, topology, [row for row in rows if row['protocol'] == protocol][0], arguments.validate, arguments.model)
+    except KeyboardInterrupt:
+        print("Interrupted by ctrl+c")
+        sys.exit(1)
+    except:
+        traceback.print_exc()
+        sys.exit(1)
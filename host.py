@@ -0,0 +1,112 @@
+#!/usr/bin/env python3.7
+
+"""
+Host agent is part of a dissertation work about WSNs
+Runs many nodes of a CORE topology in one process, each one in its own network namespace
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import sys, os, json, random, time, argparse, traceback, socket
+from classes import node, log, agent, registry, runtime, medium, metrics
+from sim import load_energy_model
+
+def startup(tags):
+    '''Waits for the start time on the socket of every node, the same sockets main.py listens on.
+    The CORE scripts send the same time to all of them'''
+    sockets = []
+    for tag in tags: #all bound first, the script connects to them in its own order
+        try:
+            os.remove("/tmp/ouroboros.sock." + tag)
+        except OSError:
+            pass
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.bind("/tmp/ouroboros.sock." + tag)
+        s.listen(1)
+        sockets.append(s)
+    start = None
+    for s in sockets:
+        conn, addr = s.accept()
+        data = conn.recv(1024)
+        conn.close()
+        s.close()
+        if start == None:
+            start = float(data)
+    return start
+
+def host(nodes, tmax, protocol, time_multi, simulation_limit, board_type='esp8266', simdir=None, sync=True, emulate=False, seed=0, mobility=None, headless=False):
+    '''Runs every node of nodes (a dict like the topologies files, with netns and iface for each node) until all of them finish.
+    With emulate the nodes share an emulated radio in this process instead, built from the radius, delay, jitter and loss of nodes,
+    and they move if mobility or the mobility entry of nodes is given. With headless the nodes print plain lines, no terminal codes'''
+    energy_model = load_energy_model(board_type) #read once for all the nodes
+    protocol = protocol.upper()
+    if simdir == None:
+        simdir = str(time.localtime().tm_year) + "_" + str(time.localtime().tm_mon) + "_" + str(time.localtime().tm_mday) + "_" + str(time.localtime().tm_hour) + "_" + str(time.localtime().tm_min)
+    Runtime = runtime.open_runtime() #one event loop for all the nodes
+    if emulate:
+        medium.open_medium(Runtime, nodes, seed) #the transports of the nodes find it in the runtime
+    agents = []
+    Registry = registry.Registry(slots=len(nodes['nodes'])) #one for all the nodes, with a slot for each
+    Metrics = metrics.open_server("host" + str(os.getpid())) #one socket for all the nodes
+    for spec in nodes['nodes']:
+        Node = node.Node(energy_model, spec['name'], spec['role'], time_multi, spec['x'], spec['y'], spec['battery'], nodes.get('net_trans', 'ADHOC').upper(), protocol, tmax,
+                         runtime=Runtime, netns=None if emulate else spec.get('netns'), iface=spec.get('iface', 'eth0'), bind_device=nodes.get('bind_device', False), headless=headless)
+        logger = log.Log(Node, spec['name'], spec['role'], board_type, nodes['name'], protocol, simdir=simdir, headless=headless)
+        Registry.claim(spec['name'])
+        agents.append(agent.Agent(Node, logger, simulation_limit, Registry))
+        if Metrics != None:
+            Metrics.add(Node.metrics)
+    print(str(len(agents)) + " nodes ready")
+    if sync:
+        start = startup([spec['name'] for spec in nodes['nodes']])
+        time.sleep(max(0, start - time.time()))
+    random.seed("this_is_wsn " + nodes['name']) #Seed for random
+    for Agent in agents:
+        Agent.start(Runtime.scheduler())
+    if emulate and (mobility or nodes.get('mobility')) != None:
+        from classes import mobility as movement #needs numpy, only loaded when nodes move
+        movement.open_mobility(mobility or nodes['mobility'], [Agent.Node for Agent in agents], Runtime.medium, seed).start(Runtime.scheduler(), time_multi)
+    def check_finished():
+        if all([Agent.finished for Agent in agents]):
+            Runtime.stop()
+    Runtime.scheduler().add_job(check_finished, 'interval', seconds=1, id='host')
+    try:
+        Runtime.run()
+    except KeyboardInterrupt:
+        print("Interrupted by ctrl+c")
+        for Agent in agents:
+            Agent.logger.close()
+        raise
+    finally:
+        if Metrics != None:
+            Metrics.close()
+    return "reports/" + simdir
+
+if __name__ == '__main__':  #for main run the main function. This is only run when this main python file is called, not when imported as a class
+    print("Host agent for the routing agents")
+    print()
+    parser = argparse.ArgumentParser(description='Options as below')
+    parser.add_argument('nodes', type=str, help='Nodes file, a topology file with the netns and iface of each node')
+    parser.add_argument('tmax', type=int, help='TMAX parameter of the EAGP protocol')
+    parser.add_argument('protocol', type=str, help='Protocol to use', choices=['eagp', 'gossip', 'gossipfo', 'mcfa'])
+    parser.add_argument('multiplier', type=float, help='Time multiplier')
+    parser.add_argument('maxtime', type=int, help='Maximum simulation time in seconds')
+    parser.add_argument('-m','--model', type=str, help='Energy model', default='esp8266')
+    parser.add_argument('-o','--simdir', type=str, help='Report folder inside reports/', default=None)
+    parser.add_argument('-n','--no-sync', help='Start at once instead of waiting for the start time from the CORE script', action='store_true')
+    parser.add_argument('--headless', help='Plain output lines without terminal codes, for runs logged to a file', action='store_true')
+    arguments = parser.parse_args()
+    try:
+        nodes = json.loads(open(arguments.nodes,"r").read())
+        start = time.time()
+        folder = host(nodes, arguments.tmax, arguments.protocol, arguments.multiplier, arguments.maxtime, arguments.model, arguments.simdir, not arguments.no_sync, headless=arguments.headless)
+        print("All nodes finished in {0:5.2f} s. Reports in: ".format(time.time() - start) + folder)
+        os._exit(0)
+    except KeyboardInterrupt:
+        os._exit(1)
+    except:
+        traceback.print_exc()
+        os._exit(1)
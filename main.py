@@ -10,13 +10,14 @@ __maintainer__ = "Bruno Chianca Ferreira"
 __email__ = "brunobcf@gmail.com"
 
 import  threading, sys, traceback, time, random, json, os, shutil, socket
-from classes import prompt, log, node, nodedump
-from apscheduler.schedulers.background import BackgroundScheduler
+from classes import log, node, registry, runtime, metrics
 
 fwd_old = 0
 inc=0
 packet_counter = 0
 anim = ['\\','|','/','-']
+headless = False #no prompt and no terminal drawing, for batch runs
+status_interval = 10 #real seconds between status lines when headless
 
 def main(tag):
         '''This is a simple scheduler that changes the state of the node based on time
@@ -25,31 +26,25 @@ def main(tag):
 
         try:
             random.seed("this_is_wsn "+Node.tag); #Seed for random
-            t1 = threading.Thread(target=prompt.prompt, args=(Node,))
-            t1.start() #starts prompt
-            
-            # finally a scheduler that actually works
-            scheduler = BackgroundScheduler()
+            if not headless:
+                t1 = threading.Thread(target=prompt.prompt, args=(Node,), name='prompt', daemon=True)
+                t1.start() #starts prompt
+
+            #every task of the node, the battery and the network runs in this loop, in this thread
+            scheduler = Runtime.scheduler()
             scheduler.add_job(task1, 'interval', seconds=(Node.sleeptime  /1000), id='awake')
             scheduler.add_job(task2, 'interval', seconds=Node.second/1000, id='sim_sec')
             scheduler.add_job(task3, 'interval', seconds=1, id='real_sec')
             scheduler.add_job(task5, 'interval', seconds=30*Node.second/1000, id='datalogger')
             scheduler.add_job(task7, 'interval', seconds=5, id='node_info')
-            scheduler.add_job(task8, 'interval', seconds=8, id='node_neighbours')
-            scheduler.start()
-            while Node.stop != True:
-                time.sleep(0.5)
-            scheduler.remove_job('awake')
-            scheduler.remove_job('sim_sec')
-            scheduler.remove_job('real_sec')
-            scheduler.remove_job('datalogger')
-            scheduler.remove_job('node_info')
-            scheduler.remove_job('node_neighbours')
+            Runtime.run() #until task1 stops it
             scheduler.shutdown()
-            t1.join(timeout=1)
+            if not headless:
+                t1.join(timeout=1)
             os._exit(1)
         except KeyboardInterrupt:
             logger.print_error("Interrupted by ctrl+c")
+            logger.flush()
             os._exit(1)
         except:
             logger.print_error("Scheduling error!")
@@ -62,16 +57,21 @@ def task1(): #sleep/awake
         if Node.Battery.battery_percent <= 1 or Node.lock == False:
             logger.print_alert("Simulation ended.")
             Node.lock=False
-            prompt.lock=False
+            if prompt != None:
+                prompt.lock=False
             Node.stop = True
             logger.print_alert('Logging')
             logger.datalog(Node)
             logger.log_messages(Node)
-            try:
-                shutil.move("./node_dumps", "reports/" + logger.simdir + "/")
-                shutil.move("./neighbours", "reports/" + logger.simdir + "/")
+            logger.log_energy(Node)
+            logger.log_timings(Node)
+            logger.flush()
+            try: #last state of the node next to the reports
+                Registry.update(Node)
+                Registry.export(Node.tag, "reports/" + logger.simdir)
             except:
-                pass
+                traceback.print_exc()
+            Registry.release(Node.tag)
             endfile = open("reports/" + logger.simdir + "/finished/"+tag+".csv","w") #
             endfile.write('done\n')
             endfile.close()
@@ -79,6 +79,9 @@ def task1(): #sleep/awake
                 Node.shutdown()
             except:
                 pass
+            if Metrics != None:
+                Metrics.close()
+            Runtime.stop()
             return
 
 def task2(): #1 tick per sim second
@@ -101,6 +104,10 @@ def task3(): #1 tick per real second
         packet_counter = 0
     else:
         packet_counter += 1
+    if headless: #no spinner, a status line every status_interval real seconds
+        if Node.simulation_tick_seconds % status_interval == 0:
+            logger.log_status(Node)
+        return
     if fwd_new > fwd_old:
         fwd_old= fwd_new
         inc+=1
@@ -115,15 +122,10 @@ def task5(): #datalogger
         return
     logger.datalog(Node) #this task is run to log data to file
 
-def task7(): #update node info for rest every 5 real seconds
-    if Node.lock==False:
-        return
-    nodedump.Dump(Node)
-
-def task8(): #update node neighbours for rest every 8 real seconds
+def task7(): #update node info and neighbours for rest every 5 real seconds
     if Node.lock==False:
         return
-    nodedump.Neighbours(Node)
+    Registry.update(Node)
 
 def printhelp():
     'Prints help message'
@@ -131,7 +133,7 @@ def printhelp():
     print("Routing agent - ")
     print()
     print("Usage:")
-    print("./main [node_name] [role: mote or sink] [time multiplier] [energy_model] [TMAX] [Topology used] [x_coord] [y_coord] [protocol] [battery level] [simulation max time] ")
+    print("./main [node_name] [role: mote or sink] [time multiplier] [energy_model] [TMAX] [Topology used] [x_coord] [y_coord] [protocol] [battery level] [simulation max time] [--headless] [--medium socket] [--simdir folder]")
     print()
 
 def startup():
@@ -155,6 +157,19 @@ if __name__ == '__main__':  #for main run the main function. This is only run wh
     try:
         print("This is a testing agent of a low power routing protocol node")
         print()
+        if '--headless' in sys.argv:
+            headless = True
+            sys.argv.remove('--headless')
+        medium_socket = None #radio of a medium server instead of the network, see emulate.py
+        if '--medium' in sys.argv:
+            position = sys.argv.index('--medium')
+            medium_socket = sys.argv[position + 1]
+            del sys.argv[position:position + 2]
+        simdir = None #report folder, dated when not given
+        if '--simdir' in sys.argv:
+            position = sys.argv.index('--simdir')
+            simdir = sys.argv[position + 1]
+            del sys.argv[position:position + 2]
         try: #this should be made better
             tag = sys.argv[1]
             role = sys.argv[2]
@@ -180,10 +195,18 @@ if __name__ == '__main__':  #for main run the main function. This is only run wh
                 break
         print('Using energy model: ' + energy_model['board'] + ' with: ' + str(time_multi) + ' time multiplier')
 
-        Node = node.Node(energy_model, tag, role, time_multi, x, y, batlim, net_trans, protocol,tmax) #create node object
-        prompt = prompt.Prompt(Node)
-        logger = log.Log(Node, tag, role, board_type, topology, protocol)
-        logger.clean_nodedumps(Node)
+        Runtime = runtime.open_runtime() #one event loop for all the timers of the node
+        Node = node.Node(energy_model, tag, role, time_multi, x, y, batlim, net_trans, protocol,tmax, runtime=Runtime, medium_socket=medium_socket, headless=headless) #create node object
+        prompt = None #terminal prompt, not built in headless runs
+        if not headless:
+            from classes import prompt as terminal #needs readline and a tty
+            prompt = terminal.Prompt(Node)
+        logger = log.Log(Node, tag, role, board_type, topology, protocol, simdir=simdir, headless=headless)
+        Registry = registry.Registry() #shared with the other nodes of the host and the rest api
+        Registry.claim(tag)
+        Metrics = metrics.open_server(tag) #prometheus text of the node on a unix socket
+        if Metrics != None:
+            Metrics.add(Node.metrics)
         start=startup()
 
         while float(start) > time.time():
@@ -193,4 +216,4 @@ if __name__ == '__main__':  #for main run the main function. This is only run wh
         main(tag); #call scheduler function
     except KeyboardInterrupt:
         logger.print_error("Interrupted by ctrl+c")
-        logger.logfile.close()
\ No newline at end of file
+        logger.close()
\ No newline at end of file
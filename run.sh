@@ -1,3 +1,8 @@
 #!/bin/bash
 cd /opt/eagp_sim
-./main.py $1
\ No newline at end of file
+if [ "$2" == "--headless" ]; then #no terminal, output to a log per node
+    mkdir -p /tmp/ouroboros/logs
+    ./main.py $1 --headless > /tmp/ouroboros/logs/${1%% *}.log 2>&1
+else
+    ./main.py $1
+fi
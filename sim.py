@@ -0,0 +1,78 @@
+#!/usr/bin/env python3.7
+
+"""
+Discrete event simulation runner is part of a dissertation work about WSNs
+Runs all nodes of a topology in one process using simulated time
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import sys, os, json, random, time, argparse, traceback
+from classes import node, log, agent, simulator, medium
+
+def load_energy_model(board_type):
+    energy_model = json.loads(open("energy_models.json","r").read())
+    for board in energy_model:
+        if board['board'] == board_type:
+            return board
+    raise ValueError("Unknown energy model: " + board_type)
+
+def simulate(topology, tmax, protocol, simulation_limit, board_type='esp8266', seed=0, simdir=None, mobility=None, headless=False):
+    '''Runs one simulation of topology (a dict loaded from the topologies folder) and returns the report folder.
+    Nodes move if mobility, or the mobility entry of the topology, is given (see classes/mobility.py). With headless the nodes print plain lines, no terminal codes'''
+    energy_model = load_energy_model(board_type)
+    protocol = protocol.upper()
+    if simdir == None:
+        simdir = str(time.localtime().tm_year) + "_" + str(time.localtime().tm_mon) + "_" + str(time.localtime().tm_mday) + "_" + str(time.localtime().tm_hour) + "_" + str(time.localtime().tm_min)
+    kernel = simulator.Simulator()
+    Medium = medium.open_medium(kernel, topology, seed)
+    agents = []
+    for spec in topology['nodes']:
+        Node = node.Node(energy_model, spec['name'], spec['role'], 1, spec['x'], spec['y'], spec['battery'], 'ADHOC', protocol, tmax, simulator=kernel, headless=headless)
+        logger = log.Log(Node, spec['name'], spec['role'], board_type, topology['name'], protocol, simdir=simdir, headless=headless)
+        agents.append(agent.Agent(Node, logger, simulation_limit))
+    random.seed("this_is_wsn " + str(seed)) #Seed for random, after the nodes have seeded their own settings
+    for Agent in agents:
+        Agent.start(kernel.scheduler())
+    if mobility == None:
+        mobility = topology.get('mobility')
+    if mobility != None:
+        from classes import mobility as movement #needs numpy, only loaded when nodes move
+        movement.open_mobility(mobility, [Agent.Node for Agent in agents], Medium, seed).start(kernel.scheduler())
+    kernel.run()
+    for Agent in agents: #nodes still running when the queue is empty
+        if not Agent.finished:
+            Agent.finish()
+    return "reports/" + simdir
+
+if __name__ == '__main__':  #for main run the main function. This is only run when this main python file is called, not when imported as a class
+    print("Discrete event simulator for the routing agents")
+    print()
+    parser = argparse.ArgumentParser(description='Options as below')
+    parser.add_argument('topology', type=str, help='Topology file, see the topologies folder')
+    parser.add_argument('tmax', type=int, help='TMAX parameter of the EAGP protocol')
+    parser.add_argument('protocol', type=str, help='Protocol to use', choices=['eagp', 'gossip', 'gossipfo', 'mcfa'])
+    parser.add_argument('maxtime', type=int, help='Maximum simulation time in seconds')
+    parser.add_argument('-m','--model', type=str, help='Energy model', default='esp8266')
+    parser.add_argument('-s','--seed', type=int, help='Seed for random', default=0)
+    parser.add_argument('-o','--simdir', type=str, help='Report folder inside reports/', default=None)
+    parser.add_argument('-b','--mobility', type=str, help='Mobility model with its defaults, overrides the one of the topology', choices=['walk', 'waypoint', 'gauss-markov'], default=None)
+    parser.add_argument('--headless', help='Plain output lines without terminal codes, for runs logged to a file', action='store_true')
+    arguments = parser.parse_args()
+    try:
+        topology = json.loads(open(arguments.topology,"r").read())
+        start = time.time()
+        mobility = None
+        if arguments.mobility != None:
+            mobility = {'model': arguments.mobility}
+        folder = simulate(topology, arguments.tmax, arguments.protocol, arguments.maxtime, arguments.model, arguments.seed, arguments.simdir, mobility, arguments.headless)
+        print("Simulation finished in {0:5.2f} s. Reports in: ".format(time.time() - start) + folder)
+    except KeyboardInterrupt:
+        print("Interrupted by ctrl+c")
+        sys.exit(1)
+    except:
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3.7
+
+"""
+Batch simulation runner is part of a dissertation work about WSNs
+Expands the experiments of simulation.json and runs them in parallel with the discrete event simulator
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import sys, os, json, time, argparse, traceback, shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import sim
+
+def as_list(value):
+    if isinstance(value, list):
+        return value
+    return [value]
+
+def expand(experiments):
+    'Expands every experiment into one run per protocol x tmax x topology x seed'
+    runs = []
+    for experiment in experiments:
+        for protocol in as_list(experiment['protocol']):
+            for tmax in as_list(experiment.get('tmax', 10)):
+                for topology in as_list(experiment.get('topologies', 'topologies/chaos.json')):
+                    for seed in as_list(experiment.get('seeds', 0)):
+                        name = os.path.splitext(os.path.basename(topology))[0]
+                        runs.append({'id': protocol + "_" + name + "_tmax" + str(tmax) + "_seed" + str(seed),
+                                     'protocol': protocol,
+                                     'tmax': tmax,
+                                     'topology': topology,
+                                     'seed': seed,
+                                     'model': experiment.get('model', 'esp8266'),
+                                     'simul_max': experiment.get('simul_max', 10000)})
+    return runs
+
+def run_one(run, simdir):
+    'Runs one simulation in a worker process. Output of the nodes goes to a log inside the run folder, so they run headless'
+    os.makedirs("reports/" + simdir, exist_ok=True)
+    start = time.time()
+    stdout = sys.stdout
+    with open("reports/" + simdir + "/sim.log", "w") as logfile:
+        sys.stdout = logfile
+        try:
+            topology = json.loads(open(run['topology'], "r").read())
+            sim.simulate(topology, run['tmax'], run['protocol'], run['simul_max'], run['model'], run['seed'], simdir, headless=True)
+        finally:
+            sys.stdout = stdout
+    return time.time() - start
+
+class Manifest:
+    'Status of every run of a sweep, saved after each change so an interrupted sweep can be resumed'
+
+    def __init__(self, path):
+        self.path = path
+        self.runs = {}
+        if os.path.exists(path):
+            self.runs = json.loads(open(path, "r").read())
+
+    def done(self, run_id):
+        return self.runs.get(run_id, {}).get('status') == 'done'
+
+    def update(self, run, status, **fields):
+        entry = dict(run)
+        entry['status'] = status
+        entry.update(fields)
+        self.runs[run['id']] = entry
+        self.save()
+
+    def save(self):
+        tmpfile = self.path + ".tmp"
+        with open(tmpfile, "w") as manifest_file:
+            manifest_file.write(json.dumps(self.runs, indent=4, sort_keys=True))
+        os.replace(tmpfile, self.path) #never leaves a half written manifest behind
+
+def sweep(experiments, name, workers=None, force=False):
+    'Runs every run of the experiments not yet done. Returns the number of failed runs'
+    folder = "reports/" + name
+    os.makedirs(folder, exist_ok=True)
+    manifest = Manifest(folder + "/manifest.json")
+    runs = expand(experiments)
+    pending = [run for run in runs if force or not manifest.done(run['id'])]
+    print("Sweep " + name + ": " + str(len(runs)) + " runs, " + str(len(runs) - len(pending)) + " already done")
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for run in pending:
+            simdir = name + "/" + run['id']
+            shutil.rmtree("reports/" + simdir, ignore_errors=True) #leftovers of an interrupted run
+            manifest.update(run, 'running', folder="reports/" + simdir)
+            futures[pool.submit(run_one, run, simdir)] = run
+        for future in as_completed(futures):
+            run = futures[future]
+            try:
+                elapsed = future.result()
+                manifest.update(run, 'done', folder="reports/" + name + "/" + run['id'], elapsed=round(elapsed, 2))
+                print("done   " + run['id'] + " in {0:5.2f} s".format(elapsed))
+            except Exception as error:
+                failed += 1
+                manifest.update(run, 'failed', folder="reports/" + name + "/" + run['id'], error=repr(error))
+                print("failed " + run['id'] + ": " + repr(error))
+    return failed
+
+if __name__ == '__main__':  #for main run the main function. This is only run when this main python file is called, not when imported as a class
+    print("Batch runner for the routing agents")
+    print()
+    parser = argparse.ArgumentParser(description='Options as below')
+    parser.add_argument('config', type=str, nargs='?', help='Experiments file', default='simulation.json')
+    parser.add_argument('-n','--name', type=str, help='Sweep folder inside reports/, runs already done there are skipped', default=None)
+    parser.add_argument('-j','--jobs', type=int, help='Parallel simulations, defaults to the number of cores', default=None)
+    parser.add_argument('-f','--force', help='Run again the runs already done', action='store_true')
+    arguments = parser.parse_args()
+    try:
+        experiments = json.loads(open(arguments.config,"r").read())
+        name = arguments.name
+        if name == None:
+            name = "sweep_" + os.path.splitext(os.path.basename(arguments.config))[0]
+        start = time.time()
+        failed = sweep(experiments, name, arguments.jobs, arguments.force)
+        print("Sweep finished in {0:5.2f} s. Reports in: reports/".format(time.time() - start) + name)
+        if failed > 0:
+            print(str(failed) + " runs failed, run it again to retry them")
+            sys.exit(1)
+    except KeyboardInterrupt:
+        print("Interrupted by ctrl+c, run it again to resume")
+        sys.exit(1)
+    except SystemExit:
+        raise
+    except:
+        traceback.print_exc()
+        sys.exit(1)
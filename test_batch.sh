@@ -23,22 +23,22 @@ for topo in "${TOPOLOGIES[@]}"
         for i in {1..1}
         do
             echo "Running eagp topology $topo with tmax $tmax" 
-            $CURR_PWD/$TOPOLOGIES_DIR/$topo $tmax eagp3 $SPEED $MAXTIME &> /tmp/$RESULTS_DIR/$topo\_$tmax\_$i\_$DATA.log    
+            $CURR_PWD/$TOPOLOGIES_DIR/$topo $tmax eagp3 $SPEED $MAXTIME --headless &> /tmp/$RESULTS_DIR/$topo\_$tmax\_$i\_$DATA.log    
         done
     done
 done
 
 echo "Running gossip topology $topo" 
-$CURR_PWD/$TOPOLOGIES_DIR/$topo 10 gossip $SPEED $MAXTIME &> /tmp/$RESULTS_DIR/$topo\_10\_1\_$DATA.log
+$CURR_PWD/$TOPOLOGIES_DIR/$topo 10 gossip $SPEED $MAXTIME --headless &> /tmp/$RESULTS_DIR/$topo\_10\_1\_$DATA.log
 
 echo "Running gossipfo topology $topo" 
-$CURR_PWD/$TOPOLOGIES_DIR/$topo 10 gossipfo $SPEED $MAXTIME &> /tmp/$RESULTS_DIR/$topo\_10\_1\_$DATA.log
+$CURR_PWD/$TOPOLOGIES_DIR/$topo 10 gossipfo $SPEED $MAXTIME --headless &> /tmp/$RESULTS_DIR/$topo\_10\_1\_$DATA.log
 
 echo "Running mcfa topology $topo" 
-$CURR_PWD/$TOPOLOGIES_DIR/$topo 10 mcfa $SPEED $MAXTIME &> /tmp/$RESULTS_DIR/$topo\_10\_1\_$DATA.log
+$CURR_PWD/$TOPOLOGIES_DIR/$topo 10 mcfa $SPEED $MAXTIME --headless &> /tmp/$RESULTS_DIR/$topo\_10\_1\_$DATA.log
 
 echo "Running eagpd topology $topo  with tmax 10" 
-$CURR_PWD/$TOPOLOGIES_DIR/$topo 10 eagpd $SPEED $MAXTIME &> /tmp/$RESULTS_DIR/$topo\_10\_1\_$DATA.log
+$CURR_PWD/$TOPOLOGIES_DIR/$topo 10 eagpd $SPEED $MAXTIME --headless &> /tmp/$RESULTS_DIR/$topo\_10\_1\_$DATA.log
 
 cd $REPORTS_DIR
 chown -R bcf:bcf *
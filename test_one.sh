@@ -16,7 +16,7 @@ mkdir /tmp/$RESULTS_DIR 2> /dev/null #If folder exists, redirect error to sinkho
 for i in {1..5}
 do
     echo "Running topology $TOPOLOGY with tmax $TMAX" 
-    $CURR_PWD/$TOPOLOGIES_DIR/$TOPOLOGY $TMAX $PROTOCOL $SPEED 10000 &> /tmp/$RESULTS_DIR/$topo\_$tmax\_$i\_$DATA.log   
+    $CURR_PWD/$TOPOLOGIES_DIR/$TOPOLOGY $TMAX $PROTOCOL $SPEED 10000 --headless &> /tmp/$RESULTS_DIR/$topo\_$tmax\_$i\_$DATA.log   
     DATA=`date +%d_%m_%Y_%H_%M`
 done
 
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3.7
+
+"""
+Round level model tests are part of a dissertation work about WSNs
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import os, sys, json, shutil, unittest
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+class ValidationTest(unittest.TestCase):
+    'Gossip and MCFA follow the rules of the agents, the model must match sim.py on chaos.json'
+    TOLERANCE = 0.05
+    MAXTIME = 1500 #MCFA needs about 600 s of BACKOFF and ADV on chaos.json
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        os.chdir(ROOT) #settings.json, energy_models.json and reports/ are relative
+        import fastsim, sim
+        self.fastsim = fastsim
+        self.sim = sim
+        self.topology = json.loads(open("topologies/chaos.json", "r").read())
+        self.model = fastsim.Model(self.topology, fastsim.load_energy_model('esp8266'), fastsim.load_settings())
+        self.folders = []
+
+    def tearDown(self):
+        for folder in self.folders:
+            shutil.rmtree(folder, ignore_errors=True)
+        os.chdir(self.cwd)
+
+    def _check(self, protocol, row):
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+        try:
+            folder = self.sim.simulate(self.topology, 10, protocol, self.MAXTIME, 'esp8266', 0, "test_fastsim_" + protocol, headless=True)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        self.folders.append(folder)
+        measured = self.fastsim.measure(folder)
+        for key in ['coverage', 'copies', 'min_hops', 'max_hops', 'tx_per_msg', 'comm_J_h']:
+            self.assertLess(abs(row[key] - measured[key]) / measured[key], self.TOLERANCE, protocol + " " + key)
+        return measured
+
+    def test_gossip(self):
+        self._check('gossip', self.model.summary('gossip', self.model.gossip(self.model.settings['ttl'])))
+
+    def test_mcfa(self):
+        measured = self._check('mcfa', self.model.summary('mcfa', self.model.mcfa()))
+        self.assertGreater(measured['start'], 0) #the warm-up is left out
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3.7
+
+"""
+Registry tests are part of a dissertation work about WSNs
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import os, sys, tempfile, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from classes import registry
+
+class StaleSlotTest(unittest.TestCase):
+    'A writer that dies in the middle of an update leaves the seq of its slot odd'
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.registry = registry.Registry(os.path.join(self.folder.name, "registry"), slots=4)
+        self.slot = self.registry.claim('mote1')
+
+    def tearDown(self):
+        self.registry.close()
+        self.folder.cleanup()
+
+    def _set_seq(self, seq):
+        self.registry.SEQ.pack_into(self.registry.memory, self.registry._offset(self.slot), seq)
+
+    def test_clean_slot(self):
+        self.assertEqual(self.registry.info('mote1')['nodename'], 'mote1')
+        self.assertEqual(self.registry.neighbours('mote1'), [])
+        self.assertEqual(len(self.registry.nodes()), 1)
+
+    def test_odd_seq(self):
+        self._set_seq(7)
+        self.assertIsNone(self.registry._read(self.slot, attempts=5))
+        self.assertIsNone(self.registry.info('mote1'))
+        self.assertIsNone(self.registry.neighbours('mote1'))
+        self.assertEqual(self.registry.nodes(), [])
+
+    def test_claimed_again(self):
+        self._set_seq(7)
+        self.registry.claim('mote1')
+        self.registry._write(self.slot, self.registry.SEQ.size, b'mote1') #the node writes its slot again
+        self.assertEqual(self.registry.info('mote1')['nodename'], 'mote1')
+
+class ReleaseTest(unittest.TestCase):
+    'Finished nodes free their slots for the nodes of later runs'
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.registry = registry.Registry(os.path.join(self.folder.name, "registry"), slots=2)
+
+    def tearDown(self):
+        self.registry.close()
+        self.folder.cleanup()
+
+    def test_release(self):
+        first = self.registry.claim('mote1')
+        self.registry.claim('mote2')
+        self.assertTrue(self.registry.release('mote1'))
+        self.assertIsNone(self.registry.info('mote1'))
+        self.assertEqual([info['nodename'] for info in self.registry.nodes()], ['mote2'])
+        start = self.registry._offset(first)
+        self.assertEqual(self.registry.SEQ.unpack_from(self.registry.memory, start)[0], 0)
+        self.assertEqual(self.registry.claim('mote3'), first) #full before the release
+
+    def test_release_unknown(self):
+        self.registry.claim('mote1')
+        self.assertFalse(self.registry.release('mote9'))
+        self.assertEqual(len(self.registry.nodes()), 1)
+
+class GrowTest(unittest.TestCase):
+    'Hosts and emulations run more nodes than the default 256 slots'
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, "registry")
+        self.registry = registry.Registry(self.path, slots=2)
+
+    def tearDown(self):
+        self.registry.close()
+        self.folder.cleanup()
+
+    def test_sized_to_the_nodes(self):
+        shared = registry.Registry(self.path, slots=300) #as host() opens it
+        self.assertEqual(shared.slots, 300)
+        for i in range(300):
+            shared.claim('mote' + str(i))
+        self.assertEqual(len(set(shared.owned.values())), 300)
+        self.assertEqual(len(self.registry.nodes()), 300) #the older map sees the new slots
+        self.assertEqual(self.registry.info('mote299')['nodename'], 'mote299')
+        shared.close()
+
+    def test_grows_when_full(self):
+        for i in range(300):
+            self.registry.claim('mote' + str(i))
+        self.assertGreaterEqual(self.registry.slots, 300)
+        reader = registry.Registry(self.path, create=False)
+        self.assertEqual(len(reader.nodes()), 300)
+        self.assertTrue(self.registry.release('mote0'))
+        self.assertEqual(len(reader.nodes()), 299)
+        reader.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3.7
+
+"""
+Spatial index tests are part of a dissertation work about WSNs
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import os, sys, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from classes import spatial
+
+class GridIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = spatial.GridIndex(10)
+        for key in range(300): #a line of keys 5 apart, past the small int cache
+            self.index.insert(key, key * 5, 0)
+
+    def test_insert(self):
+        self.assertEqual(len(self.index), 300)
+        self.assertIn(299, self.index)
+        self.assertEqual(sorted(self.index.query(0, 0, 10)), [0, 1, 2])
+
+    def test_near_excludes_key(self):
+        self.assertEqual(sorted(self.index.near(299, 10)), [297, 298])
+        self.assertEqual(sorted(self.index.near(150, 5)), [149, 151])
+
+    def test_move(self):
+        self.assertFalse(self.index.move(0, 0, 0))
+        self.assertTrue(self.index.move(0, 3000, 0)) #to another cell
+        self.assertEqual(sorted(self.index.near(0, 10)), [])
+        self.assertEqual(sorted(self.index.near(1, 10)), [2, 3])
+        self.assertTrue(self.index.move(0, 1496, 0)) #next to 299
+        self.assertEqual(sorted(self.index.near(299, 5)), [0, 298])
+
+    def test_remove(self):
+        self.index.remove(1)
+        self.assertEqual(sorted(self.index.near(0, 10)), [2])
+        self.assertNotIn(1, self.index)
+
+if __name__ == '__main__':
+    unittest.main()
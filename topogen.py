@@ -0,0 +1,170 @@
+#!/usr/bin/env python3.7
+
+"""
+Topology generator is part of a dissertation work about WSNs
+Writes topology files for sim.py, host.py and the CORE session builder: grid, random, clustered and line layouts of any size
+"""
+__author__ = "Bruno Chianca Ferreira"
+__license__ = "MIT"
+__version__ = "0.1"
+__maintainer__ = "Bruno Chianca Ferreira"
+__email__ = "brunobcf@gmail.com"
+
+import sys, os, json, random, math, argparse, traceback
+from classes import spatial
+
+LAYOUTS = ['grid', 'random', 'clustered', 'line']
+SINKS = ['center', 'corner', 'first', 'last', 'random']
+
+def grid(n, rng, spacing=100, **options):
+    'Rows of ceil(sqrt(n)) nodes, spacing apart'
+    columns = math.ceil(math.sqrt(n))
+    return [(spacing / 2 + (i % columns) * spacing, spacing / 2 + (i // columns) * spacing) for i in range(n)]
+
+def line(n, rng, spacing=100, **options):
+    'One row of nodes, spacing apart'
+    return [(spacing / 2 + i * spacing, spacing / 2) for i in range(n)]
+
+def uniform(n, rng, width=1000, height=1000, **options):
+    'Positions drawn uniformly inside the area'
+    return [(rng.uniform(0, width), rng.uniform(0, height)) for i in range(n)]
+
+def clustered(n, rng, width=1000, height=1000, clusters=4, spread=60, **options):
+    'Cluster centres drawn uniformly inside the area, nodes around them with a normal spread, kept inside the area'
+    centres = [(rng.uniform(spread, width - spread), rng.uniform(spread, height - spread)) for i in range(clusters)]
+    positions = []
+    for i in range(n):
+        cx, cy = centres[i % clusters]
+        positions.append((min(max(rng.gauss(cx, spread), 0), width), min(max(rng.gauss(cy, spread), 0), height)))
+    return positions
+
+GENERATORS = {'grid': grid, 'random': uniform, 'clustered': clustered, 'line': line}
+
+def default_radius(layout, n, spacing=100, width=1000, height=1000, degree=8, **options):
+    '''Range of the radio when none is given. Grids and lines reach the diagonal neighbours,
+    random layouts get degree neighbours per node on average'''
+    if layout in ['grid', 'line']:
+        return math.ceil(spacing * 1.5)
+    return math.ceil(math.sqrt(width * height * degree / (math.pi * max(1, n - 1))))
+
+def batteries(n, rng, distribution='uniform:60:100'):
+    '''Battery levels in percent from a distribution given as name:parameters, uniform:low:high, normal:mean:sd or fixed:level.
+    Levels are whole numbers between 1 and 100, like the topology files'''
+    name, *parameters = distribution.split(':')
+    parameters = [float(parameter) for parameter in parameters]
+    if name == 'uniform':
+        draw = lambda: rng.uniform(parameters[0], parameters[1])
+    elif name == 'normal':
+        draw = lambda: rng.gauss(parameters[0], parameters[1])
+    elif name == 'fixed':
+        draw = lambda: parameters[0]
+    else:
+        raise ValueError("Unknown battery distribution: " + distribution)
+    return [int(min(max(round(draw()), 1), 100)) for i in range(n)]
+
+def pick_sink(positions, rng, placement='center'):
+    'Index of the node that becomes the sink'
+    if placement == 'first':
+        return 0
+    elif placement == 'last':
+        return len(positions) - 1
+    elif placement == 'random':
+        return rng.randrange(len(positions))
+    if placement == 'center':
+        tx = sum([x for x, y in positions]) / len(positions)
+        ty = sum([y for x, y in positions]) / len(positions)
+    elif placement == 'corner':
+        tx, ty = 0, 0
+    else:
+        raise ValueError("Unknown sink placement: " + placement)
+    return min(range(len(positions)), key=lambda i: math.hypot(positions[i][0] - tx, positions[i][1] - ty))
+
+def components(topology):
+    'Number of connected parts of the topology with its radius'
+    nodes = topology['nodes']
+    index = spatial.GridIndex(topology['radius'])
+    for i, spec in enumerate(nodes):
+        index.insert(i, spec['x'], spec['y'])
+    seen = [False] * len(nodes)
+    count = 0
+    for start in range(len(nodes)):
+        if seen[start]:
+            continue
+        count += 1
+        seen[start] = True
+        stack = [start]
+        while stack:
+            for j in index.near(stack.pop(), topology['radius']):
+                if not seen[j]:
+                    seen[j] = True
+                    stack.append(j)
+    return count
+
+def generate(name, layout, n, seed=0, radius=None, delay_ms=5, battery='uniform:60:100', sink='center', sink_battery=99, connected=False, attempts=100, **options):
+    '''Returns a topology dict in the format of the topologies folder. The same arguments and seed give the same topology.
+    With connected, random layouts are drawn again until every node reaches the sink'''
+    if layout not in GENERATORS:
+        raise ValueError("Unknown layout: " + layout)
+    rng = random.Random(str(seed) + layout + str(n)) #independent of the global random of the simulations
+    if radius == None:
+        radius = default_radius(layout, n, **options)
+    for attempt in range(attempts):
+        positions = GENERATORS[layout](n, rng, **options)
+        levels = batteries(n, rng, battery)
+        sink_index = pick_sink(positions, rng, sink)
+        nodes = []
+        for i, (x, y) in enumerate(positions):
+            role = 'sink' if i == sink_index else 'mote'
+            nodes.append({'name': 'mote' + str(i), 'role': role, 'x': int(round(x)), 'y': int(round(y)), 'battery': sink_battery if role == 'sink' else levels[i]})
+        topology = {'name': name, 'radius': radius, 'delay_ms': delay_ms, 'nodes': nodes}
+        if not connected or layout in ['grid', 'line'] or components(topology) == 1:
+            return topology
+    raise ValueError("No connected " + layout + " topology in " + str(attempts) + " attempts, use a larger radius")
+
+def dumps(topology):
+    'Json with one node per line, like the files in the topologies folder'
+    lines = ['{']
+    for key in topology:
+        if key != 'nodes':
+            lines.append('    ' + json.dumps(key) + ' : ' + json.dumps(topology[key]) + ',')
+    lines.append('    "nodes" : [')
+    nodes = [', '.join([json.dumps(key) + ' : ' + json.dumps(value) for key, value in spec.items()]) for spec in topology['nodes']]
+    lines.append(',\n'.join(['        {' + node + '}' for node in nodes]))
+    lines.append('    ]')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+if __name__ == '__main__':  #for main run the main function. This is only run when this main python file is called, not when imported as a class
+    print("Topology generator for the routing agents")
+    print()
+    parser = argparse.ArgumentParser(description='Options as below')
+    parser.add_argument('layout', type=str, help='Placement of the nodes', choices=LAYOUTS)
+    parser.add_argument('nodes', type=int, help='Number of nodes, sink included')
+    parser.add_argument('-n','--name', type=str, help='Topology name, defaults to layout and size', default=None)
+    parser.add_argument('-s','--seed', type=int, help='Seed for positions and batteries', default=0)
+    parser.add_argument('-r','--radius', type=int, help='Range of the radio, defaults to about 8 neighbours per node', default=None)
+    parser.add_argument('-d','--delay', type=float, help='Delay of the medium in ms', default=5)
+    parser.add_argument('-b','--battery', type=str, help='Battery distribution: uniform:low:high, normal:mean:sd or fixed:level', default='uniform:60:100')
+    parser.add_argument('--sink', type=str, help='Sink placement', choices=SINKS, default='center')
+    parser.add_argument('--spacing', type=float, help='Distance between nodes of grid and line', default=100)
+    parser.add_argument('--width', type=float, help='Width of the area of random and clustered', default=1000)
+    parser.add_argument('--height', type=float, help='Height of the area of random and clustered', default=1000)
+    parser.add_argument('--clusters', type=int, help='Clusters of clustered', default=4)
+    parser.add_argument('--spread', type=float, help='Standard deviation of the clusters', default=60)
+    parser.add_argument('-c','--connected', help='Draw random layouts again until the topology is connected', action='store_true')
+    parser.add_argument('-o','--output', type=str, help='Output file, defaults to topologies/NAME.json', default=None)
+    arguments = parser.parse_args()
+    try:
+        name = arguments.name or arguments.layout + str(arguments.nodes)
+        topology = generate(name, arguments.layout, arguments.nodes, arguments.seed, arguments.radius, arguments.delay, arguments.battery, arguments.sink,
+                            connected=arguments.connected, spacing=arguments.spacing, width=arguments.width, height=arguments.height, clusters=arguments.clusters, spread=arguments.spread)
+        output = arguments.output or "topologies/" + name + ".json"
+        with open(output, "w") as topofile:
+            topofile.write(dumps(topology))
+        print(str(len(topology['nodes'])) + " nodes, radius " + str(topology['radius']) + ", " + str(components(topology)) + " connected parts. Written to: " + output)
+    except KeyboardInterrupt:
+        print("Interrupted by ctrl+c")
+        sys.exit(1)
+    except:
+        traceback.print_exc()
+        sys.exit(1)